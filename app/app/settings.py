@@ -11,11 +11,21 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import os
-from dotenv import load_dotenv
 
 from pathlib import Path
 
-load_dotenv()
+# Load a .env file found next to or above the settings, like load_dotenv()
+# does, importing python-dotenv only when there is one.
+DOTENV_PATH = next(
+    (
+        path / '.env' for path in Path(__file__).resolve().parents
+        if (path / '.env').is_file()
+    ),
+    None
+)
+if DOTENV_PATH:
+    from dotenv import load_dotenv
+    load_dotenv(DOTENV_PATH)
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -48,6 +58,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'rest_framework',
     'rest_framework.authtoken',
@@ -63,6 +74,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.TracingMiddleware',
+    'core.middleware.CaptureMiddleware',
+    'core.middleware.PasswordHashingBusyMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -120,6 +135,15 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing runs in a bounded pool. Requests are refused with 503
+# when the workers are busy and the queue is full.
+PASSWORD_HASHING_WORKERS = int(
+    os.environ.get('PASSWORD_HASHING_WORKERS', os.cpu_count() or 2)
+)
+PASSWORD_HASHING_QUEUE_SIZE = int(
+    os.environ.get('PASSWORD_HASHING_QUEUE_SIZE', 32)
+)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -138,6 +162,27 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# The archive storage holds the segments of messages moved out of the
+# database by the archive_messages command, any storage backend can be
+# configured in place of the local directory.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'archive': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {
+            'location': os.environ.get(
+                'ARCHIVE_DIR',
+                BASE_DIR / 'var' / 'archive'
+            ),
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -146,9 +191,103 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema'
+    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+        'rest_framework.authentication.TokenAuthentication',
+    ],
 }
 
+# How long responses of requests with an Idempotency-Key header are kept
+# for replay, in seconds.
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+# Email
+# https://docs.djangoproject.com/en/4.2/topics/email/
+
+EMAIL_BACKEND = os.environ.get(
+    'EMAIL_BACKEND',
+    'django.core.mail.backends.smtp.EmailBackend'
+)
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = bool(int(os.environ.get('EMAIL_USE_TLS', 0)))
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'webmaster@localhost')
+
+# Delivery of new message notifications from the outbox.
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 200))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8))
+OUTBOX_BACKOFF_SECONDS = int(os.environ.get('OUTBOX_BACKOFF_SECONDS', 30))
+OUTBOX_DIGEST_THRESHOLD = int(os.environ.get('OUTBOX_DIGEST_THRESHOLD', 5))
+OUTBOX_WEBHOOK_TIMEOUT = float(os.environ.get('OUTBOX_WEBHOOK_TIMEOUT', 5))
+# How long a claimed batch is reserved for its worker, longer than the
+# delivery of a batch takes.
+OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', 15 * 60))
+
+# Accept-and-queue submission of messages.
+INGEST_QUEUE_DIR = os.environ.get('INGEST_QUEUE_DIR', BASE_DIR / 'var' / 'ingest')
+INGEST_QUEUE_MAX_SIZE = int(os.environ.get('INGEST_QUEUE_MAX_SIZE', 10000))
+INGEST_FLUSH_SIZE = int(os.environ.get('INGEST_FLUSH_SIZE', 500))
+INGEST_FLUSH_INTERVAL = float(os.environ.get('INGEST_FLUSH_INTERVAL', 2))
+# Seconds after which a partially written record is left by a crashed write.
+INGEST_PARTIAL_MAX_AGE = float(os.environ.get('INGEST_PARTIAL_MAX_AGE', 300))
+
+# Server-Sent Events of new messages, fanned out with Postgres LISTEN/NOTIFY.
+MESSAGE_EVENTS_CHANNEL = os.environ.get('MESSAGE_EVENTS_CHANNEL', 'new_message')
+MESSAGE_EVENTS_KEEPALIVE = float(os.environ.get('MESSAGE_EVENTS_KEEPALIVE', 15))
+MESSAGE_EVENTS_BUFFER = int(os.environ.get('MESSAGE_EVENTS_BUFFER', 100))
+MESSAGE_EVENTS_MAX_AGE = float(os.environ.get('MESSAGE_EVENTS_MAX_AGE', 300))
+
+# Rows removed per statement when purging deleted accounts.
+ACCOUNT_PURGE_BATCH_SIZE = int(os.environ.get('ACCOUNT_PURGE_BATCH_SIZE', 1000))
+
+# Directory of the OpenAPI schema written by the build_schema command.
+SCHEMA_DIR = os.environ.get('SCHEMA_DIR', BASE_DIR / 'var' / 'schema')
+
+# Profiles of requests made by staff with the X-Profile header or the
+# _profile query flag, browsable at /admin/profiles/.
+PROFILE_DIR = os.environ.get('PROFILE_DIR', BASE_DIR / 'var' / 'profiles')
+PROFILE_TOKEN_MAX_AGE = int(os.environ.get('PROFILE_TOKEN_MAX_AGE', 60 * 60))
+
+# Span tracing of a sample of the requests, written as OpenTelemetry JSON
+# lines to a rotating file.
+TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', 0))
+TRACING_FILE = os.environ.get(
+    'TRACING_FILE',
+    BASE_DIR / 'var' / 'traces' / 'spans.jsonl'
+)
+TRACING_MAX_BYTES = int(os.environ.get('TRACING_MAX_BYTES', 10 * 1024 * 1024))
+TRACING_BACKUP_COUNT = int(os.environ.get('TRACING_BACKUP_COUNT', 5))
+
+# JSON lines file the shapes of API requests are captured to for replay,
+# capture is disabled when empty.
+CAPTURE_FILE = os.environ.get('CAPTURE_FILE', '')
+
+# Cache of public submission keys resolved to their owners.
+SUBMISSION_KEY_CACHE_TTL = float(os.environ.get('SUBMISSION_KEY_CACHE_TTL', 60))
+SUBMISSION_KEY_CACHE_SIZE = int(
+    os.environ.get('SUBMISSION_KEY_CACHE_SIZE', 10000)
+)
+# Unknown keys are cached apart, so that guessing keys cannot evict the
+# known ones.
+SUBMISSION_KEY_UNKNOWN_CACHE_SIZE = int(
+    os.environ.get('SUBMISSION_KEY_UNKNOWN_CACHE_SIZE', 1000)
+)
+
+# Row count above which admin changelists show a planner estimate instead
+# of an exact COUNT(*).
+ADMIN_COUNT_ESTIMATE_THRESHOLD = int(
+    os.environ.get('ADMIN_COUNT_ESTIMATE_THRESHOLD', 10000)
+)
+
+# Messages older than this are moved to the archive storage by the
+# archive_messages command, at most a segment of the batch size at a time.
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 10000))
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Contact Form Submission RestAPI',
     'VERSION': '1.0.0',
@@ -4,17 +4,37 @@ URL configuration for app project.
 from django.contrib import admin
 from django.urls import path, include
 
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
-
-from core.views import IndexView
+from core.views import (
+    IndexView,
+    ProfileListView,
+    ProfileDownloadView,
+    lazy_view
+)
 
 urlpatterns = [
     path('', IndexView.as_view(), name='index'),
+    path(
+        'admin/profiles/',
+        ProfileListView.as_view(),
+        name='admin-profiles'
+    ),
+    path(
+        'admin/profiles/<str:name>',
+        ProfileDownloadView.as_view(),
+        name='admin-profile-download'
+    ),
     path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
+    path(
+        'api/schema/',
+        lazy_view('core.schema_views.CachedSchemaView'),
+        name='api-schema'
+    ),
     path(
         'api/docs/',
-        SpectacularSwaggerView.as_view(url_name='api-schema'),
+        lazy_view(
+            'drf_spectacular.views.SpectacularSwaggerView',
+            url_name='api-schema'
+        ),
         name='api-docs'
     ),
     path('api/user/', include('user.urls', namespace='user')),
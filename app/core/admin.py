@@ -2,11 +2,41 @@
 Django admin customization.
 """
 
+import json
+
+from django.conf import settings
+from django import forms
 from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.admin.models import DELETION, LogEntry
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from django.utils.translation import gettext_lazy as _
+from django.contrib.contenttypes.models import ContentType
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.template.response import TemplateResponse
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _, ngettext
+
+from core.models import User, Message, MessageBand
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator counting large querysets from planner statistics rather than
+    an exact COUNT(*), which scans every matching row.
+    """
+
+    @cached_property
+    def count(self):
+        """Return the estimated count, or the exact one when it is small."""
+
+        plan = json.loads(self.object_list.explain(format='json'))
+        estimate = int(plan[0]['Plan']['Plan Rows'])
 
-from core.models import User, Message
+        if estimate < settings.ADMIN_COUNT_ESTIMATE_THRESHOLD:
+            return super().count
+
+        return estimate
 
 
 @admin.register(User)
@@ -26,6 +56,14 @@ class UserAdmin(BaseUserAdmin):
                 )
             }
         ),
+        (
+            _('Notifications'), {
+                'fields': (
+                    'notify_by_email',
+                    'webhook_url'
+                )
+            }
+        ),
         (_('Important dates'), {'fields': ('last_login',)}),
     )
 
@@ -47,13 +85,165 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class MessageAdminForm(forms.ModelForm):
+    """Form of a message keeping its fingerprint in line with edits."""
+
+    class Meta:
+        model = Message
+        fields = '__all__'
+
+    def clean(self):
+        """Refuse edits making the message identical to another one."""
+
+        cleaned_data = super().clean()
+        fingerprint = Message.make_fingerprint(
+            cleaned_data.get('email'),
+            cleaned_data.get('title'),
+            cleaned_data.get('content')
+        )
+        duplicates = Message.objects.filter(
+            user=cleaned_data.get('user'),
+            fingerprint=fingerprint
+        ).exclude(pk=self.instance.pk)
+
+        if duplicates.exists():
+            raise forms.ValidationError(
+                _('An identical message of this user already exists.')
+            )
+
+        self.instance.fingerprint = fingerprint
+
+        return cleaned_data
+
+
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    ordering = ['-created_at']
+    form = MessageAdminForm
+    ordering = ['-created_at', '-id']
     list_display = [
         'email',
         'title',
     ]
     readonly_fields = ['created_at']
     list_filter = ['is_recent', 'is_read', 'is_answered']
+    search_fields = ['^email', '^title']
     list_per_page = 20
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = [
+        'mark_read',
+        'mark_answered',
+        'mark_not_recent',
+        'delete_messages'
+    ]
+
+    def save_model(self, request, obj, form, change):
+        """Save the message, with new bands if its content changed."""
+
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            if change and 'content' in form.changed_data:
+                MessageBand.rebuild(obj)
+
+    def get_actions(self, request):
+        """Return the actions without the per-object delete_selected."""
+
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+
+        return actions
+
+    def update_messages(self, request, queryset, **fields):
+        """Update the selected messages with a single UPDATE."""
+
+        updated = queryset.order_by().update(**fields)
+        self.message_user(request, ngettext(
+            '%d message was updated.',
+            '%d messages were updated.',
+            updated
+        ) % updated)
+
+    @admin.action(
+        description=_('Mark selected messages as read'),
+        permissions=['change']
+    )
+    def mark_read(self, request, queryset):
+        self.update_messages(request, queryset, is_read=True)
+
+    @admin.action(
+        description=_('Mark selected messages as answered'),
+        permissions=['change']
+    )
+    def mark_answered(self, request, queryset):
+        self.update_messages(request, queryset, is_answered=True)
+
+    @admin.action(
+        description=_('Mark selected messages as not recent'),
+        permissions=['change']
+    )
+    def mark_not_recent(self, request, queryset):
+        self.update_messages(request, queryset, is_recent=False)
+
+    @admin.action(
+        description=_('Delete selected messages'),
+        permissions=['delete']
+    )
+    def delete_messages(self, request, queryset):
+        """
+        Delete the selected messages and their bands, once confirmed, with a
+        single DELETE statement instead of loading and deleting them one by
+        one. The foreign key checks are deferred to commit, and the triggers
+        still record tombstones and roll up the counts.
+        """
+
+        if request.POST.get('post') != 'yes':
+            return TemplateResponse(
+                request,
+                'admin/core/message/delete_messages_confirmation.html',
+                {
+                    **self.admin_site.each_context(request),
+                    'title': _('Delete messages'),
+                    'opts': self.model._meta,
+                    'selected': request.POST.getlist(
+                        helpers.ACTION_CHECKBOX_NAME
+                    ),
+                    'select_across': request.POST.get('select_across') == '1',
+                    'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+                }
+            )
+
+        ids, params = queryset.order_by().values('id').query.sql_with_params()
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'WITH selected AS ({ids}), '
+                f'bands AS (DELETE FROM {MessageBand._meta.db_table} '
+                f'WHERE message_id IN (SELECT id FROM selected)) '
+                f'DELETE FROM {Message._meta.db_table} '
+                f'WHERE id IN (SELECT id FROM selected) '
+                f'RETURNING id, email',
+                params
+            )
+            deleted = cursor.fetchall()
+            self.log_deleted(request, deleted)
+
+        self.message_user(request, ngettext(
+            '%d message was deleted.',
+            '%d messages were deleted.',
+            len(deleted)
+        ) % len(deleted))
+
+    def log_deleted(self, request, rows):
+        """Record the deletion of the (id, email) rows in the admin log."""
+
+        content_type = ContentType.objects.get_for_model(Message)
+        LogEntry.objects.bulk_create([
+            LogEntry(
+                user_id=request.user.pk,
+                content_type=content_type,
+                object_id=str(pk),
+                object_repr=str(Message(id=pk, email=email))[:200],
+                action_flag=DELETION,
+            )
+            for pk, email in rows
+        ])
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.models.signals import post_delete, post_save
+
+        from core import submission_keys
+        from core.models import SubmissionKey
+
+        for model in (SubmissionKey, settings.AUTH_USER_MODEL):
+            post_save.connect(submission_keys.invalidate, sender=model)
+            post_delete.connect(submission_keys.invalidate, sender=model)
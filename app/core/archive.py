@@ -0,0 +1,319 @@
+"""
+Archive of old messages in compressed, columnar, append-only segments.
+
+A segment file holds a batch of messages of one user: a magic string, the
+length of a JSON header and the header, giving for each column the offset
+and length of its block, then the blocks. Each block is the JSON array of
+the column values compressed with zlib, so lookups read the id and date
+columns before decompressing the others. Segments are written once to the
+archive storage and indexed by their id and date ranges in the database.
+"""
+
+import json
+import struct
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import connection, models, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.models import Message, MessageArchiveSegment, MessageBand
+
+MAGIC = b'MSGSEG1\n'
+HEADER_LENGTH = struct.Struct('>I')
+
+# Every column of a message but its owner, which is kept on the segment.
+COLUMNS = [
+    field.attname for field in Message._meta.concrete_fields
+    if field.attname != 'user_id'
+]
+DATETIME_COLUMNS = {
+    field.attname for field in Message._meta.concrete_fields
+    if isinstance(field, models.DateTimeField)
+}
+
+
+def get_storage():
+    """Return the storage the segments are written to."""
+
+    return storages['archive']
+
+
+def cutoff(days=None):
+    """
+    Return the start of the UTC day the given number of days ago, before
+    which messages are archived. Whole days keep the daily counts aligned
+    with the archive.
+    """
+
+    days = settings.ARCHIVE_AFTER_DAYS if days is None else days
+
+    return (timezone.now() - timedelta(days=days)).replace(
+        hour=0,
+        minute=0,
+        second=0,
+        microsecond=0
+    )
+
+
+def encode_segment(rows):
+    """Return the content of a segment file holding the message rows."""
+
+    columns = {}
+    blocks = []
+    offset = 0
+
+    for name in COLUMNS:
+        values = [row[name] for row in rows]
+        if name in DATETIME_COLUMNS:
+            values = [value and value.isoformat() for value in values]
+
+        block = zlib.compress(json.dumps(values).encode())
+        columns[name] = [offset, len(block)]
+        blocks.append(block)
+        offset += len(block)
+
+    header = json.dumps({'count': len(rows), 'columns': columns}).encode()
+
+    return b''.join(
+        [MAGIC, HEADER_LENGTH.pack(len(header)), header] + blocks
+    )
+
+
+def _read_header(f):
+    """Return the header of the segment file and where its blocks start."""
+
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f'{f.name} is not an archive segment.')
+
+    (length,) = HEADER_LENGTH.unpack(f.read(HEADER_LENGTH.size))
+
+    return json.loads(f.read(length)), len(MAGIC) + HEADER_LENGTH.size + length
+
+
+def _read_column(f, header, start, name):
+    """Return the values of a column of the segment file."""
+
+    offset, length = header['columns'][name]
+    f.seek(start + offset)
+    values = json.loads(zlib.decompress(f.read(length)))
+
+    if name in DATETIME_COLUMNS:
+        values = [value and datetime.fromisoformat(value) for value in values]
+
+    return values
+
+
+def read_segment(segment, match):
+    """
+    Return the messages of the segment whose id and creation time pass the
+    match, decompressing the other columns only when some do.
+    """
+
+    with get_storage().open(segment.path, 'rb') as f:
+        header, start = _read_header(f)
+        columns = {
+            name: _read_column(f, header, start, name)
+            for name in ('id', 'created_at')
+        }
+        positions = [
+            i for i, (pk, created_at)
+            in enumerate(zip(columns['id'], columns['created_at']))
+            if match(pk, created_at)
+        ]
+
+        if not positions:
+            return []
+
+        for name in COLUMNS:
+            if name not in columns:
+                columns[name] = _read_column(f, header, start, name)
+
+    return [
+        Message(
+            user_id=segment.user_id,
+            **{name: columns[name][i] for name in COLUMNS}
+        )
+        for i in positions
+    ]
+
+
+def daily_counts(segment):
+    """
+    Return the total, read and answered counts of the messages of the
+    segment by UTC day, like the daily counts of the database rows.
+    """
+
+    names = ('created_at', 'is_read', 'is_answered')
+    counts = {}
+
+    with get_storage().open(segment.path, 'rb') as f:
+        header, start = _read_header(f)
+        columns = [_read_column(f, header, start, name) for name in names]
+
+    for created_at, is_read, is_answered in zip(*columns):
+        day = created_at.astimezone(dt_timezone.utc).date()
+        total = counts.setdefault(day, [0, 0, 0])
+        total[0] += 1
+        total[1] += is_read
+        total[2] += is_answered
+
+    return counts
+
+
+def horizon(user_id):
+    """Return the time before which the user's messages are archived."""
+
+    return MessageArchiveSegment.objects.filter(
+        user_id=user_id
+    ).aggregate(horizon=Max('archived_before'))['horizon']
+
+
+def get(user_id, ids):
+    """Return the archived messages of the user with the ids, by id."""
+
+    ids = set(ids)
+    segments = MessageArchiveSegment.objects.filter(
+        user_id=user_id,
+        first_id__lte=max(ids),
+        last_id__gte=min(ids)
+    ).order_by('first_id')
+    messages = {}
+
+    for segment in segments:
+        wanted = {
+            pk for pk in ids - messages.keys()
+            if segment.first_id <= pk <= segment.last_id
+        }
+        if wanted:
+            messages.update(
+                (msg.id, msg) for msg in
+                read_segment(segment, lambda pk, _: pk in wanted)
+            )
+
+    return messages
+
+
+def iter_between(user_id, from_date=None, to_date=None, newest_first=False):
+    """
+    Yield the archived messages of the user created in the range, a list
+    per segment, the oldest segment first unless newest_first.
+    """
+
+    segments = MessageArchiveSegment.objects.filter(user_id=user_id)
+    if from_date:
+        segments = segments.filter(last_created_at__gte=from_date)
+    if to_date:
+        segments = segments.filter(first_created_at__lt=to_date)
+
+    def match(pk, created_at):
+        return (
+            (from_date is None or created_at >= from_date)
+            and (to_date is None or created_at < to_date)
+        )
+
+    for segment in segments.order_by(
+        '-first_id' if newest_first else 'first_id'
+    ):
+        yield read_segment(segment, match)
+
+
+def between(user_id, from_date=None, to_date=None):
+    """Return the archived messages of the user created in the range."""
+
+    return [
+        msg
+        for messages in iter_between(user_id, from_date, to_date)
+        for msg in messages
+    ]
+
+
+def _archive_batch(user_id, before, batch_size):
+    """
+    Move the next batch of the user's messages created before the time to
+    a new segment, returning the segment or None when none are left.
+    """
+
+    storage = get_storage()
+    path = None
+
+    try:
+        with transaction.atomic():
+            rows = list(
+                Message.objects.filter(
+                    user_id=user_id,
+                    created_at__lt=before
+                ).order_by('id').select_for_update().values(
+                    *COLUMNS
+                )[:batch_size]
+            )
+            if not rows:
+                return None
+
+            ids = [row['id'] for row in rows]
+            created = [row['created_at'] for row in rows]
+            path = storage.save(
+                f'{user_id}/{ids[0]}-{ids[-1]}.seg',
+                ContentFile(encode_segment(rows))
+            )
+            segment = MessageArchiveSegment.objects.create(
+                user_id=user_id,
+                path=path,
+                count=len(rows),
+                first_id=ids[0],
+                last_id=ids[-1],
+                first_created_at=min(created),
+                last_created_at=max(created),
+                archived_before=before
+            )
+
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL core.archiving = 'on'")
+                cursor.execute(
+                    f'DELETE FROM {MessageBand._meta.db_table} '
+                    f'WHERE message_id = ANY(%s)',
+                    [ids]
+                )
+                cursor.execute(
+                    f'DELETE FROM {Message._meta.db_table} '
+                    f'WHERE id = ANY(%s)',
+                    [ids]
+                )
+    except Exception:
+        if path:
+            storage.delete(path)
+        raise
+
+    return segment
+
+
+def archive_user(user_id, before, batch_size=None):
+    """
+    Move the user's messages created before the time to the archive, a
+    segment per batch, each committed on its own. Yield the segments.
+    """
+
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+
+    while True:
+        segment = _archive_batch(user_id, before, batch_size)
+        if segment is None:
+            break
+
+        yield segment
+
+
+def delete_user(user_id):
+    """Delete the archive of the user, returning the segments deleted."""
+
+    storage = get_storage()
+    segments = MessageArchiveSegment.objects.filter(user_id=user_id)
+
+    for path in segments.values_list('path', flat=True):
+        storage.delete(path)
+
+    return segments.delete()[0]
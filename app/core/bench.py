@@ -0,0 +1,95 @@
+"""
+Helpers to load a running instance with concurrent HTTP requests.
+"""
+
+import http.client
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+
+def percentile(values, q):
+    """Return the q-th percentile (0-100) of the values."""
+
+    if not values:
+        return 0
+
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))
+
+    return ordered[index]
+
+
+class Client:
+    """HTTP client keeping one connection per thread."""
+
+    def __init__(self, base_url, headers=None):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.headers = headers or {}
+        self.local = threading.local()
+
+    def connection(self):
+        """Return the connection of the current thread."""
+
+        if not hasattr(self.local, 'connection'):
+            cls = (
+                http.client.HTTPSConnection if self.scheme == 'https'
+                else http.client.HTTPConnection
+            )
+            self.local.connection = cls(self.netloc, timeout=30)
+
+        return self.local.connection
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request and return (status, seconds elapsed)."""
+
+        connection = self.connection()
+        start = time.perf_counter()
+
+        try:
+            connection.request(
+                method,
+                path,
+                body=body,
+                headers={**self.headers, **(headers or {})}
+            )
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            del self.local.connection
+            return None, time.perf_counter() - start
+
+        return response.status, time.perf_counter() - start
+
+
+def run(jobs, concurrency):
+    """
+    Run the callables returning (status, seconds) with the given number of
+    threads. Return (results, seconds elapsed).
+    """
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda job: job(), jobs))
+
+    return results, time.perf_counter() - start
+
+
+def summarize(results, elapsed):
+    """Return throughput, latency percentiles and error rate of the results."""
+
+    latencies = [seconds for _, seconds in results]
+    errors = sum(1 for code, _ in results if code is None or code >= 500)
+
+    return {
+        'requests': len(results),
+        'throughput': len(results) / elapsed if elapsed else 0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'error_rate': errors / len(results) if results else 0,
+    }
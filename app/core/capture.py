@@ -0,0 +1,146 @@
+"""
+Capture of sanitized API request shapes for replay.
+"""
+
+import json
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+# Query parameters holding free text, replaced by a filler of the same length.
+REDACTED_PARAMS = {'search', 'sender', 'cursor'}
+
+_lock = threading.Lock()
+
+
+def enabled():
+    """Return whether requests are captured."""
+
+    return bool(settings.CAPTURE_FILE)
+
+
+def auth_mode(request):
+    """Return how the request authenticates."""
+
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme = authorization.split(' ', 1)[0].lower()
+
+    if scheme in ('token', 'basic'):
+        return scheme
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return 'session'
+
+    return 'anonymous'
+
+
+def _value_type(value):
+    """Return the name of the JSON type of the value."""
+
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, (int, float)):
+        return 'number'
+
+    return 'str'
+
+
+def body_shape(request):
+    """Return the type of each field of the request body, without values."""
+
+    if not request.body:
+        return {}
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = request.POST
+
+    if not isinstance(data, dict):
+        return {}
+
+    return {key: _value_type(value) for key, value in data.items()}
+
+
+def request_shape(request):
+    """
+    Return the sanitized shape of the request. The body is read here,
+    before the view consumes the stream.
+    """
+
+    query = {
+        key: [
+            'x' * len(value) if key in REDACTED_PARAMS else value
+            for value in values
+        ]
+        for key, values in request.GET.lists()
+    }
+
+    return {
+        'time': time.time(),
+        'method': request.method,
+        'path': request.path,
+        'query': query,
+        'body_size': len(request.body),
+        'body': body_shape(request),
+        'content_type': request.content_type,
+        'auth': auth_mode(request),
+    }
+
+
+def record(shape, request, response, seconds):
+    """Append the request shape and its outcome to the capture file."""
+
+    match = request.resolver_match
+    shape.update(
+        route=match.route if match else None,
+        status=response.status_code,
+        ms=round(seconds * 1000, 3)
+    )
+    line = json.dumps(shape)
+    path = Path(settings.CAPTURE_FILE)
+
+    with _lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a') as f:
+            f.write(line + '\n')
+
+
+def load(path):
+    """Return the captured request shapes in the file, oldest first."""
+
+    with open(path) as f:
+        shapes = [json.loads(line) for line in f if line.strip()]
+
+    return sorted(shapes, key=lambda s: s['time'])
+
+
+def replay_body(shape, index):
+    """Return a body of the captured shape and size to replay."""
+
+    fields = shape['body']
+    if not fields:
+        return None
+
+    data = {}
+    for key, kind in fields.items():
+        if kind == 'bool':
+            data[key] = True
+        elif kind == 'number':
+            data[key] = 0
+        elif key == 'email':
+            data[key] = f'replay{index}@example.com'
+        else:
+            data[key] = 'x'
+
+    # Pad the first text field so the body has the captured size.
+    padding = shape['body_size'] - len(json.dumps(data))
+    text = [
+        key for key, kind in fields.items()
+        if kind == 'str' and key != 'email'
+    ]
+    if text and padding > 0:
+        data[text[0]] += 'x' * padding
+
+    return json.dumps(data)
@@ -0,0 +1,131 @@
+"""
+Bounded thread pool running password hashing off the request thread.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PasswordHashingBusy(APIException):
+    """Raised when too many password hashes are queued."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Server is busy, try again later.'
+    default_code = 'service_unavailable'
+
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+_metrics = {
+    'submitted': 0,
+    'rejected': 0,
+    'completed': 0,
+    'wait_seconds': 0.0,
+    'hash_seconds': 0.0,
+    'max_wait_seconds': 0.0,
+}
+
+
+def _get_executor():
+    """Return the executor and its slots, creating them on first use."""
+
+    global _executor, _slots
+
+    with _lock:
+        if _executor is None:
+            workers = settings.PASSWORD_HASHING_WORKERS
+            _executor = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix='password-hashing'
+            )
+            _slots = threading.BoundedSemaphore(
+                workers + settings.PASSWORD_HASHING_QUEUE_SIZE
+            )
+
+    return _executor, _slots
+
+
+def _submit(fn, *args, **kwargs):
+    """
+    Submit the hashing function to the pool and return its future. Raise
+    PasswordHashingBusy instead of queueing when the pool is saturated.
+    """
+
+    executor, slots = _get_executor()
+
+    if not slots.acquire(blocking=False):
+        with _lock:
+            _metrics['rejected'] += 1
+        raise PasswordHashingBusy()
+
+    submitted = time.perf_counter()
+
+    def task():
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            finished = time.perf_counter()
+            wait = started - submitted
+            with _lock:
+                _metrics['completed'] += 1
+                _metrics['wait_seconds'] += wait
+                _metrics['hash_seconds'] += finished - started
+                _metrics['max_wait_seconds'] = max(
+                    _metrics['max_wait_seconds'],
+                    wait
+                )
+
+    with _lock:
+        _metrics['submitted'] += 1
+
+    try:
+        future = executor.submit(task)
+    except BaseException:
+        slots.release()
+        raise
+
+    future.add_done_callback(lambda _: slots.release())
+
+    return future
+
+
+def run(fn, *args, **kwargs):
+    """
+    Run the hashing function in the pool and return its result. The
+    calling thread waits for it; only the queueing is bounded.
+    """
+
+    return _submit(fn, *args, **kwargs).result()
+
+
+async def run_async(fn, *args, **kwargs):
+    """
+    Run the hashing function in the pool and await its result, leaving
+    the event loop free while it runs.
+    """
+
+    return await asyncio.wrap_future(_submit(fn, *args, **kwargs))
+
+
+def metrics():
+    """Return counters and average timings of the pool."""
+
+    with _lock:
+        data = dict(_metrics)
+
+    completed = data['completed'] or 1
+    data['avg_wait_seconds'] = data['wait_seconds'] / completed
+    data['avg_hash_seconds'] = data['hash_seconds'] / completed
+    data['workers'] = settings.PASSWORD_HASHING_WORKERS
+    data['queue_size'] = settings.PASSWORD_HASHING_QUEUE_SIZE
+
+    return data
@@ -0,0 +1,254 @@
+"""
+Durable local queue of accepted message submissions, written to the
+database in bulk by a flusher.
+"""
+
+import heapq
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import (
+    DatabaseError,
+    IntegrityError,
+    OperationalError,
+    transaction
+)
+
+from core.models import Message, MessageBand, OutboxEvent
+
+RECORD_SUFFIX = '.json'
+PARTIAL_SUFFIX = '.tmp'
+REJECTED_SUFFIX = '.rejected'
+
+
+class QueueFull(Exception):
+    """Raised when the queue holds the maximum number of submissions."""
+
+
+def queue_dir():
+    """Return the queue directory, creating it if needed."""
+
+    directory = Path(settings.INGEST_QUEUE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    return directory
+
+
+def pending(limit=None):
+    """Return paths of queued records in order of arrival."""
+
+    with os.scandir(queue_dir()) as entries:
+        paths = (
+            entry.path for entry in entries
+            if entry.name.endswith(RECORD_SUFFIX)
+        )
+        paths = sorted(paths) if limit is None else (
+            heapq.nsmallest(limit, paths)
+        )
+
+    return [Path(p) for p in paths]
+
+
+def is_full():
+    """
+    Return True if the queue holds the maximum number of records, counting
+    no further than that maximum. Partial records count too, as they take
+    room until written or swept.
+    """
+
+    limit = settings.INGEST_QUEUE_MAX_SIZE
+    count = 0
+
+    with os.scandir(queue_dir()) as entries:
+        for entry in entries:
+            if entry.name.endswith((RECORD_SUFFIX, PARTIAL_SUFFIX)):
+                count += 1
+                if count >= limit:
+                    return True
+
+    return False
+
+
+def enqueue(user, data):
+    """
+    Durably append a validated submission to the queue and return its
+    token. Raise QueueFull when the queue is at capacity.
+    """
+
+    if is_full():
+        raise QueueFull()
+
+    token = f'{time.time_ns():020d}-{uuid.uuid4().hex}'
+    directory = queue_dir()
+    partial = directory / f'{token}{PARTIAL_SUFFIX}'
+
+    # Write aside and rename, so the flusher never reads a partial record.
+    with open(partial, 'w') as f:
+        json.dump({'user_id': user.id, 'data': data}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, directory / f'{token}{RECORD_SUFFIX}')
+
+    return token
+
+
+def sweep_partial(max_age=None):
+    """
+    Delete partial records older than max_age seconds, left by writes that
+    crashed before the rename. Return the number of deleted records.
+    """
+
+    if max_age is None:
+        max_age = settings.INGEST_PARTIAL_MAX_AGE
+    cutoff = time.time() - max_age
+    swept = 0
+
+    with os.scandir(queue_dir()) as entries:
+        for entry in entries:
+            if not entry.name.endswith(PARTIAL_SUFFIX):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    swept += 1
+            except FileNotFoundError:
+                # Renamed by its writer meanwhile.
+                continue
+
+    return swept
+
+
+def oldest_age(paths):
+    """Return the age in seconds of the oldest of the queued records."""
+
+    if not paths:
+        return 0
+
+    return time.time() - int(paths[0].name.split('-')[0]) / 1e9
+
+
+def _reject(path):
+    """Set the record aside, out of the queue, for inspection."""
+
+    path.rename(path.with_suffix(REJECTED_SUFFIX))
+
+
+def _load(paths):
+    """Return (path, record) pairs, setting aside unreadable records."""
+
+    records = []
+
+    for path in paths:
+        try:
+            with open(path) as f:
+                records.append((path, json.load(f)))
+        except ValueError:
+            _reject(path)
+
+    return records
+
+
+def _store(records):
+    """Insert the records skipping already stored ones, in one transaction."""
+
+    users = get_user_model().objects.in_bulk(
+        {record['user_id'] for _, record in records}
+    )
+    messages = {}
+
+    for _, record in records:
+        user = users.get(record['user_id'])
+        if user is None:
+            continue
+
+        data = record['data']
+        fingerprint = Message.make_fingerprint(
+            data.get('email'),
+            data.get('title'),
+            data.get('content')
+        )
+        messages[(user.id, fingerprint)] = Message(
+            user=user,
+            fingerprint=fingerprint,
+            **data
+        )
+
+    stored = set(
+        Message.objects.filter(
+            user_id__in=users,
+            fingerprint__in={fp for _, fp in messages}
+        ).values_list('user_id', 'fingerprint')
+    )
+    new = [msg for k, msg in messages.items() if k not in stored]
+
+    with transaction.atomic():
+        Message.objects.bulk_create(new)
+        MessageBand.objects.bulk_create(
+            [band for msg in new for band in MessageBand.for_message(msg)]
+        )
+        OutboxEvent.objects.bulk_create(
+            [e for msg in new for e in OutboxEvent.for_message(msg, msg.user)]
+        )
+        Message.objects.publish(new)
+
+    return len(new)
+
+
+def _store_retrying(records):
+    """Store the records, again if a concurrent submission conflicted."""
+
+    try:
+        _store(records)
+    except IntegrityError:
+        # A concurrent submission stored one of the messages meanwhile.
+        _store(records)
+
+
+def _store_each(records):
+    """
+    Store the records one by one, setting aside those the database refuses
+    so they are not replayed forever. Losing the database still raises.
+    """
+
+    for path, record in records:
+        try:
+            _store_retrying([(path, record)])
+        except OperationalError:
+            raise
+        except DatabaseError:
+            _reject(path)
+
+
+def flush(batch_size=None):
+    """
+    Write one batch of queued submissions to the database and remove them
+    from the queue. Return the number of records processed.
+
+    Records are removed only after the transaction commits. After a crash
+    they are replayed, and fingerprints keep them from being stored twice.
+    When the database refuses the batch, its records are stored one by one
+    and those refused are set aside.
+    """
+
+    paths = pending(batch_size or settings.INGEST_FLUSH_SIZE)
+    records = _load(paths)
+
+    if not records:
+        return 0
+
+    try:
+        _store_retrying(records)
+    except OperationalError:
+        raise
+    except DatabaseError:
+        _store_each(records)
+
+    for path, _ in records:
+        path.unlink(missing_ok=True)
+
+    return len(records)
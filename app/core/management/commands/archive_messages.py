@@ -0,0 +1,48 @@
+"""
+Django command to move old messages to the archive storage.
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core import archive
+
+
+class Command(BaseCommand):
+    """Django command to archive the messages older than a number of days."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Archive messages created before this many days ago.'
+        )
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+
+        before = archive.cutoff(options['days'])
+        user_ids = get_user_model().objects.order_by('id').values_list(
+            'id',
+            flat=True
+        )
+        archived = 0
+
+        for user_id in user_ids.iterator():
+            for segment in archive.archive_user(
+                user_id,
+                before,
+                options['batch_size']
+            ):
+                archived += segment.count
+                self.stdout.write(
+                    f'Archived {segment.count} messages of user {user_id} '
+                    f'to {segment.path}'
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} messages created before '
+            f'{before.date().isoformat()}.'
+        ))
@@ -0,0 +1,59 @@
+"""
+Django command to compare the synchronous and async message endpoints of a
+running instance.
+"""
+
+from django.core.management.base import BaseCommand
+
+from core import bench
+
+ENDPOINTS = {
+    'sync': '/api/message/messages/',
+    'async': '/api/message/async/messages/',
+}
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the message list endpoints."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--token', required=True)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            nargs='+',
+            default=[1, 10, 50, 100]
+        )
+        parser.add_argument('--query', default='')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+
+        client = bench.Client(
+            options['url'],
+            {'Authorization': f'Token {options["token"]}'}
+        )
+        query = f'?{options["query"]}' if options['query'] else ''
+
+        self.stdout.write(
+            f'{"endpoint":<8} {"conc":>5} {"req/s":>9} {"p50 ms":>9} '
+            f'{"p99 ms":>9} {"errors":>7}'
+        )
+
+        for concurrency in options['concurrency']:
+            for name, path in ENDPOINTS.items():
+                jobs = [
+                    lambda p=path + query: client.request('GET', p)
+                    for _ in range(options['requests'])
+                ]
+                summary = bench.summarize(*bench.run(jobs, concurrency))
+
+                self.stdout.write(
+                    f'{name:<8} {concurrency:>5} '
+                    f'{summary["throughput"]:>9.1f} '
+                    f'{summary["p50_ms"]:>9.1f} '
+                    f'{summary["p99_ms"]:>9.1f} '
+                    f'{summary["error_rate"]:>7.1%}'
+                )
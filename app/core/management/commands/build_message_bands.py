@@ -0,0 +1,36 @@
+"""
+Django command to build LSH band buckets for existing messages.
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.models import Message, MessageBand
+
+
+class Command(BaseCommand):
+    """Django command to index messages for near-duplicate lookups."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+
+        batch_size = options['batch_size']
+        messages = Message.objects.filter(
+            bands__isnull=True
+        ).only('id', 'user_id', 'content').order_by('id')
+        total = 0
+        batch = []
+
+        for msg in messages.iterator(chunk_size=batch_size):
+            batch.extend(MessageBand.for_message(msg))
+            total += 1
+
+            if len(batch) >= batch_size:
+                MessageBand.objects.bulk_create(batch)
+                batch = []
+
+        MessageBand.objects.bulk_create(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} messages.'))
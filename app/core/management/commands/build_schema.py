@@ -0,0 +1,24 @@
+"""
+Django command to render the OpenAPI schema to files at build time.
+"""
+
+from django.core.management.base import BaseCommand
+
+from core import schema
+
+
+class Command(BaseCommand):
+    """Django command to write the schema artifacts served by the API."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir',
+            default=None,
+            help='Directory of the artifacts, SCHEMA_DIR by default.'
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+
+        for path in schema.write_artifacts(options['dir']):
+            self.stdout.write(self.style.SUCCESS(f'Schema written: {path}'))
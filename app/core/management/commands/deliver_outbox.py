@@ -0,0 +1,40 @@
+"""
+Django command to deliver queued new message notifications.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.outbox import drain
+
+
+class Command(BaseCommand):
+    """Django command to drain the notification outbox."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep polling for new events instead of exiting.'
+        )
+        parser.add_argument('--interval', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+
+        total = 0
+
+        while True:
+            processed = drain(options['batch_size'])
+            total += processed
+
+            if processed:
+                continue
+            if not options['watch']:
+                break
+
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} events.'))
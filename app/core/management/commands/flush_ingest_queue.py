@@ -0,0 +1,45 @@
+"""
+Django command to write queued message submissions to the database.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import ingest
+
+
+class Command(BaseCommand):
+    """Django command to flush the ingestion queue in bulk."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep flushing on size or time thresholds instead of exiting.'
+        )
+        parser.add_argument('--poll', type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+
+        total = 0
+        ingest.sweep_partial()
+
+        # Replay everything left over, e.g. by a crashed flusher.
+        while processed := ingest.flush():
+            total += processed
+
+        while options['watch']:
+            paths = ingest.pending(settings.INGEST_FLUSH_SIZE)
+            due = len(paths) >= settings.INGEST_FLUSH_SIZE or (
+                ingest.oldest_age(paths) >= settings.INGEST_FLUSH_INTERVAL
+            )
+
+            if due:
+                total += ingest.flush()
+            else:
+                time.sleep(options['poll'])
+
+        self.stdout.write(self.style.SUCCESS(f'Flushed {total} submissions.'))
@@ -0,0 +1,49 @@
+"""
+Django command to purge deleted user accounts and their messages.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.purge import pending, purge_user
+
+
+class Command(BaseCommand):
+    """Django command to purge accounts whose deletion was requested."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep polling for new deletions instead of exiting.'
+        )
+        parser.add_argument('--interval', type=float, default=60.0)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+
+        purged = 0
+
+        while True:
+            user = pending().first()
+
+            if user is None:
+                if not options['watch']:
+                    break
+
+                time.sleep(options['interval'])
+                continue
+
+            self.stdout.write(f'Purging user {user.id}...')
+            deleted = {}
+
+            for model, count in purge_user(user, options['batch_size']):
+                name = model._meta.verbose_name_plural
+                deleted[name] = deleted.get(name, 0) + count
+                self.stdout.write(f'  {deleted[name]} {name} deleted')
+
+            purged += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} accounts.'))
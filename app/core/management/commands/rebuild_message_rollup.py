@@ -0,0 +1,100 @@
+"""
+Django command to rebuild the daily message counts from the messages.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core import archive
+from core.models import MessageArchiveSegment
+
+REBUILD_SQL = """
+INSERT INTO core_messagedailycount (user_id, day, total, read, answered)
+SELECT
+    user_id, (created_at AT TIME ZONE 'UTC')::date, count(*),
+    count(*) FILTER (WHERE is_read), count(*) FILTER (WHERE is_answered)
+FROM core_message
+{where}
+GROUP BY 1, 2
+"""
+
+# Archived messages are no longer in core_message and are added from the
+# archive segments.
+ADD_ARCHIVED_SQL = """
+INSERT INTO core_messagedailycount (user_id, day, total, read, answered)
+VALUES (%s, %s, %s, %s, %s)
+ON CONFLICT (user_id, day) DO UPDATE SET
+    total = core_messagedailycount.total + EXCLUDED.total,
+    read = core_messagedailycount.read + EXCLUDED.read,
+    answered = core_messagedailycount.answered + EXCLUDED.answered
+"""
+
+
+class Command(BaseCommand):
+    """Django command to recompute the message rollup table."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            default=None,
+            help='Rebuild the counts of this user id only.'
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+
+        user_id = options['user']
+        where = 'WHERE user_id = %s' if user_id else ''
+        params = [user_id] if user_id else []
+        segments = MessageArchiveSegment.objects.order_by('id')
+        if user_id:
+            segments = segments.filter(user_id=user_id)
+
+        # Segments are never rewritten, so they are read before the lock
+        # and only those written or deleted meanwhile are accounted for
+        # under it.
+        segment_counts = {
+            segment.id: (segment.user_id, archive.daily_counts(segment))
+            for segment in segments
+        }
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Block writers and archiving so that no change slips between
+            # delete and insert.
+            cursor.execute(
+                'LOCK TABLE core_message, core_messagearchivesegment '
+                'IN SHARE MODE'
+            )
+            current = set(segments.values_list('id', flat=True))
+            for segment in segments.exclude(id__in=segment_counts):
+                segment_counts[segment.id] = (
+                    segment.user_id,
+                    archive.daily_counts(segment)
+                )
+
+            archived = {}
+            for pk, (user, counts) in segment_counts.items():
+                if pk not in current:
+                    continue
+                for day, (total, read, answered) in counts.items():
+                    summed = archived.setdefault((user, day), [0, 0, 0])
+                    summed[0] += total
+                    summed[1] += read
+                    summed[2] += answered
+
+            cursor.execute(
+                f'DELETE FROM core_messagedailycount {where}',
+                params
+            )
+            cursor.execute(REBUILD_SQL.format(where=where), params)
+            rows = cursor.rowcount
+            cursor.executemany(ADD_ARCHIVED_SQL, [
+                [user, day, *counts]
+                for (user, day), counts in archived.items()
+            ])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {rows} daily counts, and {len(archived)} with '
+            f'archived messages.'
+        ))
@@ -0,0 +1,96 @@
+"""
+Django command to replay captured API traffic against a running instance.
+"""
+
+import time
+from collections import defaultdict
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand
+
+from core import bench, capture
+
+
+class Command(BaseCommand):
+    """Django command to replay captured requests and report per route."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Capture file to replay.')
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument(
+            '--token',
+            help='Token used for requests captured as authenticated.'
+        )
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument(
+            '--speedup',
+            type=float,
+            default=1.0,
+            help='Replay faster than captured by this factor, 0 to send '
+                 'requests as fast as possible.'
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+
+        shapes = capture.load(options['file'])
+        if not shapes:
+            self.stdout.write('No requests captured.')
+            return
+
+        client = bench.Client(options['url'])
+        token = options['token']
+        speedup = options['speedup']
+        first = shapes[0]['time']
+        start = time.perf_counter()
+
+        def job(index, shape):
+            if speedup:
+                delay = (shape['time'] - first) / speedup
+                time.sleep(max(0, start + delay - time.perf_counter()))
+
+            path = shape['path']
+            if shape['query']:
+                path += '?' + urlencode(shape['query'], doseq=True)
+
+            headers = {}
+            if shape['auth'] != 'anonymous' and token:
+                headers['Authorization'] = f'Token {token}'
+
+            body = capture.replay_body(shape, index)
+            if body is not None:
+                headers['Content-Type'] = 'application/json'
+                body = body.encode()
+
+            return client.request(shape['method'], path, body, headers)
+
+        jobs = [
+            lambda i=i, s=s: job(i, s) for i, s in enumerate(shapes)
+        ]
+        results, elapsed = bench.run(jobs, options['concurrency'])
+
+        by_route = defaultdict(list)
+        for shape, result in zip(shapes, results):
+            route = f'{shape["method"]} {shape["route"] or shape["path"]}'
+            by_route[route].append(result)
+
+        self.stdout.write(
+            f'{"requests":>8} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} '
+            f'{"p99 ms":>9} {"errors":>7}  route'
+        )
+        for route, route_results in sorted(by_route.items()):
+            self.write_summary(
+                route,
+                bench.summarize(route_results, elapsed)
+            )
+        self.write_summary('total', bench.summarize(results, elapsed))
+
+    def write_summary(self, route, summary):
+        """Write a line of the report."""
+
+        self.stdout.write(
+            f'{summary["requests"]:>8} {summary["throughput"]:>9.1f} '
+            f'{summary["p50_ms"]:>9.1f} {summary["p95_ms"]:>9.1f} '
+            f'{summary["p99_ms"]:>9.1f} {summary["error_rate"]:>7.1%}  '
+            f'{route}'
+        )
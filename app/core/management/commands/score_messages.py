@@ -0,0 +1,66 @@
+"""
+Django command to score queued messages with per-user spam classifiers.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Message
+from core.spam import SpamClassifier
+
+
+class Command(BaseCommand):
+    """Django command to score messages that have no spam score yet."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep polling for new messages instead of exiting.'
+        )
+        parser.add_argument('--interval', type=float, default=5.0)
+
+    def score_batch(self, batch_size):
+        """Score one batch of queued messages and return its size."""
+
+        with transaction.atomic():
+            batch = list(
+                Message.objects.filter(
+                    spam_score__isnull=True
+                ).order_by('id').only(
+                    'id', 'user_id', 'content'
+                ).select_for_update(skip_locked=True)[:batch_size]
+            )
+            classifiers = {}
+
+            for msg in batch:
+                if msg.user_id not in classifiers:
+                    classifiers[msg.user_id] = SpamClassifier.for_user(
+                        msg.user_id
+                    )
+                msg.spam_score = classifiers[msg.user_id].score(msg.content)
+
+            Message.objects.bulk_update(batch, ['spam_score'])
+
+        return len(batch)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+
+        total = 0
+
+        while True:
+            scored = self.score_batch(options['batch_size'])
+            total += scored
+
+            if scored:
+                continue
+            if not options['watch']:
+                break
+
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Scored {total} messages.'))
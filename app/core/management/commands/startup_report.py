@@ -0,0 +1,51 @@
+"""
+Django command to break the cold start import time down by module.
+"""
+
+from django.core.management.base import BaseCommand
+
+from core import startup
+
+
+class Command(BaseCommand):
+    """Django command to report the slowest imports of a cold start."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=30)
+        parser.add_argument(
+            '--sort',
+            choices=['self', 'cumulative'],
+            default='cumulative',
+            help='Order modules by their own or cumulative import time.'
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+
+        entries = startup.measure()
+        key = 'self_us' if options['sort'] == 'self' else 'cumulative_us'
+        total = sum(entry.self_us for entry in entries)
+
+        self.stdout.write(f'{"self ms":>9} {"cumul ms":>9}  module')
+        for entry in sorted(
+            entries,
+            key=lambda entry: getattr(entry, key),
+            reverse=True
+        )[:options['limit']]:
+            self.stdout.write(
+                f'{entry.self_us / 1000:>9.1f} '
+                f'{entry.cumulative_us / 1000:>9.1f}  {entry.module}'
+            )
+
+        self.stdout.write(f'\n{"self ms":>9}  package')
+        packages = startup.by_package(entries)
+        for package, self_us in sorted(
+            packages.items(),
+            key=lambda item: item[1],
+            reverse=True
+        )[:options['limit']]:
+            self.stdout.write(f'{self_us / 1000:>9.1f}  {package}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {len(entries)} modules in {total / 1000:.1f} ms.'
+        ))
@@ -0,0 +1,84 @@
+"""
+Django command to summarize the slowest span paths of the traced requests.
+"""
+
+import json
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from core.bench import percentile
+from core.tracing import trace_files
+
+
+def span_paths(export):
+    """Yield the path of names and the duration in ms of every span."""
+
+    for resource in export['resourceSpans']:
+        for scope in resource['scopeSpans']:
+            spans = {span['spanId']: span for span in scope['spans']}
+
+            for span in scope['spans']:
+                names = []
+                current = span
+                while current:
+                    names.append(current['name'])
+                    current = spans.get(current['parentSpanId'])
+
+                duration = (
+                    int(span['endTimeUnixNano'])
+                    - int(span['startTimeUnixNano'])
+                ) / 1e6
+
+                yield ' > '.join(reversed(names)), duration
+
+
+class Command(BaseCommand):
+    """Django command to print the slowest span paths."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--sort',
+            choices=['total', 'p95', 'max'],
+            default='total',
+            help='Order the span paths by total, p95 or max duration.'
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+
+        durations = defaultdict(list)
+        traces = 0
+
+        for path in trace_files():
+            with open(path) as f:
+                for line in f:
+                    traces += 1
+                    for name, duration in span_paths(json.loads(line)):
+                        durations[name].append(duration)
+
+        rows = [
+            {
+                'path': name,
+                'count': len(values),
+                'total': sum(values),
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'max': max(values),
+            }
+            for name, values in durations.items()
+        ]
+        rows.sort(key=lambda row: row[options['sort']], reverse=True)
+
+        self.stdout.write(
+            f'{"count":>7} {"total ms":>10} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"max ms":>8}  path'
+        )
+        for row in rows[:options['limit']]:
+            self.stdout.write(
+                f'{row["count"]:>7} {row["total"]:>10.1f} {row["p50"]:>8.1f} '
+                f'{row["p95"]:>8.1f} {row["max"]:>8.1f}  {row["path"]}'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Summarized {traces} traces.'))
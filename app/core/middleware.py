@@ -0,0 +1,184 @@
+"""
+Middleware of the project.
+"""
+
+import time
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async
+)
+
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from core import capture, hashing, profiling, tracing
+
+
+class HybridMiddleware:
+    """
+    Base of middleware running in the mode of the handler, like Django's
+    own, so that async views are served without a thread hop. Subclasses
+    implement handle and ahandle.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.ahandle(request)
+
+        return self.handle(request)
+
+    def handle(self, request):
+        """Return the response to the request."""
+
+        raise NotImplementedError
+
+    async def ahandle(self, request):
+        """Return the response to the request, in async mode."""
+
+        raise NotImplementedError
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """
+    Profile requests that ask for it with a signed header or query flag.
+    Other requests only pay for two dictionary lookups.
+    """
+
+    @staticmethod
+    def flagged(request):
+        """Return whether the request carries the header or query flag."""
+
+        return (
+            profiling.HEADER in request.META
+            or profiling.QUERY_FLAG in request.META.get('QUERY_STRING', '')
+        )
+
+    def handle(self, request):
+        if self.flagged(request) and profiling.requested(request):
+            return profiling.profile(request, self.get_response)
+
+        return self.get_response(request)
+
+    async def ahandle(self, request):
+        if self.flagged(request) and await sync_to_async(
+            profiling.requested
+        )(request):
+            return await profiling.aprofile(request, self.get_response)
+
+        return await self.get_response(request)
+
+
+class TracingMiddleware(HybridMiddleware):
+    """Trace a sample of the requests, as set by TRACING_SAMPLE_RATE."""
+
+    @staticmethod
+    def start(request):
+        """Return the context tracing the request as its root span."""
+
+        return tracing.trace(request.method, **{
+            'http.method': request.method,
+            'http.target': request.path
+        })
+
+    @staticmethod
+    def finish(root, request, response):
+        """Name the root span after the route and record the status."""
+
+        if request.resolver_match:
+            root.name = f'{request.method} {request.resolver_match.route}'
+        root.attributes['http.status_code'] = response.status_code
+
+    def handle(self, request):
+        if not tracing.sampled():
+            return self.get_response(request)
+
+        with self.start(request) as root:
+            response = self.get_response(request)
+            self.finish(root, request, response)
+
+        return response
+
+    async def ahandle(self, request):
+        if not tracing.sampled():
+            return await self.get_response(request)
+
+        with self.start(request) as root:
+            response = await self.get_response(request)
+            self.finish(root, request, response)
+
+        return response
+
+
+class CaptureMiddleware(HybridMiddleware):
+    """
+    Log the sanitized shape of API requests to CAPTURE_FILE, for replay
+    with the replay_traffic command. Disabled unless the file is set.
+    """
+
+    @staticmethod
+    def captured(request):
+        """Return whether the request is captured."""
+
+        return capture.enabled() and request.path.startswith('/api/')
+
+    def handle(self, request):
+        if not self.captured(request):
+            return self.get_response(request)
+
+        shape = capture.request_shape(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        capture.record(
+            shape,
+            request,
+            response,
+            time.perf_counter() - start
+        )
+
+        return response
+
+    async def ahandle(self, request):
+        if not self.captured(request):
+            return await self.get_response(request)
+
+        shape = capture.request_shape(request)
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        capture.record(
+            shape,
+            request,
+            response,
+            time.perf_counter() - start
+        )
+
+        return response
+
+
+class PasswordHashingBusyMiddleware(MiddlewareMixin):
+    """
+    Answer 503 when the hashing pool is saturated outside the API, such as
+    on the admin login. API views turn the exception into 503 themselves.
+    """
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, hashing.PasswordHashingBusy):
+            return None
+
+        response = HttpResponse(
+            exception.detail,
+            status=exception.status_code,
+            content_type='text/plain'
+        )
+        response['Retry-After'] = '1'
+
+        return response
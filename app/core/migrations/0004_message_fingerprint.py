@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:27
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_fingerprints(apps, schema_editor):
+    """Fingerprint existing messages, keeping the oldest of duplicates."""
+
+    Message = apps.get_model('core', 'Message')
+    seen = set()
+    batch = []
+
+    for msg in Message.objects.order_by('id').iterator(chunk_size=2000):
+        parts = [
+            (msg.email or '').strip().lower(),
+            (msg.title or '').strip(),
+            (msg.content or '').strip()
+        ]
+        fingerprint = hashlib.sha256('\x1f'.join(parts).encode()).hexdigest()
+
+        if (msg.user_id, fingerprint) in seen:
+            continue
+
+        seen.add((msg.user_id, fingerprint))
+        msg.fingerprint = fingerprint
+        batch.append(msg)
+
+        if len(batch) >= 2000:
+            Message.objects.bulk_update(batch, ['fingerprint'])
+            batch = []
+
+    if batch:
+        Message.objects.bulk_update(batch, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_remove_message_is_banned'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(
+            backfill_fingerprints,
+            migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(condition=models.Q(('fingerprint__isnull', False)), fields=('user', 'fingerprint'), name='unique_message_fingerprint_per_user'),
+        ),
+    ]
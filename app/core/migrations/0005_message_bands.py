@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_message_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='is_spam',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='MessageBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='core.message')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'band', 'bucket'], name='message_band_lookup_idx')],
+            },
+        ),
+    ]
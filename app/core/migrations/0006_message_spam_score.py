@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_message_bands'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='spam_score',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['user', 'spam_score'], name='message_spam_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('spam_score__isnull', True)), fields=['id'], name='message_unscored_idx'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+TRACK_CHANGES_SQL = """
+CREATE SEQUENCE core_message_change_seq;
+
+UPDATE core_message SET change_seq = nextval('core_message_change_seq');
+
+CREATE FUNCTION core_message_track_change() RETURNS trigger AS $$
+BEGIN
+    NEW.change_seq := nextval('core_message_change_seq');
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_message_track_change
+    BEFORE INSERT OR UPDATE ON core_message
+    FOR EACH ROW EXECUTE FUNCTION core_message_track_change();
+
+CREATE FUNCTION core_message_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO core_messagetombstone
+        (user_id, message_id, change_seq, deleted_at)
+    VALUES
+        (OLD.user_id, OLD.id, nextval('core_message_change_seq'), now());
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_message_tombstone
+    AFTER DELETE ON core_message
+    FOR EACH ROW EXECUTE FUNCTION core_message_tombstone();
+"""
+
+UNTRACK_CHANGES_SQL = """
+DROP TRIGGER core_message_tombstone ON core_message;
+DROP FUNCTION core_message_tombstone();
+DROP TRIGGER core_message_track_change ON core_message;
+DROP FUNCTION core_message_track_change();
+DROP SEQUENCE core_message_change_seq;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_id', models.BigIntegerField()),
+                ('change_seq', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='change_seq',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['user', 'change_seq'], name='message_change_seq_idx'),
+        ),
+        migrations.AddField(
+            model_name='messagetombstone',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='messagetombstone',
+            index=models.Index(fields=['user', 'change_seq'], name='tombstone_change_seq_idx'),
+        ),
+        migrations.RunSQL(TRACK_CHANGES_SQL, UNTRACK_CHANGES_SQL),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+ROLLUP_SQL = """
+CREATE FUNCTION core_message_daily_count_add(
+    p_user_id bigint, p_created_at timestamptz,
+    p_read boolean, p_answered boolean
+) RETURNS void AS $$
+BEGIN
+    INSERT INTO core_messagedailycount (user_id, day, total, read, answered)
+    VALUES (
+        p_user_id, (p_created_at AT TIME ZONE 'UTC')::date, 1,
+        p_read::int, p_answered::int
+    )
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        total = core_messagedailycount.total + 1,
+        read = core_messagedailycount.read + EXCLUDED.read,
+        answered = core_messagedailycount.answered + EXCLUDED.answered;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION core_message_daily_count_remove(
+    p_user_id bigint, p_created_at timestamptz,
+    p_read boolean, p_answered boolean
+) RETURNS void AS $$
+BEGIN
+    UPDATE core_messagedailycount SET
+        total = total - 1,
+        read = read - p_read::int,
+        answered = answered - p_answered::int
+    WHERE user_id = p_user_id
+        AND day = (p_created_at AT TIME ZONE 'UTC')::date;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION core_message_daily_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM core_message_daily_count_add(
+            NEW.user_id, NEW.created_at, NEW.is_read, NEW.is_answered);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM core_message_daily_count_remove(
+            OLD.user_id, OLD.created_at, OLD.is_read, OLD.is_answered);
+    ELSIF (OLD.user_id, OLD.created_at, OLD.is_read, OLD.is_answered)
+            IS DISTINCT FROM
+            (NEW.user_id, NEW.created_at, NEW.is_read, NEW.is_answered) THEN
+        PERFORM core_message_daily_count_remove(
+            OLD.user_id, OLD.created_at, OLD.is_read, OLD.is_answered);
+        PERFORM core_message_daily_count_add(
+            NEW.user_id, NEW.created_at, NEW.is_read, NEW.is_answered);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_message_daily_count
+    AFTER INSERT OR UPDATE OR DELETE ON core_message
+    FOR EACH ROW EXECUTE FUNCTION core_message_daily_count();
+
+INSERT INTO core_messagedailycount (user_id, day, total, read, answered)
+SELECT
+    user_id, (created_at AT TIME ZONE 'UTC')::date, count(*),
+    count(*) FILTER (WHERE is_read), count(*) FILTER (WHERE is_answered)
+FROM core_message
+GROUP BY 1, 2;
+"""
+
+DROP_ROLLUP_SQL = """
+DROP TRIGGER core_message_daily_count ON core_message;
+DROP FUNCTION core_message_daily_count();
+DROP FUNCTION core_message_daily_count_remove(
+    bigint, timestamptz, boolean, boolean);
+DROP FUNCTION core_message_daily_count_add(
+    bigint, timestamptz, boolean, boolean);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_message_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total', models.IntegerField(default=0)),
+                ('read', models.IntegerField(default=0)),
+                ('answered', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='messagedailycount',
+            constraint=models.UniqueConstraint(fields=('user', 'day'), name='unique_message_daily_count'),
+        ),
+        migrations.RunSQL(ROLLUP_SQL, DROP_ROLLUP_SQL),
+    ]
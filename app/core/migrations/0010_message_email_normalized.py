@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:47
+
+from django.db import migrations, models
+
+NORMALIZE_EMAIL_SQL = """
+CREATE FUNCTION core_message_normalize_email() RETURNS trigger AS $$
+BEGIN
+    NEW.email_normalized := lower(NEW.email);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_message_normalize_email
+    BEFORE INSERT OR UPDATE OF email ON core_message
+    FOR EACH ROW EXECUTE FUNCTION core_message_normalize_email();
+
+-- The column is internal, so filling it is not a change for sync clients.
+ALTER TABLE core_message DISABLE TRIGGER core_message_track_change;
+UPDATE core_message SET email_normalized = lower(email);
+ALTER TABLE core_message ENABLE TRIGGER core_message_track_change;
+"""
+
+DROP_NORMALIZE_EMAIL_SQL = """
+DROP TRIGGER core_message_normalize_email ON core_message;
+DROP FUNCTION core_message_normalize_email();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_message_daily_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='email_normalized',
+            field=models.CharField(default='', editable=False, max_length=254),
+        ),
+        migrations.RunSQL(NORMALIZE_EMAIL_SQL, DROP_NORMALIZE_EMAIL_SQL),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['user', 'email_normalized', 'created_at'], include=('is_read',), name='message_sender_idx'),
+        ),
+    ]
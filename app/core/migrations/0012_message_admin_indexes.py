@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:53
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_message_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['created_at', 'id'], name='message_admin_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper(django.db.models.functions.comparison.Cast('email', models.TextField())), name='text_pattern_ops'), name='message_email_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper(django.db.models.functions.comparison.Cast('title', models.TextField())), name='text_pattern_ops'), name='message_title_search_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:09
+
+import core.models
+from django.conf import settings
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_user_deletion_requested_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('key', models.CharField(default=core.models.make_submission_key, editable=False, max_length=64, unique=True)),
+                ('allowed_origins', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=255), blank=True, default=list, size=None)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submission_keys', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Archived messages are moved, not deleted: with core.archiving set in the
+# transaction, sync clients get no tombstones and the daily counts keep
+# counting them.
+ARCHIVING_SQL = """
+CREATE OR REPLACE FUNCTION core_message_tombstone() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('core.archiving', true) = 'on' THEN
+        RETURN OLD;
+    END IF;
+    INSERT INTO core_messagetombstone
+        (user_id, message_id, change_seq, deleted_at)
+    VALUES
+        (OLD.user_id, OLD.id, nextval('core_message_change_seq'), now());
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION core_message_daily_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM core_message_daily_count_add(
+            NEW.user_id, NEW.created_at, NEW.is_read, NEW.is_answered);
+    ELSIF TG_OP = 'DELETE' THEN
+        IF current_setting('core.archiving', true) IS DISTINCT FROM 'on' THEN
+            PERFORM core_message_daily_count_remove(
+                OLD.user_id, OLD.created_at, OLD.is_read, OLD.is_answered);
+        END IF;
+    ELSIF (OLD.user_id, OLD.created_at, OLD.is_read, OLD.is_answered)
+            IS DISTINCT FROM
+            (NEW.user_id, NEW.created_at, NEW.is_read, NEW.is_answered) THEN
+        PERFORM core_message_daily_count_remove(
+            OLD.user_id, OLD.created_at, OLD.is_read, OLD.is_answered);
+        PERFORM core_message_daily_count_add(
+            NEW.user_id, NEW.created_at, NEW.is_read, NEW.is_answered);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+NOT_ARCHIVING_SQL = """
+CREATE OR REPLACE FUNCTION core_message_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO core_messagetombstone
+        (user_id, message_id, change_seq, deleted_at)
+    VALUES
+        (OLD.user_id, OLD.id, nextval('core_message_change_seq'), now());
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION core_message_daily_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM core_message_daily_count_add(
+            NEW.user_id, NEW.created_at, NEW.is_read, NEW.is_answered);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM core_message_daily_count_remove(
+            OLD.user_id, OLD.created_at, OLD.is_read, OLD.is_answered);
+    ELSIF (OLD.user_id, OLD.created_at, OLD.is_read, OLD.is_answered)
+            IS DISTINCT FROM
+            (NEW.user_id, NEW.created_at, NEW.is_read, NEW.is_answered) THEN
+        PERFORM core_message_daily_count_remove(
+            OLD.user_id, OLD.created_at, OLD.is_read, OLD.is_answered);
+        PERFORM core_message_daily_count_add(
+            NEW.user_id, NEW.created_at, NEW.is_read, NEW.is_answered);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_submission_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField()),
+                ('first_id', models.BigIntegerField()),
+                ('last_id', models.BigIntegerField()),
+                ('first_created_at', models.DateTimeField()),
+                ('last_created_at', models.DateTimeField()),
+                ('archived_before', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'first_id', 'last_id'], name='archive_segment_id_idx'), models.Index(fields=['user', 'first_created_at', 'last_created_at'], name='archive_segment_date_idx')],
+            },
+        ),
+        migrations.RunSQL(ARCHIVING_SQL, NOT_ARCHIVING_SQL),
+    ]
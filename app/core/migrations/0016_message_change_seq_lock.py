@@ -0,0 +1,77 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:05
+
+from django.db import migrations
+
+# Sequence numbers taken by concurrent transactions commit out of order, so
+# a client syncing between two commits could move its cursor past a change
+# that shows up later. Changes of a user take their number under a lock of
+# the user held until commit: a change is only visible once every change of
+# the user with a lower number is committed.
+LOCKED_SEQ_SQL = """
+CREATE FUNCTION core_message_next_change_seq(p_user_id bigint)
+RETURNS bigint AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(
+        hashtext('core_message_change'), hashtext(p_user_id::text));
+    RETURN nextval('core_message_change_seq');
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION core_message_track_change() RETURNS trigger AS $$
+BEGIN
+    NEW.change_seq := core_message_next_change_seq(NEW.user_id);
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION core_message_tombstone() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('core.archiving', true) = 'on' THEN
+        RETURN OLD;
+    END IF;
+    INSERT INTO core_messagetombstone
+        (user_id, message_id, change_seq, deleted_at)
+    VALUES
+        (OLD.user_id, OLD.id, core_message_next_change_seq(OLD.user_id),
+         now());
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+UNLOCKED_SEQ_SQL = """
+CREATE OR REPLACE FUNCTION core_message_track_change() RETURNS trigger AS $$
+BEGIN
+    NEW.change_seq := nextval('core_message_change_seq');
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION core_message_tombstone() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('core.archiving', true) = 'on' THEN
+        RETURN OLD;
+    END IF;
+    INSERT INTO core_messagetombstone
+        (user_id, message_id, change_seq, deleted_at)
+    VALUES
+        (OLD.user_id, OLD.id, nextval('core_message_change_seq'), now());
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION core_message_next_change_seq(bigint);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_message_archive'),
+    ]
+
+    operations = [
+        migrations.RunSQL(LOCKED_SEQ_SQL, UNLOCKED_SEQ_SQL),
+    ]
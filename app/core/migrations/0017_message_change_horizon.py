@@ -0,0 +1,115 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:40
+
+from django.db import migrations
+
+# Locking each user's changes until commit serialized the writes of a user
+# and could deadlock statements writing for several users. Instead, every
+# transaction changing messages announces the lowest change number it may
+# commit, with a shared advisory lock keyed on the sequence value read
+# before its first number is taken. Shared locks never wait on each other.
+# Readers only return changes up to the lowest announced number, so no
+# change below the returned cursor can become visible later.
+HORIZON_SQL = """
+CREATE FUNCTION core_message_take_change_seq() RETURNS bigint AS $$
+BEGIN
+    IF coalesce(current_setting('core.change_floor', true), '') = '' THEN
+        PERFORM pg_advisory_xact_lock_shared(
+            (SELECT last_value FROM core_message_change_seq));
+        PERFORM set_config('core.change_floor', 'on', true);
+    END IF;
+    RETURN nextval('core_message_change_seq');
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION core_message_change_horizon() RETURNS bigint AS $$
+DECLARE
+    horizon bigint;
+BEGIN
+    -- The sequence is read first: a transaction whose number is below it
+    -- already holds its lock.
+    SELECT last_value INTO horizon FROM core_message_change_seq;
+    RETURN least(horizon, (
+        SELECT min((classid::bigint << 32) | objid::bigint)
+        FROM pg_locks
+        WHERE locktype = 'advisory'
+            AND objsubid = 1
+            AND granted
+            AND pid <> pg_backend_pid()
+            AND database = (
+                SELECT oid FROM pg_database
+                WHERE datname = current_database()
+            )
+    ));
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION core_message_track_change() RETURNS trigger AS $$
+BEGIN
+    NEW.change_seq := core_message_take_change_seq();
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION core_message_tombstone() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('core.archiving', true) = 'on' THEN
+        RETURN OLD;
+    END IF;
+    INSERT INTO core_messagetombstone
+        (user_id, message_id, change_seq, deleted_at)
+    VALUES
+        (OLD.user_id, OLD.id, core_message_take_change_seq(), now());
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION core_message_next_change_seq(bigint);
+"""
+
+LOCKED_SEQ_SQL = """
+CREATE FUNCTION core_message_next_change_seq(p_user_id bigint)
+RETURNS bigint AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(
+        hashtext('core_message_change'), hashtext(p_user_id::text));
+    RETURN nextval('core_message_change_seq');
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION core_message_track_change() RETURNS trigger AS $$
+BEGIN
+    NEW.change_seq := core_message_next_change_seq(NEW.user_id);
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION core_message_tombstone() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('core.archiving', true) = 'on' THEN
+        RETURN OLD;
+    END IF;
+    INSERT INTO core_messagetombstone
+        (user_id, message_id, change_seq, deleted_at)
+    VALUES
+        (OLD.user_id, OLD.id, core_message_next_change_seq(OLD.user_id),
+         now());
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION core_message_change_horizon();
+DROP FUNCTION core_message_take_change_seq();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_message_change_seq_lock'),
+    ]
+
+    operations = [
+        migrations.RunSQL(HORIZON_SQL, LOCKED_SEQ_SQL),
+    ]
@@ -0,0 +1,77 @@
+"""
+MinHash signatures and LSH band buckets for near-duplicate detection.
+"""
+
+import hashlib
+import random
+import re
+
+NUM_BANDS = 16
+ROWS_PER_BAND = 4
+NUM_PERMUTATIONS = NUM_BANDS * ROWS_PER_BAND
+SHINGLE_SIZE = 3
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_rng = random.Random(1027)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def _hash64(data):
+    """Return a stable signed 64-bit hash of the bytes."""
+
+    digest = hashlib.blake2b(data, digest_size=8).digest()
+
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def shingles(text):
+    """Return the set of word shingles of the text."""
+
+    words = re.findall(r'\w+', (text or '').lower())
+
+    if len(words) <= SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+
+    return {
+        ' '.join(words[i:i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def signature(text):
+    """Return the MinHash signature of the text or None for empty text."""
+
+    hashes = [
+        _hash64(shingle.encode()) & _MAX_HASH
+        for shingle in shingles(text)
+    ]
+
+    if not hashes:
+        return None
+
+    return [
+        min((a * h + b) % _PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def band_buckets(text):
+    """Return a list of (band, bucket) pairs of the text signature."""
+
+    sig = signature(text)
+
+    if sig is None:
+        return []
+
+    buckets = []
+    for band in range(NUM_BANDS):
+        rows = sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        data = ','.join(map(str, rows)).encode()
+        buckets.append((band, _hash64(data)))
+
+    return buckets
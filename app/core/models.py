@@ -1,11 +1,27 @@
-from django.db import models
+import hashlib
+import secrets
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models.functions import Cast, Upper
 from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import OpClass
+from django.utils import timezone
+from django.contrib.auth.hashers import (
+    check_password,
+    get_hasher,
+    identify_hasher
+)
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin
 )
 
+from core import hashing
+from core.minhash import band_buckets
+
 
 class UserManager(BaseUserManager):
     """Manager for custom user model."""
@@ -48,6 +64,13 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255, null=True, blank=True)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    notify_by_email = models.BooleanField(default=False)
+    webhook_url = models.URLField(max_length=500, blank=True)
+    deletion_requested_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False
+    )
 
     objects = UserManager()
 
@@ -57,6 +80,126 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    def set_password(self, raw_password):
+        """Hash the password in the bounded hashing pool."""
+
+        hashing.run(super().set_password, raw_password)
+
+    def check_password(self, raw_password):
+        """
+        Verify the password in the bounded hashing pool, upgrading the
+        stored hash when the hashing algorithm or its settings changed.
+        """
+
+        valid = hashing.run(check_password, raw_password, self.password)
+
+        if valid and self._password_needs_upgrade():
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=['password'])
+
+        return valid
+
+    async def acheck_password(self, raw_password):
+        """
+        Verify the password in the bounded hashing pool without blocking
+        the event loop, upgrading the stored hash like check_password.
+        """
+
+        valid = await hashing.run_async(
+            check_password,
+            raw_password,
+            self.password
+        )
+
+        if valid and self._password_needs_upgrade():
+            await hashing.run_async(super().set_password, raw_password)
+            self._password = None
+            await sync_to_async(self.save)(update_fields=['password'])
+
+        return valid
+
+    def _password_needs_upgrade(self):
+        """Return True if the stored hash should be recomputed."""
+
+        preferred = get_hasher('default')
+
+        try:
+            hasher = identify_hasher(self.password)
+        except ValueError:
+            return False
+
+        return (
+            hasher.algorithm != preferred.algorithm
+            or preferred.must_update(self.password)
+        )
+
+
+class MessageManager(models.Manager):
+    """Manager for messages."""
+
+    def publish(self, messages):
+        """
+        Announce new messages on the Postgres notification channel, with
+        the change numbers set by the database. The notifications are sent
+        when the current transaction commits.
+        """
+
+        ids = [msg.id for msg in messages]
+
+        if not ids:
+            return
+
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f"SELECT pg_notify(%s, json_build_object("
+                f"'user_id', user_id, 'id', id, 'change_seq', change_seq, "
+                f"'email', email, 'title', title, 'created_at', created_at"
+                f")::text) FROM {self.model._meta.db_table} "
+                f"WHERE id = ANY(%s) ORDER BY change_seq",
+                [settings.MESSAGE_EVENTS_CHANNEL, ids]
+            )
+
+    def change_horizon(self):
+        """
+        Return the highest change number below which no change can become
+        visible later, as transactions commit in any order.
+        """
+
+        with connections[self.db].cursor() as cursor:
+            cursor.execute('SELECT core_message_change_horizon()')
+            return cursor.fetchone()[0]
+
+    def submit(self, user, **data):
+        """
+        Store a submitted message with its LSH bands and notifications.
+        Return a (message, created) tuple, reusing an identical message of
+        the user instead of storing a duplicate.
+        """
+
+        fingerprint = self.model.make_fingerprint(
+            data.get('email'),
+            data.get('title'),
+            data.get('content')
+        )
+        existing = self.filter(user=user, fingerprint=fingerprint).first()
+
+        if existing is not None:
+            return existing, False
+
+        try:
+            with transaction.atomic(using=self.db):
+                msg = self.create(user=user, fingerprint=fingerprint, **data)
+                MessageBand.objects.bulk_create(MessageBand.for_message(msg))
+                OutboxEvent.objects.bulk_create(
+                    OutboxEvent.for_message(msg, user)
+                )
+                self.publish([msg])
+        except IntegrityError:
+            return self.get(user=user, fingerprint=fingerprint), False
+
+        return msg, True
+
 
 class Message(models.Model):
     """Message object."""
@@ -67,15 +210,363 @@ class Message(models.Model):
         related_name='messages'
     )
     email = models.EmailField()
+    # Lowercased email, set by a database trigger.
+    email_normalized = models.CharField(
+        max_length=254,
+        default='',
+        editable=False
+    )
     name = models.CharField(max_length=100, null=True, blank=True)
     title = models.CharField(max_length=255, null=True, blank=True)
     content = models.TextField(max_length=1000)
     is_recent = models.BooleanField(default=True)
     is_read = models.BooleanField(default=False)
     is_answered = models.BooleanField(default=False)
+    is_spam = models.BooleanField(default=False)
+    spam_score = models.FloatField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Set by a database trigger from a sequence shared with tombstones.
+    change_seq = models.BigIntegerField(null=True, editable=False)
+    fingerprint = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        editable=False
+    )
+
+    objects = MessageManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'fingerprint'],
+                condition=models.Q(fingerprint__isnull=False),
+                name='unique_message_fingerprint_per_user'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'created_at', 'id'],
+                name='message_created_at_idx'
+            ),
+            models.Index(
+                fields=['user', 'email', 'id'],
+                name='message_email_idx'
+            ),
+            models.Index(
+                fields=['user', 'title', 'id'],
+                name='message_title_idx'
+            ),
+            models.Index(
+                fields=['user', 'is_read', 'id'],
+                name='message_read_idx'
+            ),
+            models.Index(
+                fields=['user', 'is_answered', 'id'],
+                name='message_answered_idx'
+            ),
+            models.Index(
+                fields=['user', 'spam_score', 'id'],
+                name='message_spam_score_idx'
+            ),
+            models.Index(
+                fields=['id'],
+                condition=models.Q(spam_score__isnull=True),
+                name='message_unscored_idx'
+            ),
+            models.Index(
+                fields=['user', 'change_seq'],
+                name='message_change_seq_idx'
+            ),
+            models.Index(
+                fields=['user', 'email_normalized', 'created_at'],
+                include=['is_read'],
+                name='message_sender_idx'
+            ),
+            models.Index(
+                fields=['created_at', 'id'],
+                name='message_admin_order_idx'
+            ),
+            # Serve the admin's case-insensitive prefix search, which
+            # compares UPPER(field::text) with LIKE 'TERM%'.
+            models.Index(
+                OpClass(
+                    Upper(Cast('email', models.TextField())),
+                    name='text_pattern_ops'
+                ),
+                name='message_email_search_idx'
+            ),
+            models.Index(
+                OpClass(
+                    Upper(Cast('title', models.TextField())),
+                    name='text_pattern_ops'
+                ),
+                name='message_title_search_idx'
+            ),
+        ]
 
     def __str__(self):
         """Return string representation of an object."""
 
         return f'Message from: {self.email}'
+
+    @staticmethod
+    def make_fingerprint(email, title, content):
+        """Return a content hash identifying a submitted message."""
+
+        parts = [
+            (email or '').strip().lower(),
+            (title or '').strip(),
+            (content or '').strip()
+        ]
+
+        return hashlib.sha256('\x1f'.join(parts).encode()).hexdigest()
+
+
+class MessageDailyCount(models.Model):
+    """
+    Number of messages of a user created on a day, maintained by a
+    database trigger.
+    """
+
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    day = models.DateField()
+    total = models.IntegerField(default=0)
+    read = models.IntegerField(default=0)
+    answered = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'day'],
+                name='unique_message_daily_count'
+            )
+        ]
+
+    def __str__(self):
+        """Return string representation of an object."""
+
+        return f'{self.day}: {self.total}'
+
+
+class MessageTombstone(models.Model):
+    """Record of a deleted message, written by a database trigger."""
+
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='+'
+    )
+    message_id = models.BigIntegerField()
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'change_seq'],
+                name='tombstone_change_seq_idx'
+            )
+        ]
+
+    def __str__(self):
+        """Return string representation of an object."""
+
+        return f'Deleted message: {self.message_id}'
+
+
+class MessageBand(models.Model):
+    """LSH band bucket of a message content signature."""
+
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    message = models.ForeignKey(
+        to=Message,
+        on_delete=models.CASCADE,
+        related_name='bands'
+    )
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'band', 'bucket'],
+                name='message_band_lookup_idx'
+            )
+        ]
+
+    @classmethod
+    def for_message(cls, message):
+        """Return unsaved band objects computed from the message content."""
+
+        return [
+            cls(user_id=message.user_id, message=message, band=b, bucket=k)
+            for b, k in band_buckets(message.content)
+        ]
+
+    @classmethod
+    def rebuild(cls, message):
+        """Replace the bands of the message with ones of its content."""
+
+        cls.objects.filter(message=message).delete()
+        cls.objects.bulk_create(cls.for_message(message))
+
+
+class OutboxEvent(models.Model):
+    """Notification waiting to be delivered to the owner of a message."""
+
+    EMAIL = 'email'
+    WEBHOOK = 'webhook'
+    CHANNEL_CHOICES = [(EMAIL, 'Email'), (WEBHOOK, 'Webhook')]
+
+    PENDING = 'pending'
+    DELIVERED = 'delivered'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (DELIVERED, 'Delivered'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='outbox_events'
+    )
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(status='pending'),
+                name='outbox_pending_idx'
+            )
+        ]
+
+    def __str__(self):
+        """Return string representation of an object."""
+
+        return f'{self.channel} notification for: {self.user_id}'
+
+    @classmethod
+    def for_message(cls, message, user):
+        """Return unsaved events for the channels the user subscribed to."""
+
+        payload = {
+            'id': message.id,
+            'email': message.email,
+            'title': message.title,
+            'created_at': message.created_at.isoformat(),
+        }
+        channels = []
+
+        if user.notify_by_email:
+            channels.append(cls.EMAIL)
+        if user.webhook_url:
+            channels.append(cls.WEBHOOK)
+
+        return [
+            cls(user=user, channel=channel, payload=payload)
+            for channel in channels
+        ]
+
+
+def make_submission_key():
+    """Return a new random public submission key."""
+
+    return secrets.token_urlsafe(24)
+
+
+class SubmissionKey(models.Model):
+    """Public key letting a website form submit messages to its owner."""
+
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='submission_keys'
+    )
+    name = models.CharField(max_length=255)
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+        default=make_submission_key,
+        editable=False
+    )
+    allowed_origins = ArrayField(
+        models.CharField(max_length=255),
+        default=list,
+        blank=True
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """Return string representation of an object."""
+
+        return f'Submission key {self.name} of: {self.user_id}'
+
+    def allows_origin(self, origin):
+        """Return whether a form served from the origin may submit."""
+
+        return not self.allowed_origins or origin in self.allowed_origins
+
+
+class MessageArchiveSegment(models.Model):
+    """
+    Append-only file of archived messages of a user, with the ranges of
+    their ids and dates to find the segments a lookup has to read.
+    """
+
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    path = models.CharField(max_length=255)
+    count = models.PositiveIntegerField()
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+    # Every message of the user created before this time is archived.
+    archived_before = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'first_id', 'last_id'],
+                name='archive_segment_id_idx'
+            ),
+            models.Index(
+                fields=['user', 'first_created_at', 'last_created_at'],
+                name='archive_segment_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        """Return string representation of an object."""
+
+        return f'Archive segment: {self.path}'
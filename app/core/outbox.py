@@ -0,0 +1,151 @@
+"""
+Delivery of new message notifications queued in the outbox.
+"""
+
+import json
+import urllib.request
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import OutboxEvent
+
+
+def send_email(user, payloads):
+    """Email the user about one or several new messages."""
+
+    if len(payloads) == 1:
+        subject = f'New message: {payloads[0]["title"] or payloads[0]["email"]}'
+    else:
+        subject = f'{len(payloads)} new messages'
+
+    body = '\n'.join(
+        f'{p["created_at"]}  {p["email"]}  {p["title"] or ""}'
+        for p in payloads
+    )
+    send_mail(subject, body, None, [user.email])
+
+
+def send_webhook(user, payloads):
+    """Post one or several new messages to the user's webhook."""
+
+    if len(payloads) == 1:
+        data = {'event': 'message.created', 'message': payloads[0]}
+    else:
+        data = {'event': 'message.digest', 'messages': payloads}
+
+    request = urllib.request.Request(
+        user.webhook_url,
+        data=json.dumps(data).encode(),
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    with urllib.request.urlopen(
+        request,
+        timeout=settings.OUTBOX_WEBHOOK_TIMEOUT
+    ):
+        pass
+
+
+SENDERS = {
+    OutboxEvent.EMAIL: send_email,
+    OutboxEvent.WEBHOOK: send_webhook,
+}
+
+
+def _deliveries(events):
+    """
+    Group events into deliveries, coalescing bursts of one user's events on
+    a channel into a single digest.
+    """
+
+    groups = defaultdict(list)
+    for event in events:
+        groups[(event.user_id, event.channel)].append(event)
+
+    for group in groups.values():
+        if len(group) >= settings.OUTBOX_DIGEST_THRESHOLD:
+            yield group
+        else:
+            yield from ([event] for event in group)
+
+
+def claim(batch_size=None):
+    """
+    Return a batch of due events, leased to the caller by moving their next
+    attempt past the lease in a short transaction. Events of a worker that
+    dies are picked up again once the lease expires.
+    """
+
+    now = timezone.now()
+
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.filter(
+                status=OutboxEvent.PENDING,
+                next_attempt_at__lte=now
+            ).select_related('user').order_by(
+                'next_attempt_at'
+            ).select_for_update(
+                skip_locked=True,
+                of=('self',)
+            )[:batch_size or settings.OUTBOX_BATCH_SIZE]
+        )
+        OutboxEvent.objects.filter(id__in=[e.id for e in events]).update(
+            next_attempt_at=now + timedelta(
+                seconds=settings.OUTBOX_LEASE_SECONDS
+            )
+        )
+
+    return events
+
+
+def drain(batch_size=None):
+    """
+    Deliver one batch of due events and return the number processed. The
+    senders run outside any transaction, so slow receivers hold no locks.
+    """
+
+    events = claim(batch_size)
+    now = timezone.now()
+
+    for delivery in _deliveries(events):
+        event = delivery[0]
+
+        try:
+            SENDERS[event.channel](
+                event.user,
+                [e.payload for e in delivery]
+            )
+        except Exception as e:
+            for event in delivery:
+                event.attempts += 1
+                event.last_error = str(e)
+                event.next_attempt_at = now + timedelta(
+                    seconds=settings.OUTBOX_BACKOFF_SECONDS
+                    * 2 ** (event.attempts - 1)
+                )
+                if event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                    event.status = OutboxEvent.FAILED
+        else:
+            for event in delivery:
+                event.attempts += 1
+                event.status = OutboxEvent.DELIVERED
+                event.delivered_at = now
+
+    OutboxEvent.objects.bulk_update(
+        events,
+        [
+            'attempts',
+            'last_error',
+            'next_attempt_at',
+            'status',
+            'delivered_at'
+        ]
+    )
+
+    return len(events)
@@ -0,0 +1,202 @@
+"""
+On-demand profiling of single requests made by staff users.
+"""
+
+import io
+import logging
+import re
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.utils import timezone
+
+HEADER = 'HTTP_X_PROFILE'
+QUERY_FLAG = '_profile'
+SALT = 'core.profiling'
+ALLOCATIONS_LIMIT = 50
+
+logger = logging.getLogger(__name__)
+
+# cProfile and tracemalloc hook the whole process, so a single request is
+# profiled at a time.
+_lock = threading.Lock()
+
+
+def profile_dir():
+    """Return the directory the profiles are saved to."""
+
+    return Path(settings.PROFILE_DIR)
+
+
+def make_token(user):
+    """Return a signed value of the profiling header for the staff user."""
+
+    return signing.dumps(user.pk, salt=SALT)
+
+
+def _token_user(token):
+    """Return the user the token was signed for, if still valid."""
+
+    try:
+        pk = signing.loads(
+            token,
+            salt=SALT,
+            max_age=settings.PROFILE_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+
+    return get_user_model().objects.filter(pk=pk, is_active=True).first()
+
+
+def requested(request):
+    """
+    Return whether the request asks to be profiled, by a signed header or by
+    the query flag with a staff session, and comes from a staff user.
+    """
+
+    token = request.META.get(HEADER)
+    if token:
+        user = _token_user(token)
+    elif QUERY_FLAG in request.GET:
+        user = request.user
+    else:
+        return False
+
+    return bool(user and user.is_staff)
+
+
+def _name(request):
+    """Return the file name stem of a profile of the request."""
+
+    path = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%S%f')
+
+    return f'{stamp}-{request.method.lower()}-{path}'
+
+
+def _save(request, profiler, snapshot, current, peak):
+    """Save the stats and the allocation summary of the request."""
+
+    import pstats
+
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    name = _name(request)
+
+    profiler.dump_stats(directory / f'{name}.prof')
+
+    summary = io.StringIO()
+    summary.write(f'{request.method} {request.get_full_path()}\n')
+    summary.write(f'Current: {current} B, peak: {peak} B\n\n')
+    for stat in snapshot.statistics('lineno')[:ALLOCATIONS_LIMIT]:
+        summary.write(f'{stat}\n')
+    summary.write('\n')
+    pstats.Stats(profiler, stream=summary).sort_stats(
+        'cumulative'
+    ).print_stats(ALLOCATIONS_LIMIT)
+
+    (directory / f'{name}.txt').write_text(summary.getvalue())
+
+
+def _start(request):
+    """
+    Start profiling the request and return the profiler and whether
+    tracemalloc was started for it, or None to run the request unprofiled,
+    while another one is profiled or when the profiler fails to start.
+    """
+
+    import cProfile
+    import tracemalloc
+
+    if not _lock.acquire(blocking=False):
+        logger.warning('Not profiling %s, busy with another request.',
+                       request.path)
+        return None
+
+    started = False
+    try:
+        profiler = cProfile.Profile()
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        profiler.enable()
+    except Exception:
+        logger.exception('Profiling %s failed.', request.path)
+        if started:
+            tracemalloc.stop()
+        _lock.release()
+        return None
+
+    return profiler, started
+
+
+def _finish(request, profiler, started):
+    """Stop profiling the request and save its stats, logging errors."""
+
+    import tracemalloc
+
+    profiler.disable()
+
+    try:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        _save(request, profiler, snapshot, current, peak)
+    except Exception:
+        logger.exception('Saving the profile of %s failed.', request.path)
+    finally:
+        if started:
+            tracemalloc.stop()
+        _lock.release()
+
+
+def profile(request, get_response):
+    """
+    Run the request under cProfile and tracemalloc, save the stats and the
+    allocation summary, and return the response. The request runs without
+    profiling while another one is profiled, and errors of the profiler are
+    logged rather than replacing the response.
+    """
+
+    state = _start(request)
+    if state is None:
+        return get_response(request)
+
+    try:
+        return get_response(request)
+    finally:
+        _finish(request, *state)
+
+
+async def aprofile(request, get_response):
+    """
+    Like profile, for an async get_response. The profiler also records the
+    other tasks the event loop runs meanwhile.
+    """
+
+    state = _start(request)
+    if state is None:
+        return await get_response(request)
+
+    try:
+        return await get_response(request)
+    finally:
+        _finish(request, *state)
+
+
+def saved():
+    """Return the saved profile files, the latest first."""
+
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+
+    paths = [
+        path for path in directory.iterdir()
+        if path.suffix in ('.prof', '.txt')
+    ]
+
+    return sorted(paths, key=lambda path: path.name, reverse=True)
@@ -0,0 +1,75 @@
+"""
+Background purge of deleted user accounts and their messages.
+"""
+
+from django.conf import settings
+from django.db import connection
+
+from core import archive
+from core.models import (
+    User,
+    Message,
+    MessageArchiveSegment,
+    MessageBand,
+    MessageTombstone,
+    OutboxEvent
+)
+
+# Tables holding many rows per user, emptied in batches before the user is
+# deleted. Bands reference messages so they go first, and deleting messages
+# writes tombstones, which are removed after them.
+PURGED_MODELS = [MessageBand, Message, OutboxEvent, MessageTombstone]
+
+
+def pending():
+    """Return the users whose accounts are waiting to be purged."""
+
+    return User.objects.filter(
+        deletion_requested_at__isnull=False
+    ).order_by('deletion_requested_at')
+
+
+def _delete_batch(model, user_id, after_id, batch_size):
+    """
+    Delete the next batch of the user's rows past the given id with a raw
+    DELETE, returning the ids deleted.
+    """
+
+    table = model._meta.db_table
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            f'SELECT id FROM {table} WHERE user_id = %s AND id > %s '
+            f'ORDER BY id LIMIT %s'
+            f') RETURNING id',
+            [user_id, after_id, batch_size]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def purge_user(user, batch_size=None):
+    """
+    Delete the user's rows in keyed batches, each committed on its own so
+    locks are held briefly, then the user's archive and the user. Yield
+    the model and the number of rows deleted after each step.
+    """
+
+    batch_size = batch_size or settings.ACCOUNT_PURGE_BATCH_SIZE
+
+    for model in PURGED_MODELS:
+        after_id = 0
+
+        while True:
+            ids = _delete_batch(model, user.id, after_id, batch_size)
+            if not ids:
+                break
+
+            after_id = max(ids)
+            yield model, len(ids)
+
+    count = archive.delete_user(user.id)
+    if count:
+        yield MessageArchiveSegment, count
+
+    user.delete()
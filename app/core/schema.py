@@ -0,0 +1,94 @@
+"""
+OpenAPI schema rendered once and served from a build artifact or memory.
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+
+RenderedSchema = namedtuple('RenderedSchema', ['content', 'gzipped', 'etag'])
+
+FORMATS = ['yaml', 'json']
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def render(fmt):
+    """Generate the schema and return it rendered in the format."""
+
+    from drf_spectacular.renderers import (
+        OpenApiJsonRenderer,
+        OpenApiYamlRenderer
+    )
+    from drf_spectacular.settings import spectacular_settings
+
+    renderer = {'yaml': OpenApiYamlRenderer, 'json': OpenApiJsonRenderer}[fmt]
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=True)
+
+    return renderer().render(schema, renderer_context={})
+
+
+def artifact_path(fmt, directory=None):
+    """Return the path of the schema artifact in the format."""
+
+    return Path(directory or settings.SCHEMA_DIR) / f'schema.{fmt}'
+
+
+def write_artifacts(directory=None):
+    """Render the schema in every format with gzipped copies to files."""
+
+    paths = []
+
+    for fmt in FORMATS:
+        path = artifact_path(fmt, directory)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        content = render(fmt)
+        path.write_bytes(content)
+        path.with_name(path.name + '.gz').write_bytes(gzip.compress(content))
+        paths.append(path)
+
+    return paths
+
+
+def _load(fmt):
+    """Return the rendered schema from its artifact or a fresh rendering."""
+
+    path = artifact_path(fmt)
+
+    if path.exists():
+        content = path.read_bytes()
+        gz_path = path.with_name(path.name + '.gz')
+        gzipped = (
+            gz_path.read_bytes() if gz_path.exists()
+            else gzip.compress(content)
+        )
+    else:
+        content = render(fmt)
+        gzipped = gzip.compress(content)
+
+    etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+    return RenderedSchema(content, gzipped, etag)
+
+
+def get(fmt):
+    """Return the rendered schema, loading it on first use."""
+
+    if fmt not in _cache:
+        with _lock:
+            if fmt not in _cache:
+                _cache[fmt] = _load(fmt)
+
+    return _cache[fmt]
+
+
+def clear():
+    """Forget the loaded schemas."""
+
+    _cache.clear()
@@ -0,0 +1,46 @@
+"""
+Views serving the OpenAPI schema, loaded on their first request.
+"""
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+
+from drf_spectacular.views import SpectacularAPIView
+
+from core import schema
+
+
+class CachedSchemaView(SpectacularAPIView):
+    """
+    Serve the OpenAPI schema rendered once, with ETag and gzip support.
+    The schema is generated on every request only in debug mode.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """Return the rendered schema in the negotiated format."""
+
+        if settings.DEBUG:
+            return super().get(request, *args, **kwargs)
+
+        renderer = request.accepted_renderer
+        rendered = schema.get('json' if renderer.format == 'json' else 'yaml')
+
+        if rendered.etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(
+                rendered.gzipped,
+                content_type=request.accepted_media_type
+            )
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(
+                rendered.content,
+                content_type=request.accepted_media_type
+            )
+
+        response['ETag'] = rendered.etag
+        patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+
+        return response
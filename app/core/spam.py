@@ -0,0 +1,83 @@
+"""
+Naive Bayes spam classifier trained on a user's own message history.
+"""
+
+import math
+import re
+from collections import Counter
+
+from core.models import Message
+
+MAX_TRAINING_MESSAGES = 2000
+
+
+def tokenize(text):
+    """Return the list of lowercased word tokens of the text."""
+
+    return re.findall(r'\w+', (text or '').lower())
+
+
+class SpamClassifier:
+    """Multinomial Naive Bayes model with Laplace smoothing."""
+
+    def __init__(self, spam_texts, ham_texts):
+        spam_counts = Counter()
+        ham_counts = Counter()
+
+        for text in spam_texts:
+            spam_counts.update(tokenize(text))
+        for text in ham_texts:
+            ham_counts.update(tokenize(text))
+
+        self.trained = bool(spam_texts and ham_texts)
+        self.weights = {}
+
+        if not self.trained:
+            return
+
+        vocabulary = spam_counts.keys() | ham_counts.keys()
+        spam_norm = math.log(sum(spam_counts.values()) + len(vocabulary))
+        ham_norm = math.log(sum(ham_counts.values()) + len(vocabulary))
+
+        # Per token log likelihood ratios, so scoring is a sum of lookups.
+        self.prior = math.log(len(spam_texts) / len(ham_texts))
+        self.default_weight = ham_norm - spam_norm
+        self.weights = {
+            token: (
+                math.log(spam_counts[token] + 1)
+                - math.log(ham_counts[token] + 1)
+                + self.default_weight
+            )
+            for token in vocabulary
+        }
+
+    def score(self, text):
+        """Return the probability that the text is spam."""
+
+        if not self.trained:
+            return 0.5
+
+        log_odds = self.prior + sum(
+            n * self.weights.get(token, self.default_weight)
+            for token, n in Counter(tokenize(text)).items()
+        )
+
+        if log_odds >= 0:
+            return 1 / (1 + math.exp(-log_odds))
+
+        return 1 - 1 / (1 + math.exp(log_odds))
+
+    @classmethod
+    def for_user(cls, user_id):
+        """Train and return a classifier from the user's labeled messages."""
+
+        history = Message.objects.filter(user_id=user_id).order_by('-id')
+        spam = history.filter(is_spam=True).values_list('content', flat=True)
+        ham = history.filter(is_spam=False).filter(
+            is_read=True
+        ).values_list('content', flat=True)
+
+        return cls(
+            list(spam[:MAX_TRAINING_MESSAGES]),
+            list(ham[:MAX_TRAINING_MESSAGES])
+        )
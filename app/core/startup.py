@@ -0,0 +1,66 @@
+"""
+Measurement of the imports a cold process runs before serving requests.
+"""
+
+import os
+import subprocess
+import sys
+from collections import namedtuple
+
+ImportEntry = namedtuple('ImportEntry', ['module', 'self_us', 'cumulative_us'])
+
+# Loads what a fresh worker loads before its first request: the settings,
+# the installed apps, the WSGI handler with its middleware and the views
+# of every url.
+COLD_START = '''
+import django
+django.setup()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+'''
+
+
+def measure(code=COLD_START):
+    """
+    Run the code in a fresh interpreter with -X importtime and return the
+    modules it imported, in import order.
+    """
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        env={
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get(
+                'DJANGO_SETTINGS_MODULE',
+                'app.settings'
+            ),
+        },
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        entries.append(
+            ImportEntry(module.strip(), int(self_us), int(cumulative_us))
+        )
+
+    return entries
+
+
+def by_package(entries):
+    """Return the self import time of the entries summed by top package."""
+
+    totals = {}
+    for entry in entries:
+        package = entry.module.split('.')[0]
+        totals[package] = totals.get(package, 0) + entry.self_us
+
+    return totals
@@ -0,0 +1,66 @@
+"""
+In-process cache resolving public submission keys to their owners.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from core.models import SubmissionKey
+
+_lock = threading.Lock()
+# Known and unknown keys are kept apart, least recently used first, so
+# that a spray of unknown keys cannot evict the known ones.
+_cache = OrderedDict()
+_unknown = OrderedDict()
+
+
+def resolve(key):
+    """
+    Return the active submission key with its active owner loaded, or None.
+    Lookups, including of unknown keys, are cached for
+    SUBMISSION_KEY_CACHE_TTL seconds, and the least recently used entries
+    are evicted when a cache is full.
+    """
+
+    now = time.monotonic()
+
+    with _lock:
+        for cache in (_cache, _unknown):
+            cached = cache.get(key)
+            if cached is not None and cached[1] > now:
+                cache.move_to_end(key)
+                return cached[0]
+
+    submission_key = SubmissionKey.objects.select_related('user').filter(
+        key=key,
+        is_active=True,
+        user__is_active=True
+    ).first()
+
+    if submission_key is None:
+        cache, size = _unknown, settings.SUBMISSION_KEY_UNKNOWN_CACHE_SIZE
+    else:
+        cache, size = _cache, settings.SUBMISSION_KEY_CACHE_SIZE
+
+    with _lock:
+        _cache.pop(key, None)
+        _unknown.pop(key, None)
+        cache[key] = (submission_key, now + settings.SUBMISSION_KEY_CACHE_TTL)
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+    return submission_key
+
+
+def invalidate(**kwargs):
+    """
+    Forget the cached keys, when keys or their owners change. Other
+    processes pick the change up when their entries expire.
+    """
+
+    with _lock:
+        _cache.clear()
+        _unknown.clear()
@@ -0,0 +1,30 @@
+"""
+Temporary archive storage for tests of archived messages.
+"""
+
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.test import override_settings
+
+
+def override_archive_storage(test):
+    """
+    Point the archive storage to a temporary directory for the duration of
+    the test and return the directory.
+    """
+
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    override = override_settings(STORAGES={
+        **settings.STORAGES,
+        'archive': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+            'OPTIONS': {'location': directory.name},
+        },
+    })
+    override.enable()
+    test.addCleanup(override.disable)
+
+    return Path(directory.name)
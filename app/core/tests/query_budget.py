@@ -0,0 +1,89 @@
+"""
+Query budget assertions for API endpoints.
+"""
+
+import os
+import sys
+from abc import ABCMeta, abstractmethod
+
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetTestCase(TestCase, metaclass=ABCMeta):
+    """
+    Test case running requests against seeded data of several sizes and
+    asserting the number of queries stays within a declared budget and does
+    not grow with the size of the data. Set QUERY_BUDGET_REPORT to print
+    the queries of every request.
+    """
+
+    sizes = (2, 8, 32)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.query_counts = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        """Report the queries of every request by seeded size, if asked."""
+
+        if cls.query_counts and os.environ.get('QUERY_BUDGET_REPORT'):
+            sizes = ', '.join(str(size) for size in cls.sizes)
+            lines = [f'\n{cls.__name__} queries by size ({sizes}):']
+            lines += [
+                f'  {label.strip()}: '
+                + ', '.join(str(counts[size]) for size in cls.sizes)
+                for label, counts in sorted(cls.query_counts.items())
+            ]
+            print('\n'.join(lines), file=sys.stderr)
+
+        super().tearDownClass()
+
+    @abstractmethod
+    def seed(self, size):
+        """Create data of the given size and return it for the request."""
+
+    def count_queries(self, size, method, url, data=None, **extra):
+        """
+        Seed data of the given size, run the request and return the number
+        of queries. The seeded data is rolled back afterwards.
+        """
+
+        with transaction.atomic():
+            seeded = self.seed(size)
+            if callable(url):
+                url = url(seeded)
+
+            with CaptureQueriesContext(connection) as queries:
+                r = getattr(self.client, method)(url, data, **extra)
+
+            self.assertLess(r.status_code, 400, r.content)
+            transaction.set_rollback(True)
+
+        return len(queries)
+
+    def assertQueryBudget(self, budget, method, url, data=None, **extra):
+        """
+        Assert the request runs at most budget queries for every seeded size,
+        and the same number of queries whatever the size.
+        """
+
+        counts = {
+            size: self.count_queries(size, method, url, data, **extra)
+            for size in self.sizes
+        }
+        name = getattr(url, '__name__', url)
+        label = f'{method.upper()} {name} {data or ""}'
+        self.query_counts[label] = counts
+
+        self.assertEqual(
+            len(set(counts.values())), 1,
+            f'{label}: queries grow with the data size: {counts}'
+        )
+        self.assertLessEqual(
+            max(counts.values()), budget,
+            f'{label}: queries exceed the budget of {budget}: {counts}'
+        )
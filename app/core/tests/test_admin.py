@@ -3,11 +3,18 @@ Tests for Django admin modifications.
 """
 
 from django.urls import reverse
-from django.test import TestCase, Client
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.admin.models import DELETION, LogEntry
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
 
 from rest_framework import status
 
+from core.models import Message, MessageBand, MessageTombstone
+
 
 class AdminSiteTests(TestCase):
     """Tests for Django admin."""
@@ -49,3 +56,226 @@ class AdminSiteTests(TestCase):
         r = self.client.get(url)
 
         self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+    def test_message_deleted_in_admin_leaves_tombstone(self):
+        """Test deleting a message in the admin records a tombstone."""
+
+        msg = Message.objects.create(
+            user=self.user,
+            email='sender@example.com',
+            content='Content'
+        )
+        url = reverse('admin:core_message_delete', args=[msg.id])
+
+        r = self.client.post(url, {'post': 'yes'})
+
+        self.assertEqual(r.status_code, status.HTTP_302_FOUND)
+        self.assertTrue(
+            MessageTombstone.objects.filter(
+                user=self.user,
+                message_id=msg.id
+            ).exists()
+        )
+
+
+class MessageAdminTests(TestCase):
+    """Tests for the message changelist and its bulk actions."""
+
+    url = reverse('admin:core_message_changelist')
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email='test_admin_super@example.com',
+            password='test_pass123'
+        )
+        self.client.force_login(self.admin_user)
+        self.user = get_user_model().objects.create_user(
+            email='test_admin_user@example.com',
+            password='test_pass123'
+        )
+        self.messages = [
+            Message.objects.create(
+                user=self.user,
+                email=f'sender{i}@example.com',
+                title=f'Title {i}',
+                content='Content'
+            ) for i in range(3)
+        ]
+
+    def post_action(self, action, **data):
+        """Run the admin action on all messages, return the queries run."""
+
+        with CaptureQueriesContext(connection) as queries:
+            r = self.client.post(self.url, {
+                'action': action,
+                '_selected_action': [msg.id for msg in self.messages],
+                **data
+            })
+
+        self.assertEqual(r.status_code, status.HTTP_302_FOUND)
+
+        return [q['sql'] for q in queries]
+
+    def test_exact_count_below_threshold(self):
+        """Test small changelists are counted exactly."""
+
+        r = self.client.get(self.url)
+
+        self.assertEqual(r.context['cl'].result_count, 3)
+
+    @override_settings(ADMIN_COUNT_ESTIMATE_THRESHOLD=0)
+    def test_estimated_count_above_threshold(self):
+        """Test large changelists are not counted with COUNT(*)."""
+
+        with CaptureQueriesContext(connection) as queries:
+            r = self.client.get(self.url)
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            [q for q in queries if 'COUNT(' in q['sql'].upper()]
+        )
+
+    def test_search_uses_indexes(self):
+        """Test searching by email or title prefix is served by indexes."""
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+        plan = Message.objects.filter(
+            Q(email__istartswith='sender1') | Q(title__istartswith='sender1')
+        ).explain()
+
+        self.assertIn('message_email_search_idx', plan)
+        self.assertIn('message_title_search_idx', plan)
+
+        r = self.client.get(self.url, {'q': 'SENDER1'})
+
+        self.assertEqual(r.context['cl'].result_count, 1)
+
+    def test_mark_read_single_update(self):
+        """Test marking messages as read runs a single UPDATE."""
+
+        queries = self.post_action('mark_read')
+
+        self.assertEqual(
+            len([q for q in queries if q.startswith('UPDATE')]), 1
+        )
+        self.assertEqual(Message.objects.filter(is_read=False).count(), 0)
+
+    def test_mark_read_needs_change_permission(self):
+        """Test staff users who can only view messages can't update them."""
+
+        staff = get_user_model().objects.create_user(
+            email='test_admin_staff@example.com',
+            password='test_pass123'
+        )
+        staff.is_staff = True
+        staff.save()
+        staff.user_permissions.add(
+            Permission.objects.get(codename='view_message')
+        )
+        self.client.force_login(staff)
+
+        r = self.client.get(self.url)
+        self.client.post(self.url, {
+            'action': 'mark_read',
+            '_selected_action': [msg.id for msg in self.messages]
+        })
+
+        self.assertNotContains(r, 'value="mark_read"')
+        self.assertEqual(Message.objects.filter(is_read=True).count(), 0)
+
+    def test_delete_messages_confirmed_first(self):
+        """Test deleting messages asks for confirmation first."""
+
+        r = self.client.post(self.url, {
+            'action': 'delete_messages',
+            '_selected_action': [msg.id for msg in self.messages]
+        })
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertContains(r, 'name="post" value="yes"')
+        self.assertEqual(Message.objects.count(), 3)
+
+    def test_delete_messages_single_delete(self):
+        """Test deleting messages runs a single statement with tombstones."""
+
+        queries = self.post_action('delete_messages', post='yes')
+
+        self.assertEqual(
+            len([q for q in queries if 'DELETE' in q]), 1
+        )
+        self.assertFalse(Message.objects.exists())
+        self.assertFalse(MessageBand.objects.exists())
+        self.assertEqual(MessageTombstone.objects.count(), 3)
+        self.assertEqual(
+            LogEntry.objects.filter(
+                user=self.admin_user,
+                action_flag=DELETION
+            ).count(),
+            3
+        )
+
+    def edit(self, msg, **fields):
+        """Post the admin change form of the message with the fields."""
+
+        data = {
+            'user': msg.user_id,
+            'email': msg.email,
+            'name': '',
+            'title': msg.title,
+            'content': msg.content,
+            'is_recent': 'on',
+        }
+        data.update(fields)
+
+        return self.client.post(
+            reverse('admin:core_message_change', args=[msg.id]),
+            data
+        )
+
+    def test_edit_updates_fingerprint(self):
+        """Test editing a message stores the fingerprint of the edit."""
+
+        msg = self.messages[0]
+
+        r = self.edit(msg, content='Edited')
+
+        self.assertEqual(r.status_code, status.HTTP_302_FOUND)
+        msg.refresh_from_db()
+        self.assertEqual(
+            msg.fingerprint,
+            Message.make_fingerprint(msg.email, msg.title, 'Edited')
+        )
+
+    def test_edit_into_duplicate_refused(self):
+        """Test an edit making two messages identical is refused."""
+
+        self.edit(self.messages[0], content='Edited')
+
+        r = self.edit(
+            self.messages[1],
+            email=self.messages[0].email,
+            title=self.messages[0].title,
+            content='Edited'
+        )
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertContains(r, 'An identical message of this user')
+
+    def test_edit_rebuilds_bands(self):
+        """Test editing the content of a message replaces its bands."""
+
+        msg = self.messages[0]
+        MessageBand.objects.bulk_create(MessageBand.for_message(msg))
+
+        self.edit(msg, content='Completely different content of the message')
+
+        msg.refresh_from_db()
+        self.assertEqual(
+            sorted(MessageBand.objects.filter(
+                message=msg
+            ).values_list('band', 'bucket')),
+            sorted((b.band, b.bucket) for b in MessageBand.for_message(msg))
+        )
@@ -2,13 +2,39 @@
 Tests for custom Django management commands.
 """
 
+import gzip
+import io
+import json
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2Error
 
+from drf_spectacular.drainage import GENERATOR_STATS
+
+from django.core import mail
 from django.core.management import call_command
+from django.db import connection
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from datetime import timedelta
+
+from core import archive, outbox, startup
+from core.models import (
+    Message,
+    MessageArchiveSegment,
+    MessageBand,
+    MessageDailyCount,
+    MessageTombstone,
+    OutboxEvent
+)
+from core.tests.archive_storage import override_archive_storage
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -35,3 +61,567 @@ class CommandTests(SimpleTestCase):
 
         self.assertEquals(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class BuildMessageBandsTests(TestCase):
+    """Test building LSH bands for existing messages."""
+
+    def test_build_message_bands(self):
+        """Test messages without bands get indexed."""
+
+        user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='test_pass123'
+        )
+        msg = Message.objects.create(
+            user=user,
+            email='sender@example.com',
+            content='Some content to be indexed'
+        )
+
+        call_command('build_message_bands')
+
+        self.assertTrue(MessageBand.objects.filter(message=msg).exists())
+
+
+class ScoreMessagesTests(TestCase):
+    """Test scoring queued messages."""
+
+    def test_score_messages(self):
+        """Test unscored messages get scores from the user's history."""
+
+        user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='test_pass123'
+        )
+        for i in range(3):
+            Message.objects.create(
+                user=user,
+                email='spam@example.com',
+                content=f'Win a free prize now {i}',
+                is_spam=True,
+                spam_score=1
+            )
+            Message.objects.create(
+                user=user,
+                email='client@example.com',
+                content=f'Please send the invoice for order {i}',
+                is_read=True,
+                spam_score=0
+            )
+        spam = Message.objects.create(
+            user=user,
+            email='new@example.com',
+            content='Claim your free prize'
+        )
+        ham = Message.objects.create(
+            user=user,
+            email='new@example.com',
+            content='Where is the invoice for my order?'
+        )
+
+        call_command('score_messages')
+
+        spam.refresh_from_db()
+        ham.refresh_from_db()
+        self.assertGreater(spam.spam_score, 0.5)
+        self.assertLess(ham.spam_score, 0.5)
+
+
+class WebhookReceiver(BaseHTTPRequestHandler):
+    """Local stand-in for a webhook endpoint recording posted bodies."""
+
+    received = []
+    status_code = 200
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        self.received.append(json.loads(self.rfile.read(length)))
+        self.send_response(self.status_code)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(OUTBOX_DIGEST_THRESHOLD=3, OUTBOX_BACKOFF_SECONDS=60)
+class DeliverOutboxTests(TestCase):
+    """Test delivering queued notifications."""
+
+    def setUp(self):
+        WebhookReceiver.received = []
+        WebhookReceiver.status_code = 200
+        self.server = HTTPServer(('127.0.0.1', 0), WebhookReceiver)
+        threading.Thread(target=self.server.serve_forever).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='test_pass123'
+        )
+        self.user.notify_by_email = True
+        self.user.webhook_url = f'http://127.0.0.1:{self.server.server_port}/'
+        self.user.save()
+
+    def queue(self, n):
+        """Create n messages with their outbox events."""
+
+        for i in range(n):
+            msg = Message.objects.create(
+                user=self.user,
+                email='sender@example.com',
+                title=f'Title {i}',
+                content='Content'
+            )
+            OutboxEvent.objects.bulk_create(
+                OutboxEvent.for_message(msg, self.user)
+            )
+
+    def test_deliver_single_events(self):
+        """Test events below the digest threshold are sent one by one."""
+
+        self.queue(2)
+
+        call_command('deliver_outbox')
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(len(WebhookReceiver.received), 2)
+        self.assertEqual(
+            WebhookReceiver.received[0]['event'],
+            'message.created'
+        )
+        self.assertFalse(
+            OutboxEvent.objects.exclude(status=OutboxEvent.DELIVERED).exists()
+        )
+
+    def test_burst_coalesced_into_digest(self):
+        """Test a burst of events is delivered as one digest per channel."""
+
+        self.queue(4)
+
+        call_command('deliver_outbox')
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, '4 new messages')
+        self.assertEqual(len(WebhookReceiver.received), 1)
+        self.assertEqual(len(WebhookReceiver.received[0]['messages']), 4)
+
+    def test_failed_delivery_retried_with_backoff(self):
+        """Test a failing webhook is rescheduled instead of delivered."""
+
+        WebhookReceiver.status_code = 500
+        self.queue(1)
+
+        call_command('deliver_outbox')
+
+        event = OutboxEvent.objects.get(channel=OutboxEvent.WEBHOOK)
+        self.assertEqual(event.status, OutboxEvent.PENDING)
+        self.assertEqual(event.attempts, 1)
+        self.assertGreater(event.next_attempt_at, event.created_at)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+    def test_delivery_outside_transaction(self):
+        """Test events are delivered with no transaction or lock held."""
+
+        self.queue(1)
+        outer = len(connection.atomic_blocks)
+        atomic_blocks = []
+
+        def send(user, payloads):
+            atomic_blocks.append(len(connection.atomic_blocks))
+
+        with patch.dict(outbox.SENDERS, {
+            OutboxEvent.EMAIL: send,
+            OutboxEvent.WEBHOOK: send,
+        }):
+            outbox.drain()
+
+        # Only the blocks the test case runs in are open while sending.
+        self.assertEqual(atomic_blocks, [outer, outer])
+        self.assertFalse(
+            OutboxEvent.objects.exclude(status=OutboxEvent.DELIVERED).exists()
+        )
+
+    def test_claimed_events_leased(self):
+        """Test claimed events are not claimed again before the lease ends."""
+
+        self.queue(1)
+
+        self.assertEqual(len(outbox.claim()), 2)
+        self.assertEqual(outbox.claim(), [])
+
+
+class BuildSchemaTests(SimpleTestCase):
+    """Test rendering the schema artifacts."""
+
+    def test_build_schema(self):
+        """Test the schema is written in every format with gzip copies."""
+
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('build_schema', dir=directory, stdout=io.StringIO())
+
+            for name in ('schema.yaml', 'schema.json'):
+                path = Path(directory) / name
+                self.assertIn(b'openapi', path.read_bytes())
+                self.assertEqual(
+                    gzip.decompress((Path(directory) / f'{name}.gz').read_bytes()),
+                    path.read_bytes()
+                )
+
+    def test_build_schema_without_warnings(self):
+        """Test every view is described without spectacular guessing."""
+
+        GENERATOR_STATS.reset()
+        self.addCleanup(GENERATOR_STATS.reset)
+
+        with tempfile.TemporaryDirectory() as directory, \
+                GENERATOR_STATS.silence():
+            call_command('build_schema', dir=directory, stdout=io.StringIO())
+
+        self.assertFalse(GENERATOR_STATS)
+
+
+class RebuildMessageRollupTests(TestCase):
+    """Test rebuilding the daily message counts."""
+
+    def test_rebuild_message_rollup(self):
+        """Test drifted counts are recomputed from the messages."""
+
+        user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='test_pass123'
+        )
+        Message.objects.create(
+            user=user,
+            email='sender@example.com',
+            content='Content',
+            is_read=True
+        )
+        MessageDailyCount.objects.filter(user=user).update(total=10, read=0)
+
+        call_command('rebuild_message_rollup', stdout=io.StringIO())
+
+        count = MessageDailyCount.objects.get(user=user)
+        self.assertEqual((count.total, count.read), (1, 1))
+
+
+class PurgeAccountsTests(TestCase):
+    """Test purging accounts whose deletion was requested."""
+
+    def test_purge_accounts(self):
+        """Test pending accounts are purged in batches, others are kept."""
+
+        users = [
+            get_user_model().objects.create_user(
+                email=f'test{i}@example.com',
+                password='test_pass123'
+            ) for i in range(2)
+        ]
+        get_user_model().objects.update(notify_by_email=True)
+        for user in users:
+            user.refresh_from_db()
+        for user in users:
+            for i in range(3):
+                Message.objects.submit(
+                    user,
+                    email='sender@example.com',
+                    content=f'Content number {i}'
+                )
+        get_user_model().objects.filter(id=users[0].id).update(
+            is_active=False,
+            deletion_requested_at=timezone.now()
+        )
+        out = io.StringIO()
+
+        call_command('purge_accounts', batch_size=2, stdout=out)
+
+        self.assertFalse(
+            get_user_model().objects.filter(id=users[0].id).exists()
+        )
+        for model in (Message, MessageBand, OutboxEvent, MessageTombstone):
+            self.assertFalse(model.objects.filter(user=users[0]).exists())
+        self.assertEqual(Message.objects.filter(user=users[1]).count(), 3)
+        self.assertIn('2 messages deleted', out.getvalue())
+        self.assertIn('3 messages deleted', out.getvalue())
+        self.assertIn('Purged 1 accounts.', out.getvalue())
+
+
+class ArchiveMessagesTests(TestCase):
+    """Test moving old messages to the archive."""
+
+    def setUp(self):
+        self.directory = override_archive_storage(self)
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='test_pass123'
+        )
+        for i in range(5):
+            Message.objects.submit(
+                self.user,
+                email='sender@example.com',
+                title=f'Question {i}',
+                content=f'Content number {i}'
+            )
+        self.old = list(
+            Message.objects.order_by('id').values_list('id', flat=True)[:3]
+        )
+        Message.objects.filter(id__in=self.old).update(
+            created_at=timezone.now() - timedelta(days=400),
+            is_read=True
+        )
+
+    def test_archive_messages(self):
+        """Test old messages are moved to segments and read back."""
+
+        expected = {msg.id: msg for msg in Message.objects.filter(
+            id__in=self.old
+        )}
+        out = io.StringIO()
+
+        call_command('archive_messages', batch_size=2, stdout=out)
+
+        self.assertFalse(Message.objects.filter(id__in=self.old).exists())
+        self.assertEqual(Message.objects.count(), 2)
+        self.assertFalse(MessageBand.objects.filter(
+            message_id__in=self.old
+        ).exists())
+        self.assertFalse(MessageTombstone.objects.exists())
+        self.assertEqual(
+            sum(MessageDailyCount.objects.values_list('total', flat=True)),
+            5
+        )
+
+        segments = MessageArchiveSegment.objects.order_by('first_id')
+        self.assertEqual([s.count for s in segments], [2, 1])
+        for segment in segments:
+            self.assertTrue((self.directory / segment.path).is_file())
+        self.assertIn('Archived 3 messages', out.getvalue())
+
+        archived = archive.get(self.user.id, self.old)
+        self.assertEqual(sorted(archived), self.old)
+        for pk, msg in archived.items():
+            for name in archive.COLUMNS:
+                self.assertEqual(
+                    getattr(msg, name),
+                    getattr(expected[pk], name)
+                )
+            self.assertEqual(msg.user_id, self.user.id)
+
+    def test_rebuild_rollup_counts_archived(self):
+        """Test rebuilding the daily counts keeps the archived messages."""
+
+        call_command('archive_messages', stdout=io.StringIO())
+        MessageDailyCount.objects.update(total=0, read=0)
+
+        call_command('rebuild_message_rollup', stdout=io.StringIO())
+
+        counts = MessageDailyCount.objects.order_by('day')
+        self.assertEqual(
+            [(count.total, count.read) for count in counts],
+            [(3, 3), (2, 0)]
+        )
+
+    def test_rebuild_rollup_reads_archive_before_lock(self):
+        """Test archive segments are read without blocking message writes."""
+
+        call_command('archive_messages', stdout=io.StringIO())
+        daily_counts = archive.daily_counts
+        locked = []
+
+        def read(segment):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*) FROM pg_locks WHERE pid = "
+                    "pg_backend_pid() AND mode = 'ShareLock' AND "
+                    "relation = 'core_message'::regclass"
+                )
+                locked.append(cursor.fetchone()[0])
+            return daily_counts(segment)
+
+        with patch('core.archive.daily_counts', read):
+            call_command('rebuild_message_rollup', stdout=io.StringIO())
+
+        self.assertTrue(locked)
+        self.assertEqual(set(locked), {0})
+
+    def test_archived_messages_purged(self):
+        """Test purging an account deletes its archive."""
+
+        call_command('archive_messages', stdout=io.StringIO())
+        get_user_model().objects.filter(id=self.user.id).update(
+            is_active=False,
+            deletion_requested_at=timezone.now()
+        )
+
+        call_command('purge_accounts', stdout=io.StringIO())
+
+        self.assertFalse(MessageArchiveSegment.objects.exists())
+        self.assertFalse(list(self.directory.rglob('*.seg')))
+
+
+class SummarizeTracesTests(SimpleTestCase):
+    """Test summarizing the traced span paths."""
+
+    def test_summarize_traces(self):
+        """Test span paths are aggregated, the slowest first."""
+
+        def span(span_id, parent, name, ms):
+            return {
+                'traceId': 'a' * 32,
+                'spanId': span_id,
+                'parentSpanId': parent,
+                'name': name,
+                'startTimeUnixNano': '0',
+                'endTimeUnixNano': str(ms * 1000000),
+            }
+
+        export = {'resourceSpans': [{'scopeSpans': [{'spans': [
+            span('1', '', 'GET messages/', 30),
+            span('2', '1', 'sql', 20),
+        ]}]}]}
+
+        with tempfile.TemporaryDirectory() as trace_dir:
+            trace_file = Path(trace_dir) / 'spans.jsonl'
+            trace_file.write_text(json.dumps(export) + '\n')
+            out = io.StringIO()
+
+            with override_settings(TRACING_FILE=trace_file):
+                call_command('summarize_traces', stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[1].endswith('GET messages/'))
+        self.assertTrue(lines[2].endswith('GET messages/ > sql'))
+        self.assertIn('20.0', lines[2])
+        self.assertIn('Summarized 1 traces.', lines[-1])
+
+
+class ReplayReceiver(BaseHTTPRequestHandler):
+    """Local stand-in for an instance recording replayed requests."""
+
+    received = []
+
+    def handle_request(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.received.append({
+            'method': self.command,
+            'path': self.path,
+            'auth': self.headers.get('Authorization'),
+            'body': json.loads(self.rfile.read(length)) if length else None,
+        })
+        self.send_response(500 if 'stats' in self.path else 200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = do_POST = handle_request
+
+    def log_message(self, *args):
+        pass
+
+
+class ReplayTrafficTests(SimpleTestCase):
+    """Test replaying captured traffic."""
+
+    def setUp(self):
+        ReplayReceiver.received = []
+        self.server = HTTPServer(('127.0.0.1', 0), ReplayReceiver)
+        threading.Thread(target=self.server.serve_forever).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_replay_traffic(self):
+        """Test captured shapes are replayed and reported per route."""
+
+        shapes = [
+            {
+                'time': 100.0, 'method': 'GET', 'route': 'messages/',
+                'path': '/api/message/messages/',
+                'query': {'search': ['xxx'], 'filter': ['read']},
+                'body_size': 0, 'body': {}, 'auth': 'token',
+            },
+            {
+                'time': 100.1, 'method': 'POST', 'route': 'messages/',
+                'path': '/api/message/messages/', 'query': {},
+                'body_size': 120,
+                'body': {'email': 'str', 'content': 'str', 'is_read': 'bool'},
+                'auth': 'token',
+            },
+            {
+                'time': 100.2, 'method': 'GET', 'route': 'messages/stats/',
+                'path': '/api/message/messages/stats/', 'query': {},
+                'body_size': 0, 'body': {}, 'auth': 'anonymous',
+            },
+        ]
+
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as f:
+            f.write(''.join(json.dumps(s) + '\n' for s in reversed(shapes)))
+            f.flush()
+            out = io.StringIO()
+
+            call_command(
+                'replay_traffic',
+                f.name,
+                url=f'http://127.0.0.1:{self.server.server_port}',
+                token='secret',
+                concurrency=1,
+                speedup=0,
+                stdout=out
+            )
+
+        received = ReplayReceiver.received
+        self.assertEqual(
+            received[0]['path'],
+            '/api/message/messages/?search=xxx&filter=read'
+        )
+        self.assertEqual(received[0]['auth'], 'Token secret')
+        self.assertEqual(received[1]['body']['email'], 'replay1@example.com')
+        self.assertTrue(received[1]['body']['is_read'])
+        self.assertEqual(len(json.dumps(received[1]['body'])), 120)
+        self.assertIsNone(received[2]['auth'])
+
+        lines = out.getvalue().splitlines()
+        self.assertIn('GET messages/stats/', lines[2])
+        self.assertIn('100.0%', lines[2])
+        self.assertIn('total', lines[-1])
+
+
+class StartupReportTests(SimpleTestCase):
+    """Test the cold start import report and budget."""
+
+    # Modules a worker only needs once a request asks for them.
+    LAZY_MODULES = [
+        'cProfile',
+        'core.schema_views',
+        'dotenv',
+        'drf_spectacular.views',
+        'tracemalloc',
+    ]
+    # A cold start imports about 775 modules, raise with care.
+    MODULE_BUDGET = 825
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.entries = startup.measure()
+
+    def test_cold_start_import_budget(self):
+        """Test a cold start stays within its import budget."""
+
+        modules = {entry.module for entry in self.entries}
+
+        for module in self.LAZY_MODULES:
+            self.assertNotIn(module, modules)
+        self.assertLessEqual(len(modules), self.MODULE_BUDGET)
+
+    def test_startup_report(self):
+        """Test the report lists modules and packages by import time."""
+
+        out = io.StringIO()
+        with patch('core.startup.measure', return_value=self.entries):
+            call_command('startup_report', limit=3, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 10)
+        self.assertIn('django', out.getvalue())
+        self.assertIn(f'Imported {len(self.entries)} modules', lines[-1])
@@ -0,0 +1,119 @@
+"""
+Tests for the password hashing pool.
+"""
+
+import threading
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+
+from django.urls import reverse
+from django.test import SimpleTestCase, TestCase
+from django.contrib.auth import get_user_model
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import hashing
+
+
+def saturated_pool():
+    """Return a pool without free slots."""
+
+    return None, threading.Semaphore(0)
+
+
+class HashingPoolTests(SimpleTestCase):
+    """Test running functions in the hashing pool."""
+
+    def test_run_in_pool_thread(self):
+        """Test the function runs in a worker and its result is returned."""
+
+        name = hashing.run(lambda: threading.current_thread().name)
+
+        self.assertTrue(name.startswith('password-hashing'))
+
+    def test_metrics_recorded(self):
+        """Test completed hashes are counted with their timings."""
+
+        before = hashing.metrics()['completed']
+
+        hashing.run(lambda: None)
+
+        metrics = hashing.metrics()
+        self.assertEqual(metrics['completed'], before + 1)
+        self.assertIn('avg_wait_seconds', metrics)
+        self.assertIn('avg_hash_seconds', metrics)
+
+    def test_run_async_in_pool_thread(self):
+        """Test the awaitable path runs the function in a worker."""
+
+        run = async_to_sync(hashing.run_async)
+        name = run(lambda: threading.current_thread().name)
+
+        self.assertTrue(name.startswith('password-hashing'))
+
+    @patch('core.hashing._get_executor', saturated_pool)
+    def test_saturated_pool_sheds_load(self):
+        """Test a saturated pool raises instead of queueing."""
+
+        with self.assertRaises(hashing.PasswordHashingBusy):
+            hashing.run(lambda: None)
+
+        with self.assertRaises(hashing.PasswordHashingBusy):
+            async_to_sync(hashing.run_async)(lambda: None)
+
+
+class HashingApiTests(TestCase):
+    """Test API behaviour of the hashing pool."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='test_pass123'
+        )
+
+    def test_login_when_saturated_returns_503(self):
+        """Test logging in while the pool is saturated fails fast."""
+
+        payload = {'email': 'test@example.com', 'password': 'test_pass123'}
+
+        with patch('core.hashing._get_executor', saturated_pool):
+            r = self.client.post(reverse('user:token'), payload)
+
+        self.assertEqual(r.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_admin_login_when_saturated_returns_503(self):
+        """Test the admin login sheds load with 503 rather than 500."""
+
+        payload = {'username': 'test@example.com', 'password': 'test_pass123'}
+
+        with patch('core.hashing._get_executor', saturated_pool):
+            r = self.client.post(reverse('admin:login'), payload)
+
+        self.assertEqual(r.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', r)
+
+    def test_acheck_password(self):
+        """Test the async password check verifies in the pool."""
+
+        check = async_to_sync(self.user.acheck_password)
+
+        self.assertTrue(check('test_pass123'))
+        self.assertFalse(check('wrong_pass'))
+
+    def test_metrics_staff_only(self):
+        """Test the metrics are available to staff users only."""
+
+        url = reverse('user:hashing-metrics')
+        self.client.force_authenticate(self.user)
+        r_user = self.client.get(url)
+
+        self.user.is_staff = True
+        self.user.save()
+        r_staff = self.client.get(url)
+
+        self.assertEqual(r_user.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(r_staff.status_code, status.HTTP_200_OK)
+        self.assertIn('avg_wait_seconds', r_staff.data)
@@ -0,0 +1,346 @@
+"""
+Tests for views that don't belong to any app.
+"""
+
+import gzip
+import json
+import tempfile
+from unittest.mock import patch
+
+from pathlib import Path
+
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from asgiref.sync import SyncToAsync
+
+from django.core.handlers.asgi import ASGIHandler
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from core import profiling, schema, tracing
+
+SCHEMA_URL = reverse('api-schema')
+PROFILES_URL = reverse('admin-profiles')
+MESSAGES_URL = reverse('message-list')
+ASYNC_MESSAGES_URL = reverse('async-message-list')
+
+
+class SchemaViewTests(TestCase):
+    """Tests for serving the OpenAPI schema."""
+
+    def setUp(self):
+        schema_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(schema_dir.cleanup)
+        settings = override_settings(SCHEMA_DIR=schema_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        schema.clear()
+        self.addCleanup(schema.clear)
+
+    def test_schema_generated_once(self):
+        """Test the schema is rendered on the first request only."""
+
+        with patch('core.schema.render', wraps=schema.render) as render:
+            r1 = self.client.get(SCHEMA_URL)
+            r2 = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(r1.status_code, status.HTTP_200_OK)
+        self.assertEqual(r1.content, r2.content)
+        self.assertIn(b'openapi', r1.content)
+        self.assertEqual(render.call_count, 1)
+
+    def test_schema_served_from_artifact(self):
+        """Test an artifact written by the command is served as is."""
+
+        path = schema.artifact_path('json')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'{"openapi": "from artifact"}')
+
+        r = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        self.assertEqual(r.content, b'{"openapi": "from artifact"}')
+
+    def test_schema_not_modified(self):
+        """Test a matching If-None-Match gets a 304 response."""
+
+        etag = self.client.get(SCHEMA_URL)['ETag']
+
+        r = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_schema_gzipped(self):
+        """Test the schema is compressed for clients accepting gzip."""
+
+        plain = self.client.get(SCHEMA_URL)
+        r = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='gzip, br')
+
+        self.assertEqual(r['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(r.content), plain.content)
+
+    @override_settings(DEBUG=True)
+    def test_schema_live_in_debug(self):
+        """Test the schema is generated on each request in debug mode."""
+
+        with patch('core.schema.render') as render:
+            r = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        render.assert_not_called()
+
+
+class ProfilingTests(TestCase):
+    """Tests for profiling requests of staff users."""
+
+    def setUp(self):
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        self.profile_dir = Path(profile_dir.name)
+        settings = override_settings(PROFILE_DIR=profile_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.staff = get_user_model().objects.create_user(
+            email='staff@example.com',
+            password='test_pass123'
+        )
+        self.staff.is_staff = True
+        self.staff.save()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='test_pass123'
+        )
+
+    def test_profile_by_signed_header(self):
+        """Test a staff token request is profiled with allocations."""
+
+        token = Token.objects.create(user=self.staff)
+
+        r = self.client.get(
+            MESSAGES_URL,
+            HTTP_AUTHORIZATION=f'Token {token.key}',
+            HTTP_X_PROFILE=profiling.make_token(self.staff)
+        )
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        suffixes = sorted(p.suffix for p in self.profile_dir.iterdir())
+        self.assertEqual(suffixes, ['.prof', '.txt'])
+        summary = next(self.profile_dir.glob('*.txt')).read_text()
+        self.assertIn('peak', summary)
+
+    def test_profiler_errors_keep_response(self):
+        """Test a failing profile save doesn't replace the response."""
+
+        self.client.force_login(self.staff)
+
+        with patch('core.profiling._save', side_effect=RuntimeError):
+            r = self.client.get(MESSAGES_URL, {profiling.QUERY_FLAG: 1})
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+    def test_one_request_profiled_at_a_time(self):
+        """Test requests overlapping a profiled one run unprofiled."""
+
+        self.client.force_login(self.staff)
+
+        with profiling._lock:
+            r = self.client.get(MESSAGES_URL, {profiling.QUERY_FLAG: 1})
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(self.profile_dir.iterdir()), [])
+
+    async def test_profile_async_request(self):
+        """Test an async view is profiled in the event loop."""
+
+        token = await Token.objects.acreate(user=self.staff)
+
+        r = await self.async_client.get(
+            ASYNC_MESSAGES_URL,
+            headers={
+                'Authorization': f'Token {token.key}',
+                'X-Profile': profiling.make_token(self.staff),
+            }
+        )
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        suffixes = sorted(p.suffix for p in self.profile_dir.iterdir())
+        self.assertEqual(suffixes, ['.prof', '.txt'])
+
+    def test_not_profiled_for_non_staff(self):
+        """Test flags from users who are not staff are ignored."""
+
+        self.client.force_login(self.user)
+
+        self.client.get(MESSAGES_URL, {profiling.QUERY_FLAG: 1})
+        self.client.get(
+            MESSAGES_URL,
+            HTTP_X_PROFILE=profiling.make_token(self.user)
+        )
+        self.client.get(MESSAGES_URL, HTTP_X_PROFILE='forged')
+
+        self.assertEqual(list(self.profile_dir.iterdir()), [])
+
+    def test_browse_and_download_profiles(self):
+        """Test staff can list and download profiles from the admin."""
+
+        self.client.force_login(self.staff)
+        self.client.get(MESSAGES_URL, {profiling.QUERY_FLAG: 1})
+        name = next(self.profile_dir.glob('*.txt')).name
+
+        r = self.client.get(PROFILES_URL)
+
+        self.assertContains(r, name)
+
+        r = self.client.get(reverse('admin-profile-download', args=[name]))
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertIn(b'peak', b''.join(r.streaming_content))
+
+    def test_profiles_page_staff_only(self):
+        """Test the profiles page is not available to other users."""
+
+        self.client.force_login(self.user)
+
+        r = self.client.get(PROFILES_URL)
+
+        self.assertEqual(r.status_code, status.HTTP_302_FOUND)
+
+
+class TracingTests(TestCase):
+    """Tests for span tracing of sampled requests."""
+
+    def setUp(self):
+        trace_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(trace_dir.cleanup)
+        self.trace_file = Path(trace_dir.name) / 'spans.jsonl'
+        settings = override_settings(
+            TRACING_SAMPLE_RATE=1,
+            TRACING_FILE=self.trace_file
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(tracing.reset)
+
+        user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='test_pass123'
+        )
+        self.token = Token.objects.create(user=user)
+
+    def test_request_phases_exported(self):
+        """Test the phases of a request are exported as OTLP spans."""
+
+        self.client.get(
+            MESSAGES_URL,
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+        tracing.reset()
+
+        export = json.loads(self.trace_file.read_text())
+        spans = export['resourceSpans'][0]['scopeSpans'][0]['spans']
+        names = {span['name'] for span in spans}
+        trace_ids = {span['traceId'] for span in spans}
+
+        self.assertTrue({
+            'MessageViewSet.get',
+            'authenticate',
+            'check_permissions',
+            'get_queryset',
+            'sql',
+            'render',
+        } <= names)
+        self.assertEqual(len(trace_ids), 1)
+
+        root = next(span for span in spans if not span['parentSpanId'])
+        self.assertIn('messages', root['name'])
+
+    async def test_async_request_traced(self):
+        """Test requests to async views are traced as well."""
+
+        await self.async_client.get(
+            ASYNC_MESSAGES_URL,
+            headers={'Authorization': f'Token {self.token.key}'}
+        )
+        tracing.reset()
+
+        export = json.loads(self.trace_file.read_text())
+        spans = export['resourceSpans'][0]['scopeSpans'][0]['spans']
+        root = next(span for span in spans if not span['parentSpanId'])
+
+        self.assertIn('async', root['name'])
+
+    @override_settings(TRACING_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        """Test nothing is traced with a zero sample rate."""
+
+        self.client.get(
+            MESSAGES_URL,
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+        self.assertFalse(self.trace_file.exists())
+
+
+class CaptureTests(TestCase):
+    """Tests for capturing the shapes of API requests."""
+
+    def setUp(self):
+        capture_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(capture_dir.cleanup)
+        self.capture_file = Path(capture_dir.name) / 'capture.jsonl'
+        settings = override_settings(CAPTURE_FILE=self.capture_file)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='test_pass123'
+        )
+        self.token = Token.objects.create(user=user)
+
+    def test_requests_captured_sanitized(self):
+        """Test request shapes are captured without free text or bodies."""
+
+        auth = f'Token {self.token.key}'
+        self.client.get(
+            MESSAGES_URL,
+            {'search': 'secret', 'filter': 'read'},
+            HTTP_AUTHORIZATION=auth
+        )
+        self.client.post(
+            MESSAGES_URL,
+            {'email': 'private@example.com', 'content': 'Private content'},
+            content_type='application/json',
+            HTTP_AUTHORIZATION=auth
+        )
+        self.client.get(reverse('index'))
+
+        content = self.capture_file.read_text()
+        listed, created = [json.loads(line) for line in content.splitlines()]
+
+        self.assertNotIn('secret', content)
+        self.assertNotIn('private', content.lower())
+        self.assertEqual(listed['route'], 'api/message/messages/$')
+        self.assertEqual(listed['query'], {
+            'search': ['xxxxxx'],
+            'filter': ['read']
+        })
+        self.assertEqual(listed['auth'], 'token')
+        self.assertEqual(created['method'], 'POST')
+        self.assertEqual(created['status'], status.HTTP_201_CREATED)
+        self.assertEqual(created['body'], {'email': 'str', 'content': 'str'})
+        self.assertGreater(created['body_size'], 0)
+
+
+class MiddlewareTests(SimpleTestCase):
+    """Tests for the middleware of the project."""
+
+    def test_async_handler_without_thread_hop(self):
+        """Test the middleware runs in the event loop under ASGI."""
+
+        handler = ASGIHandler()
+
+        self.assertNotIsInstance(handler._middleware_chain, SyncToAsync)
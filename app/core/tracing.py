@@ -0,0 +1,235 @@
+"""
+Lightweight span tracing of sampled requests, exported as OpenTelemetry
+(OTLP) JSON lines to a rotating local file.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+
+SERVICE_NAME = 'app'
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+_current = ContextVar('core.tracing.current', default=None)
+_lock = threading.Lock()
+_logger = None
+
+
+class Span:
+    """A timed operation of a trace, with its parent and attributes."""
+
+    def __init__(self, trace, name, parent=None, kind=SPAN_KIND_INTERNAL,
+                 attributes=None):
+        self.trace = trace
+        self.name = name
+        self.parent = parent
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.span_id = os.urandom(8).hex()
+        self.start = time.time_ns()
+        self.end = None
+
+    def to_otlp(self):
+        """Return the span in the OTLP JSON encoding."""
+
+        return {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent.span_id if self.parent else '',
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end),
+            'attributes': [
+                {'key': key, 'value': {'stringValue': str(value)}}
+                for key, value in self.attributes.items()
+            ],
+        }
+
+
+class Trace:
+    """Spans recorded for one request."""
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+
+    def to_otlp(self):
+        """Return the trace as an OTLP JSON export request."""
+
+        return {
+            'resourceSpans': [{
+                'resource': {
+                    'attributes': [{
+                        'key': 'service.name',
+                        'value': {'stringValue': SERVICE_NAME}
+                    }]
+                },
+                'scopeSpans': [{
+                    'scope': {'name': __name__},
+                    'spans': [span.to_otlp() for span in self.spans],
+                }],
+            }]
+        }
+
+
+def sampled():
+    """Return whether a new request should be traced."""
+
+    rate = settings.TRACING_SAMPLE_RATE
+
+    return rate > 0 and random.random() < rate
+
+
+def active():
+    """Return whether the current request is traced."""
+
+    return _current.get() is not None
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Record the enclosed block as a span of the current trace. Outside of a
+    traced request this does nothing.
+    """
+
+    parent = _current.get()
+    if parent is None:
+        yield
+        return
+
+    current = Span(parent.trace, name, parent, attributes=attributes)
+    token = _current.set(current)
+
+    try:
+        yield
+    finally:
+        current.end = time.time_ns()
+        parent.trace.spans.append(current)
+        _current.reset(token)
+
+
+def _trace_query(execute, sql, params, many, context):
+    """Record the execution of a query as a span."""
+
+    with span('sql', statement=sql[:200]):
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def trace(name, **attributes):
+    """Trace the enclosed block as the root span and export it."""
+
+    root = Span(Trace(), name, kind=SPAN_KIND_SERVER, attributes=attributes)
+    token = _current.set(root)
+
+    try:
+        with connection.execute_wrapper(_trace_query):
+            yield root
+    finally:
+        root.end = time.time_ns()
+        root.trace.spans.append(root)
+        _current.reset(token)
+        export(root.trace)
+
+
+def _get_logger():
+    """Return the logger writing to the rotating trace file."""
+
+    global _logger
+
+    with _lock:
+        if _logger is None:
+            path = Path(settings.TRACING_FILE)
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+            handler = RotatingFileHandler(
+                path,
+                maxBytes=settings.TRACING_MAX_BYTES,
+                backupCount=settings.TRACING_BACKUP_COUNT
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+
+            _logger = logging.getLogger(f'{__name__}.export')
+            _logger.propagate = False
+            _logger.setLevel(logging.INFO)
+            _logger.addHandler(handler)
+
+        return _logger
+
+
+def reset():
+    """Close the trace file so the next export reopens it."""
+
+    global _logger
+
+    with _lock:
+        if _logger is not None:
+            for handler in _logger.handlers[:]:
+                handler.close()
+                _logger.removeHandler(handler)
+            _logger = None
+
+
+def export(trace):
+    """Append the trace to the trace file as one line of OTLP JSON."""
+
+    _get_logger().info(json.dumps(trace.to_otlp()))
+
+
+def trace_files():
+    """Return the trace file and its rotated backups, the oldest first."""
+
+    path = Path(settings.TRACING_FILE)
+    backups = [
+        path.with_name(f'{path.name}.{i}')
+        for i in range(settings.TRACING_BACKUP_COUNT, 0, -1)
+    ]
+
+    return [p for p in backups + [path] if p.exists()]
+
+
+class TracedViewMixin:
+    """
+    Trace the handler, authentication, permission and rendering phases of an
+    API view.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with span(f'{type(self).__name__}.{request.method.lower()}'):
+            return super().dispatch(request, *args, **kwargs)
+
+    def perform_authentication(self, request):
+        with span('authenticate'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with span('check_permissions'):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with span('check_object_permissions'):
+            super().check_object_permissions(request, obj)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+
+        if active() and hasattr(response, 'render'):
+            with span('render'):
+                response.render()
+
+        return response
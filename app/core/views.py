@@ -2,7 +2,35 @@
 Views for endpoints that don't belong to any app.
 """
 
-from django.views.generic import TemplateView
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404
+from django.utils.decorators import method_decorator
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic import TemplateView, View
+
+from core import profiling
+
+
+def lazy_view(path, **initkwargs):
+    """
+    Return a view importing the class-based view at the dotted path on its
+    first request, to keep tooling off the import path of a cold start.
+    """
+
+    view = None
+
+    @csrf_exempt
+    def dispatch(request, *args, **kwargs):
+        nonlocal view
+
+        if view is None:
+            view = import_string(path).as_view(**initkwargs)
+
+        return view(request, *args, **kwargs)
+
+    return dispatch
 
 
 class IndexView(TemplateView):
@@ -10,3 +38,37 @@ class IndexView(TemplateView):
 
     template_name = 'index.html'
 
+
+@method_decorator(staff_member_required, name='dispatch')
+class ProfileListView(TemplateView):
+    """Admin page listing the saved request profiles."""
+
+    template_name = 'admin/profiles.html'
+
+    def get_context_data(self, **kwargs):
+        """Return the profiles and the header value to request one."""
+
+        context = super().get_context_data(**kwargs)
+        context.update(
+            admin.site.each_context(self.request),
+            title='Request profiles',
+            profiles=profiling.saved(),
+            token=profiling.make_token(self.request.user),
+            query_flag=profiling.QUERY_FLAG
+        )
+
+        return context
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class ProfileDownloadView(View):
+    """Download a saved request profile."""
+
+    def get(self, request, name):
+        """Return the profile file of the name."""
+
+        for path in profiling.saved():
+            if path.name == name:
+                return FileResponse(open(path, 'rb'), as_attachment=True)
+
+        raise Http404
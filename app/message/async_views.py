@@ -0,0 +1,338 @@
+"""
+ASGI-native views for reading and submitting messages with the async ORM.
+"""
+
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
+
+from rest_framework import exceptions, status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from message.events import broker
+from message.filters import filter_messages, stats_aggregates
+from message.serializers import MessageSerializer, MessageDetailSerializer
+from message.views import MessageViewSet
+
+from core.models import Message
+
+
+class StreamingUnavailable(exceptions.APIException):
+    """Raised when an event stream is requested from a WSGI server."""
+
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = 'Event streams require the server to run over ASGI.'
+    default_code = 'not_implemented'
+
+
+def _authenticate_sync(request, authenticators):
+    """Run the blocking authenticators and return the authenticated user."""
+
+    drf_request = Request(request, authenticators=authenticators)
+
+    return drf_request.user
+
+
+class AsyncAPIView(View):
+    """
+    Base view authenticating requests like MessageViewSet does and
+    rendering JSON, without leaving the event loop for token lookups.
+    """
+
+    authentication_classes = MessageViewSet.authentication_classes
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        """Return the view, exempt from CSRF checks like DRF views are."""
+
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+
+        return view
+
+    def render(self, data, status_code=status.HTTP_200_OK, headers=None):
+        """Return a JSON response of the data."""
+
+        response = HttpResponse(
+            JSONRenderer().render(data),
+            status=status_code,
+            content_type='application/json'
+        )
+        for name, value in (headers or {}).items():
+            response[name] = value
+
+        return response
+
+    async def authenticate(self, request):
+        """Return the user making the request or None."""
+
+        authenticators = [auth() for auth in self.authentication_classes]
+        auth = request.headers.get('Authorization', '').split()
+
+        if len(auth) == 2 and auth[0] == 'Token' and any(
+            isinstance(a, TokenAuthentication) for a in authenticators
+        ):
+            token = await Token.objects.select_related(
+                'user'
+            ).filter(key=auth[1]).afirst()
+
+            if token is None or not token.user.is_active:
+                raise exceptions.AuthenticationFailed()
+
+            return token.user
+
+        user = await sync_to_async(_authenticate_sync)(request, authenticators)
+
+        return user if user.is_authenticated else None
+
+    def handle_exception(self, exc):
+        """Return the response for an API exception."""
+
+        headers = {}
+
+        if isinstance(exc, (
+            exceptions.NotAuthenticated,
+            exceptions.AuthenticationFailed
+        )):
+            auth_header = self.authentication_classes[0]().authenticate_header(
+                self.request
+            )
+            if auth_header:
+                headers['WWW-Authenticate'] = auth_header
+            else:
+                exc.status_code = status.HTTP_403_FORBIDDEN
+
+        data = exc.detail
+        if not isinstance(data, (list, dict)):
+            data = {'detail': data}
+
+        return self.render(data, exc.status_code, headers)
+
+    async def dispatch(self, request, *args, **kwargs):
+        """Authenticate the user and call the handler of the method."""
+
+        handler = getattr(
+            self,
+            request.method.lower(),
+            self.http_method_not_allowed
+        )
+
+        try:
+            request.user = await self.authenticate(request)
+            if request.user is None:
+                raise exceptions.NotAuthenticated()
+
+            return await handler(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    async def http_method_not_allowed(self, request, *args, **kwargs):
+        """Return the response for an unsupported method."""
+
+        raise exceptions.MethodNotAllowed(request.method)
+
+
+class MessageListView(AsyncAPIView):
+    """List and create messages of the authenticated user."""
+
+    async def get(self, request):
+        """Return the list of messages filtered like the viewset does."""
+
+        queryset = filter_messages(
+            Message.objects.filter(user=request.user),
+            request.GET
+        ).only(*MessageSerializer.Meta.fields)
+        messages = [msg async for msg in queryset.aiterator()]
+
+        return self.render(MessageSerializer(messages, many=True).data)
+
+    async def post(self, request):
+        """Create a new message, reusing an identical existing message."""
+
+        data = Request(
+            request,
+            parsers=[JSONParser(), FormParser(), MultiPartParser()]
+        ).data
+        serializer = MessageDetailSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        fields = serializer.validated_data
+
+        msg = await Message.objects.filter(
+            user=request.user,
+            fingerprint=Message.make_fingerprint(
+                fields.get('email'),
+                fields.get('title'),
+                fields.get('content')
+            )
+        ).afirst()
+        created = False
+
+        if msg is None:
+            # Django has no async transactions, so the transactional insert
+            # of the message with its bands and outbox events is one hop.
+            msg, created = await sync_to_async(Message.objects.submit)(
+                request.user,
+                **fields
+            )
+
+        return self.render(
+            MessageDetailSerializer(msg).data,
+            status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+
+class MessageDetailView(AsyncAPIView):
+    """Retrieve a message of the authenticated user."""
+
+    async def get(self, request, pk):
+        """Return the message or a not found error."""
+
+        msg = await Message.objects.filter(user=request.user, pk=pk).afirst()
+
+        if msg is None:
+            raise exceptions.NotFound()
+
+        return self.render(MessageDetailSerializer(msg).data)
+
+
+class MessageStatsView(AsyncAPIView):
+    """Count messages of the authenticated user."""
+
+    async def get(self, request):
+        """Return counts of the messages matching the parameters."""
+
+        queryset = filter_messages(
+            Message.objects.filter(user=request.user),
+            request.GET
+        )
+        stats = await queryset.order_by().aaggregate(**stats_aggregates())
+
+        return self.render(stats)
+
+
+class MessageEventsView(AsyncAPIView):
+    """
+    Stream new messages of the authenticated user as Server-Sent Events,
+    identified by their change numbers.
+    """
+
+    fields = ['id', 'change_seq', 'email', 'title', 'created_at']
+    retry_ms = 3000
+    replay_limit = MessageViewSet.changes_limit
+
+    @staticmethod
+    def format_event(event):
+        """Return the event encoded for the event stream."""
+
+        data = json.dumps(event, separators=(',', ':'))
+
+        return f'id: {event["change_seq"]}\nevent: message\ndata: {data}\n\n'
+
+    @staticmethod
+    def format_resync(horizon, since):
+        """
+        Return the event telling the client to fetch the changes after its
+        cursor from the changes endpoint, the stream resuming after horizon.
+        """
+
+        data = json.dumps({'since': since}, separators=(',', ':'))
+
+        return f'id: {horizon}\nevent: resync\ndata: {data}\n\n'
+
+    async def stream(self, user, last_event_id):
+        """
+        Yield the messages changed after the last event id, then new ones.
+        When more than replay_limit were changed, a resync event replaces
+        them.
+        """
+
+        queue = await broker.subscribe(user.id)
+        replayed = None
+        loop = asyncio.get_running_loop()
+        # Django does not notice disconnected clients while streaming, so
+        # streams end periodically and clients reconnect with Last-Event-ID.
+        deadline = loop.time() + settings.MESSAGE_EVENTS_MAX_AGE
+
+        try:
+            yield f'retry: {self.retry_ms}\n\n'
+
+            if last_event_id is not None:
+                # Subscribed first, so changes past the horizon come live.
+                replayed = await sync_to_async(
+                    Message.objects.change_horizon
+                )()
+                missed = Message.objects.filter(
+                    user=user,
+                    change_seq__gt=last_event_id,
+                    change_seq__lte=replayed
+                ).order_by('change_seq').values(
+                    *self.fields
+                )[:self.replay_limit + 1]
+                missed = [msg async for msg in missed]
+
+                if len(missed) > self.replay_limit:
+                    yield self.format_resync(replayed, last_event_id)
+                else:
+                    for msg in missed:
+                        msg['created_at'] = msg['created_at'].isoformat()
+                        yield self.format_event(msg)
+
+            while loop.time() < deadline:
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(),
+                        min(
+                            settings.MESSAGE_EVENTS_KEEPALIVE,
+                            deadline - loop.time()
+                        )
+                    )
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+
+                if event is None:
+                    return
+                if replayed is not None and event['change_seq'] <= replayed:
+                    continue
+
+                yield self.format_event(event)
+        finally:
+            broker.unsubscribe(user.id, queue)
+
+    async def get(self, request):
+        """Return the event stream, resuming after Last-Event-ID if sent."""
+
+        # A WSGI server would buffer the whole stream until it ends.
+        if not isinstance(request, ASGIRequest):
+            raise StreamingUnavailable()
+
+        last_event_id = request.headers.get(
+            'Last-Event-ID',
+            request.GET.get('last_event_id')
+        )
+
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            raise exceptions.ValidationError(
+                {'last_event_id': 'A number is required.'}
+            )
+
+        response = StreamingHttpResponse(
+            self.stream(request.user, last_event_id),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+
+        return response
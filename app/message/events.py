@@ -0,0 +1,130 @@
+"""
+In-process fan-out of new message events received with Postgres LISTEN.
+
+Each process keeps a single listening connection, however many clients
+are subscribed, so idle subscribers cost no queries.
+"""
+
+import asyncio
+import json
+from collections import defaultdict
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from django.conf import settings
+from django.db import connections
+
+
+class EventBroker:
+    """Dispatch notifications of the channel to per-user subscriber queues."""
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.connection = None
+        self.loop = None
+        self.lock = None
+
+    def _connect(self):
+        """Open an autocommit connection listening on the channel."""
+
+        params = connections['default'].get_connection_params()
+        params.pop('cursor_factory', None)
+        connection = psycopg2.connect(**params)
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql.SQL('LISTEN {}').format(
+                    sql.Identifier(settings.MESSAGE_EVENTS_CHANNEL)
+                )
+            )
+
+        return connection
+
+    async def _ensure_listening(self):
+        """Start listening on the running event loop if not yet done."""
+
+        loop = asyncio.get_running_loop()
+
+        if self.loop is not loop:
+            self.close()
+            self.loop = loop
+            self.lock = asyncio.Lock()
+
+        async with self.lock:
+            if self.connection is None:
+                self.connection = await loop.run_in_executor(None, self._connect)
+                loop.add_reader(self.connection.fileno(), self._on_readable)
+
+    def _disconnect_subscribers(self):
+        """Tell every subscriber to end its stream."""
+
+        for queues in self.subscribers.values():
+            for queue in queues:
+                self._end(queue)
+
+    @staticmethod
+    def _end(queue):
+        """Replace whatever is queued with the end of stream marker."""
+
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def _on_readable(self):
+        """Dispatch received notifications to the subscribers of the user."""
+
+        try:
+            self.connection.poll()
+        except psycopg2.Error:
+            self.close()
+            self._disconnect_subscribers()
+            return
+
+        while self.connection.notifies:
+            notify = self.connection.notifies.pop(0)
+            event = json.loads(notify.payload)
+
+            for queue in self.subscribers.get(event.pop('user_id'), ()):
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    # A lagging client reconnects and resumes from its
+                    # Last-Event-ID instead of buffering without bound.
+                    self._end(queue)
+
+    async def subscribe(self, user_id):
+        """Return a new queue receiving the events of the user."""
+
+        await self._ensure_listening()
+        queue = asyncio.Queue(maxsize=settings.MESSAGE_EVENTS_BUFFER)
+        self.subscribers[user_id].add(queue)
+
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        """Stop delivering events of the user to the queue."""
+
+        queues = self.subscribers.get(user_id)
+
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+    def close(self):
+        """Stop listening and close the connection."""
+
+        if self.connection is None:
+            return
+
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.remove_reader(self.connection.fileno())
+
+        self.connection.close()
+        self.connection = None
+
+
+broker = EventBroker()
@@ -0,0 +1,224 @@
+"""
+Filtering of message querysets by query parameters.
+"""
+
+from django.db.models import Count, Q
+from django.db.models.functions import Trunc
+
+from rest_framework.exceptions import ValidationError
+
+from datetime import datetime, timezone
+
+ORDERING_FIELDS = {
+    'created_at': 'created_at',
+    'email': 'email',
+    'title': 'title',
+    'read': 'is_read',
+    'answered': 'is_answered',
+    'spam_score': 'spam_score',
+}
+DEFAULT_ORDERING = '-created_at'
+FILTER_FLAGS = {
+    'recent': 'is_recent',
+    'read': 'is_read',
+    'answered': 'is_answered',
+}
+FACET_INTERVALS = ['day', 'week', 'month', 'year']
+
+
+def stats_aggregates():
+    """Return aggregates counting messages in total and by flags."""
+
+    aggregates = {'total': Count('id')}
+    for name, field in FILTER_FLAGS.items():
+        aggregates[name] = Count('id', filter=Q(**{field: True}))
+    aggregates['spam'] = Count('id', filter=Q(is_spam=True))
+
+    return aggregates
+
+
+def facet_counts(queryset, interval='month'):
+    """
+    Return counts of the messages by flags and a histogram of their dates,
+    computed by a single grouped aggregate query.
+    """
+
+    if interval not in FACET_INTERVALS:
+        raise ValidationError({'facet_interval': 'Unsupported interval.'})
+
+    aggregates = stats_aggregates()
+    rows = queryset.order_by().annotate(
+        bucket=Trunc('created_at', interval)
+    ).values('bucket').annotate(**aggregates).order_by('bucket')
+
+    facets = {name: 0 for name in aggregates}
+    histogram = []
+
+    for row in rows:
+        for name in aggregates:
+            facets[name] += row[name]
+        histogram.append({
+            'date': row['bucket'].date().isoformat(),
+            'count': row['total']
+        })
+
+    facets['histogram'] = histogram
+
+    return facets
+
+
+def parse_score(value):
+    """Return the score passed in a query parameter as a float."""
+
+    try:
+        return float(value)
+    except ValueError:
+        raise ValidationError({'score': 'A number is required.'})
+
+
+def parse_dates(query_params):
+    """
+    Return the start and end of the creation dates in the fd and td
+    parameters, None for those missing.
+    """
+
+    dates = []
+
+    for name in ('fd', 'td'):
+        value = query_params.get(name, None)
+
+        if value:
+            y, m, d = map(int, value.split('-'))
+            dates.append(datetime(y, m, d, 0, 0, 0, tzinfo=timezone.utc))
+        else:
+            dates.append(None)
+
+    return tuple(dates)
+
+
+def parse_ordering(query_params):
+    """Return the field messages are ordered by and if it is descending."""
+
+    ordering = query_params.get('ordering', None) or DEFAULT_ORDERING
+    field = ORDERING_FIELDS.get(ordering.lstrip('-'))
+
+    if field is None:
+        raise ValidationError({'ordering': 'Unsupported ordering.'})
+
+    return field, ordering.startswith('-')
+
+
+def filter_messages(queryset, query_params):
+    """Filter, order and return the queryset of messages."""
+
+    filter_params = query_params.get('filter', None)
+    search = query_params.get('search', None)
+    from_date, to_date = parse_dates(query_params)
+    min_score = query_params.get('min_score', None)
+    max_score = query_params.get('max_score', None)
+    field, descending = parse_ordering(query_params)
+    sender = query_params.get('sender', None)
+
+    if sender:
+        queryset = queryset.filter(email_normalized=sender.strip().lower())
+
+    if min_score:
+        queryset = queryset.filter(spam_score__gte=parse_score(min_score))
+
+    if max_score:
+        queryset = queryset.filter(spam_score__lte=parse_score(max_score))
+
+    if filter_params:
+        flags = Q()
+
+        for param in filter_params.split(','):
+            if param in FILTER_FLAGS:
+                flags |= Q(**{FILTER_FLAGS[param]: True})
+
+        queryset = queryset.filter(flags) if flags else queryset.none()
+
+    if search:
+        queryset = queryset.filter(
+            Q(email__icontains=search) |
+            Q(title__icontains=search) |
+            Q(content__icontains=search)
+        )
+
+    if from_date:
+        queryset = queryset.filter(created_at__gte=from_date)
+
+    if to_date:
+        queryset = queryset.filter(created_at__lt=to_date)
+
+    # Each field is backed by a (user, field, id) index, so the ordered
+    # list is read from the index without sorting the user's messages.
+    if descending:
+        queryset = queryset.order_by(f'-{field}', '-id')
+    else:
+        queryset = queryset.order_by(field, 'id')
+
+    return queryset
+
+
+def filter_archived(messages, query_params):
+    """
+    Return the archived messages passing the filters of filter_messages,
+    but the dates, which the archive lookup applies.
+    """
+
+    filter_params = query_params.get('filter', None)
+    search = (query_params.get('search', None) or '').lower()
+    min_score = query_params.get('min_score', None)
+    max_score = query_params.get('max_score', None)
+    sender = (query_params.get('sender', None) or '').strip().lower()
+
+    flags = []
+    if filter_params:
+        flags = [
+            FILTER_FLAGS[param] for param in filter_params.split(',')
+            if param in FILTER_FLAGS
+        ]
+        if not flags:
+            return []
+
+    min_score = parse_score(min_score) if min_score else None
+    max_score = parse_score(max_score) if max_score else None
+
+    def passes(msg):
+        if sender and msg.email_normalized != sender:
+            return False
+
+        if min_score is not None and (
+            msg.spam_score is None or msg.spam_score < min_score
+        ):
+            return False
+
+        if max_score is not None and (
+            msg.spam_score is None or msg.spam_score > max_score
+        ):
+            return False
+
+        if flags and not any(getattr(msg, flag) for flag in flags):
+            return False
+
+        return not search or any(
+            search in (value or '').lower()
+            for value in (msg.email, msg.title, msg.content)
+        )
+
+    return [msg for msg in messages if passes(msg)]
+
+
+def sort_messages(messages, query_params):
+    """
+    Return the messages in the order of filter_messages, with missing
+    values last in ascending order like in Postgres.
+    """
+
+    field, descending = parse_ordering(query_params)
+
+    def key(msg):
+        value = getattr(msg, field)
+        return value is None, value if value is not None else 0, msg.id
+
+    return sorted(messages, key=key, reverse=descending)
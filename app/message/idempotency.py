@@ -0,0 +1,35 @@
+"""
+Short-lived store of responses for idempotent message submission.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def _cache_key(user, key):
+    """Return a cache key for the user scoped idempotency key."""
+
+    digest = hashlib.sha256(key.encode()).hexdigest()
+
+    return f'idempotency:{user.id}:{digest}'
+
+
+def get_response(user, key):
+    """Return the stored (status, data) pair for the key or None."""
+
+    return cache.get(_cache_key(user, key))
+
+
+def store_response(user, key, status_code, data):
+    """Remember the response for the key for a limited time."""
+
+    cache.set(
+        _cache_key(user, key),
+        (status_code, data),
+        settings.IDEMPOTENCY_KEY_TTL
+    )
@@ -5,7 +5,7 @@ Serializers for message APIs.
 
 from rest_framework import serializers
 
-from core.models import Message
+from core.models import Message, SubmissionKey
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -30,6 +30,106 @@ class MessageDetailSerializer(MessageSerializer):
             'is_recent',
             'is_read',
             'is_answered',
+            'is_spam',
+            'spam_score',
             'created_at'
         ]
-        read_only_fields = ['id', 'created_at']
+        read_only_fields = ['id', 'spam_score', 'created_at']
+
+
+class PublicMessageSerializer(serializers.ModelSerializer):
+    """
+    Serializer for messages posted by public website forms, which can't
+    set the flags the owner manages.
+    """
+
+    class Meta:
+        model = Message
+        fields = ['email', 'name', 'title', 'content']
+
+
+class ClusterOperationSerializer(serializers.Serializer):
+    """Serializer for bulk operations on a cluster of similar messages."""
+
+    operation = serializers.ChoiceField(choices=['spam', 'delete'])
+    count = serializers.IntegerField(read_only=True)
+
+
+class MessageStatsSerializer(serializers.Serializer):
+    """Serializer for message counts."""
+
+    total = serializers.IntegerField()
+    recent = serializers.IntegerField()
+    read = serializers.IntegerField()
+    answered = serializers.IntegerField()
+    spam = serializers.IntegerField()
+
+
+class MessageChangeSerializer(serializers.Serializer):
+    """Serializer for a change of a message."""
+
+    type = serializers.ChoiceField(choices=['upsert', 'delete'])
+    change_seq = serializers.IntegerField()
+    id = serializers.IntegerField()
+    message = MessageDetailSerializer(allow_null=True)
+
+
+class MessageChangesSerializer(serializers.Serializer):
+    """Serializer for a page of message changes."""
+
+    changes = MessageChangeSerializer(many=True)
+    cursor = serializers.IntegerField()
+    has_more = serializers.BooleanField()
+
+
+class MessageVolumeQuerySerializer(serializers.Serializer):
+    """Serializer for parameters of the message volume."""
+
+    interval = serializers.ChoiceField(
+        choices=['day', 'week', 'month', 'year'],
+        default='day'
+    )
+    fd = serializers.DateField(required=False)
+    td = serializers.DateField(required=False)
+
+
+class MessageVolumeSerializer(serializers.Serializer):
+    """Serializer for the message volume of an interval."""
+
+    bucket = serializers.DateField()
+    total = serializers.IntegerField()
+    read = serializers.IntegerField()
+    answered = serializers.IntegerField()
+
+
+class SenderSerializer(serializers.Serializer):
+    """Serializer for messages grouped by their sender."""
+
+    email = serializers.CharField(source='email_normalized')
+    total = serializers.IntegerField()
+    unread = serializers.IntegerField()
+    last_activity = serializers.DateTimeField()
+    latest = MessageSerializer()
+
+
+class SenderPageSerializer(serializers.Serializer):
+    """Serializer for a page of senders."""
+
+    results = SenderSerializer(many=True)
+    next = serializers.CharField(allow_null=True)
+
+
+class SubmissionKeySerializer(serializers.ModelSerializer):
+    """Serializer for public submission keys of website forms."""
+
+    class Meta:
+        model = SubmissionKey
+        fields = [
+            'id',
+            'name',
+            'key',
+            'allowed_origins',
+            'is_active',
+            'created_at'
+        ]
+        read_only_fields = ['id', 'key', 'created_at']
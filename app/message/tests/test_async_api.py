@@ -0,0 +1,297 @@
+"""
+Tests for async message APIs.
+"""
+
+import asyncio
+
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Message
+
+from message.async_views import MessageEventsView
+from message.events import broker
+
+LIST_URL = reverse('async-message-list')
+STATS_URL = reverse('async-message-stats')
+EVENTS_URL = reverse('message-events')
+
+
+def detail_url(msg_id):
+    """Create and return async detail url for a particular message."""
+
+    return reverse('async-message-detail', args=[msg_id])
+
+
+def create_user(**params):
+    """Create and return a new user."""
+
+    defaults = {
+        'email': 'test@example.com',
+        'password': 'test_pass_123'
+    }
+    defaults.update(**params)
+
+    return get_user_model().objects.create_user(**defaults)
+
+
+def create_msg(user, **params):
+    """Create and return a message object."""
+
+    defaults = {
+        'email': 'subscriber@example.com',
+        'name': 'John Doe',
+        'title': 'Sample message title',
+        'content': 'Sample content for the message'
+    }
+    defaults.update(**params)
+
+    return Message.objects.create(user=user, **defaults)
+
+
+class PublicAsyncMessageApiTests(TestCase):
+    """Tests for async requests from unauthorized users."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_retrieve_list_unauthorized_error(self):
+        """Test listing messages fails for an unauthorized user."""
+
+        r = self.client.get(LIST_URL)
+
+        self.assertEqual(r.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_token_error(self):
+        """Test an unknown token is rejected."""
+
+        r = self.client.get(LIST_URL, HTTP_AUTHORIZATION='Token unknown')
+
+        self.assertEqual(r.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class PrivateAsyncMessageApiTests(TestCase):
+    """Tests for async requests of authenticated users."""
+
+    def setUp(self):
+        self.user = create_user(email='test_message@example.com')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_list_own_messages(self):
+        """Test listing returns only the user's messages."""
+
+        create_msg(self.user)
+        create_msg(self.user, is_read=True)
+        create_msg(create_user(email='other@example.com'))
+
+        r = self.client.get(LIST_URL)
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(r.json()), 2)
+
+    def test_list_filtered_like_viewset(self):
+        """Test the list accepts the same filters as the viewset."""
+
+        create_msg(self.user)
+        create_msg(self.user, is_recent=False, is_read=True, title='problem')
+        create_msg(self.user, is_recent=False)
+
+        r = self.client.get(LIST_URL, {'filter': 'read', 'search': 'problem'})
+
+        self.assertEqual(len(r.json()), 1)
+
+    def test_session_authentication(self):
+        """Test logged in users are authenticated through the session."""
+
+        create_msg(self.user)
+        client = APIClient()
+        client.force_login(self.user)
+
+        r = client.get(LIST_URL)
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(r.json()), 1)
+
+    def test_create_message(self):
+        """Test creating a message and deduplicating a resubmission."""
+
+        payload = {
+            'email': 'async@example.com',
+            'title': 'Async title',
+            'content': 'Async content.'
+        }
+        r1 = self.client.post(LIST_URL, payload, format='json')
+        r2 = self.client.post(LIST_URL, payload, format='json')
+
+        self.assertEqual(r1.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(r2.status_code, status.HTTP_200_OK)
+        msg = Message.objects.get(user=self.user)
+        self.assertEqual(r1.json()['id'], msg.id)
+        self.assertTrue(msg.bands.exists())
+
+    def test_create_invalid_message(self):
+        """Test validation errors are returned."""
+
+        r = self.client.post(LIST_URL, {'title': 'x'}, format='json')
+
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', r.json())
+
+    def test_retrieve_message(self):
+        """Test retrieving an own message and not a foreign one."""
+
+        msg = create_msg(self.user)
+        foreign = create_msg(create_user(email='other@example.com'))
+
+        r = self.client.get(detail_url(msg.id))
+        r_foreign = self.client.get(detail_url(foreign.id))
+
+        self.assertEqual(r.json()['content'], msg.content)
+        self.assertEqual(r_foreign.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stats(self):
+        """Test counting the user's messages by flags."""
+
+        create_msg(self.user)
+        create_msg(self.user, is_recent=False, is_read=True, is_answered=True)
+
+        r = self.client.get(STATS_URL)
+
+        self.assertEqual(r.json(), {
+            'total': 2,
+            'recent': 1,
+            'read': 1,
+            'answered': 1,
+            'spam': 0
+        })
+
+
+class MessageEventsTests(TransactionTestCase):
+    """Tests for the Server-Sent Events stream of new messages."""
+
+    def setUp(self):
+        self.user = create_user(email='test_message@example.com')
+        self.headers = {
+            'Authorization': f'Token {Token.objects.create(user=self.user)}'
+        }
+        self.addCleanup(broker.close)
+
+    async def open_stream(self, **headers):
+        """Open the stream and return an iterator over its chunks."""
+
+        r = await self.async_client.get(
+            EVENTS_URL,
+            headers={**self.headers, **headers}
+        )
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r['Content-Type'], 'text/event-stream')
+
+        stream = aiter(r.streaming_content)
+        retry = (await anext(stream)).decode()
+        self.assertTrue(retry.startswith('retry: '))
+
+        return stream
+
+    def test_wsgi_request_refused(self):
+        """Test the stream is refused when not served over ASGI."""
+
+        r = self.client.get(EVENTS_URL, headers=self.headers)
+
+        self.assertEqual(r.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+    async def test_resume_from_last_event_id(self):
+        """Test messages after the Last-Event-ID are sent on reconnect."""
+
+        first = await sync_to_async(create_msg)(self.user, title='First')
+        second = await sync_to_async(create_msg)(self.user, title='Second')
+        await first.arefresh_from_db()
+        await second.arefresh_from_db()
+
+        stream = await self.open_stream(
+            **{'Last-Event-ID': str(first.change_seq)}
+        )
+        chunk = (await anext(stream)).decode()
+        await stream.aclose()
+
+        self.assertTrue(chunk.startswith(f'id: {second.change_seq}\n'))
+        self.assertIn('"title":"Second"', chunk)
+
+    async def test_replay_of_changes_in_change_order(self):
+        """Test a message changed after the cursor is replayed, any id."""
+
+        first = await sync_to_async(create_msg)(self.user, title='First')
+        second = await sync_to_async(create_msg)(self.user, title='Second')
+        await second.arefresh_from_db()
+        await Message.objects.filter(id=first.id).aupdate(title='Edited')
+
+        stream = await self.open_stream(
+            **{'Last-Event-ID': str(second.change_seq)}
+        )
+        chunk = (await anext(stream)).decode()
+        await stream.aclose()
+
+        self.assertIn(f'"id":{first.id},', chunk)
+        self.assertIn('"title":"Edited"', chunk)
+
+    async def test_long_replay_replaced_by_resync(self):
+        """Test a client far behind is told to resync from its cursor."""
+
+        for i in range(3):
+            await sync_to_async(create_msg)(self.user, title=f'Message {i}')
+
+        with patch.object(MessageEventsView, 'replay_limit', 2):
+            stream = await self.open_stream(**{'Last-Event-ID': '0'})
+            chunk = (await anext(stream)).decode()
+            await stream.aclose()
+
+        self.assertIn('event: resync\n', chunk)
+        self.assertIn('"since":0', chunk)
+
+    async def test_stream_ends_after_max_age(self):
+        """Test the stream ends so that clients reconnect periodically."""
+
+        with self.settings(MESSAGE_EVENTS_MAX_AGE=0.2):
+            stream = await self.open_stream()
+            chunks = [chunk async for chunk in stream]
+
+        self.assertTrue(all(chunk.startswith(b':') for chunk in chunks))
+        self.assertFalse(broker.subscribers.get(self.user.id))
+
+    async def test_new_message_pushed(self):
+        """Test a message stored after subscribing is pushed to the user."""
+
+        stream = await self.open_stream()
+        pending = asyncio.ensure_future(anext(stream))
+        while not broker.subscribers.get(self.user.id):
+            await asyncio.sleep(0.01)
+
+        other = await sync_to_async(create_user)(email='other@example.com')
+        await sync_to_async(Message.objects.submit)(
+            other,
+            email='a@example.com',
+            content='Not for this user'
+        )
+        msg, _ = await sync_to_async(Message.objects.submit)(
+            self.user,
+            email='sender@example.com',
+            title='Live',
+            content='Live content'
+        )
+
+        chunk = (await asyncio.wait_for(pending, 5)).decode()
+        await stream.aclose()
+        await msg.arefresh_from_db()
+
+        self.assertTrue(chunk.startswith(f'id: {msg.change_seq}\n'))
+        self.assertIn('"title":"Live"', chunk)
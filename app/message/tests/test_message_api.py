@@ -4,17 +4,27 @@ Tests for message APIs.
 
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Message
+from core import archive, ingest, submission_keys
+from core.models import Message, OutboxEvent, SubmissionKey
+from core.tests.archive_storage import override_archive_storage
 
+from message.filters import ORDERING_FIELDS, filter_messages
 from message.serializers import MessageSerializer
+from message.views import MessageViewSet
 
 from datetime import datetime
+import os
 import pytz
+import tempfile
+import threading
 
 from unittest.mock import patch, Mock
 
@@ -22,6 +32,18 @@ from unittest.mock import patch, Mock
 MESSAGES_URL = reverse('message-list')
 
 
+def similar_url(msg_id):
+    """Create and return url of messages similar to a particular message."""
+
+    return reverse('message-similar', args=[msg_id])
+
+
+def cluster_url(msg_id):
+    """Create and return url of the cluster operation for a message."""
+
+    return reverse('message-cluster', args=[msg_id])
+
+
 def detail_url(msg_id):
     """Create and return detail page url for a particular message."""
 
@@ -117,6 +139,22 @@ class PrivateMessageApiTests(TestCase):
         for attr in auto_fields:
             self.assertIn(attr, r.data)
 
+    def test_create_message_queues_notification(self):
+        """Test creating a message writes an outbox event for the owner."""
+
+        self.user.webhook_url = 'http://127.0.0.1:9/hook'
+        self.user.save()
+        payload = {
+            'email': 'msg_created@exapmle.com',
+            'title': 'my super important question',
+            'content': 'My very clear explanations.'
+        }
+        r = self.client.post(MESSAGES_URL, payload)
+
+        event = OutboxEvent.objects.get(user=self.user)
+        self.assertEqual(event.channel, OutboxEvent.WEBHOOK)
+        self.assertEqual(event.payload['id'], r.data['id'])
+
     def test_update_message_success(self):
         """Test updating a message successfully."""
 
@@ -258,6 +296,603 @@ class PrivateMessageApiTests(TestCase):
         self.assertEqual(len(r.data), 1)
 
 
+    def test_filtering_several_parameters_with_search(self):
+        """Test combining several filter parameters with a search string."""
+
+        create_msg(self.user, title='problem')
+        create_msg(self.user, is_recent=False, is_read=True, title='problem')
+        create_msg(self.user, is_recent=False, is_answered=True, title='problem')
+        create_msg(self.user, is_recent=False, is_read=True)
+
+        params = {'search': 'problem', 'filter': 'recent,read'}
+
+        r = self.client.get(MESSAGES_URL, params)
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(r.data), 2)
+
+    def test_message_stats(self):
+        """Test counting messages by their flags."""
+
+        create_msg(self.user)
+        create_msg(self.user, is_recent=False, is_read=True)
+        create_msg(self.user, is_recent=False, is_read=True, is_answered=True)
+
+        r = self.client.get(reverse('message-stats'), {'filter': 'read'})
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data, {
+            'total': 2,
+            'recent': 0,
+            'read': 2,
+            'answered': 1,
+            'spam': 0
+        })
+
+class DeduplicationTests(TestCase):
+    """Tests for duplicate and idempotent message submission."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='test_message@example.com')
+        self.client.force_authenticate(self.user)
+        self.payload = {
+            'email': 'retry@example.com',
+            'name': 'Me',
+            'title': 'Sample title',
+            'content': 'Sample content.'
+        }
+
+    def test_resubmitting_same_message_returns_original(self):
+        """Test posting identical content twice stores a single message."""
+
+        r1 = self.client.post(MESSAGES_URL, self.payload)
+        r2 = self.client.post(MESSAGES_URL, self.payload)
+
+        self.assertEqual(r1.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(r2.status_code, status.HTTP_200_OK)
+        self.assertEqual(r1.data['id'], r2.data['id'])
+        self.assertEqual(Message.objects.filter(user=self.user).count(), 1)
+
+    def test_same_message_for_other_user_is_stored(self):
+        """Test fingerprints are scoped to the owner of the message."""
+
+        other = create_user(email='other@example.com')
+        create_msg(other, **self.payload)
+
+        r = self.client.post(MESSAGES_URL, self.payload)
+
+        self.assertEqual(r.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Message.objects.count(), 2)
+
+    def test_edited_message_fingerprint_updated(self):
+        """Test edits are deduplicated against the new content."""
+
+        r = self.client.post(MESSAGES_URL, self.payload)
+        msg_id = r.data['id']
+
+        r = self.client.patch(detail_url(msg_id), {'content': 'Edited.'})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+        r = self.client.post(MESSAGES_URL, self.payload)
+        self.assertEqual(r.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(r.data['id'], msg_id)
+
+        edited = dict(self.payload, content='Edited.')
+        r = self.client.post(MESSAGES_URL, edited)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data['id'], msg_id)
+
+    def test_edit_into_duplicate_refused(self):
+        """Test an edit making two messages identical is refused."""
+
+        self.client.post(MESSAGES_URL, self.payload)
+        other = dict(self.payload, content='Other content.')
+        msg_id = self.client.post(MESSAGES_URL, other).data['id']
+
+        r = self.client.patch(
+            detail_url(msg_id),
+            {'content': self.payload['content']}
+        )
+
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            Message.objects.get(id=msg_id).content,
+            'Other content.'
+        )
+
+    def test_idempotency_key_replays_response(self):
+        """Test a retry with the same key replays the original response."""
+
+        headers = {'HTTP_IDEMPOTENCY_KEY': 'abc-123'}
+        r1 = self.client.post(MESSAGES_URL, self.payload, **headers)
+
+        changed = dict(self.payload, content='Changed content.')
+        r2 = self.client.post(MESSAGES_URL, changed, **headers)
+
+        self.assertEqual(r2.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(r2.data, r1.data)
+        self.assertEqual(r2['Idempotent-Replayed'], 'true')
+        self.assertEqual(Message.objects.filter(user=self.user).count(), 1)
+
+
+class NearDuplicateTests(TestCase):
+    """Tests for near-duplicate detection of messages."""
+
+    spam = (
+        'Congratulations you have been selected to receive a free cruise '
+        'to the Bahamas, call our office today to claim your prize'
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='test_message@example.com')
+        self.client.force_authenticate(self.user)
+
+    def post_msg(self, content, email='spammer@example.com'):
+        """Submit a message through the API and return its id."""
+
+        payload = {'email': email, 'title': 'Hello', 'content': content}
+        r = self.client.post(MESSAGES_URL, payload)
+
+        return r.data['id']
+
+    def test_similar_returns_near_duplicates(self):
+        """Test lightly varied copies are found and others are not."""
+
+        first = self.post_msg(self.spam)
+        copy = self.post_msg(self.spam.replace('today', 'now'), 'a@example.com')
+        other = self.post_msg('Could you send me the invoice for October?')
+
+        r = self.client.get(similar_url(first))
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        ids = [m['id'] for m in r.data]
+        self.assertIn(copy, ids)
+        self.assertNotIn(other, ids)
+        self.assertNotIn(first, ids)
+
+    def test_similar_scoped_to_owner(self):
+        """Test messages of other users are never reported as similar."""
+
+        first = self.post_msg(self.spam)
+        other_user = create_user(email='other@example.com')
+        self.client.force_authenticate(other_user)
+        foreign = self.post_msg(self.spam.replace('today', 'now'))
+        self.client.force_authenticate(self.user)
+
+        r = self.client.get(similar_url(first))
+
+        self.assertNotIn(foreign, [m['id'] for m in r.data])
+
+    def test_similar_after_content_edit(self):
+        """Test edited messages are matched by their new content."""
+
+        first = self.post_msg(self.spam)
+        copy = self.post_msg(self.spam.replace('today', 'now'), 'a@example.com')
+        other = self.post_msg('Could you send me the invoice for October?')
+
+        self.client.patch(detail_url(copy), {'content': 'Thanks, all good.'})
+        self.client.patch(detail_url(other), {'content': self.spam + '!'})
+
+        r = self.client.get(similar_url(first))
+
+        ids = [m['id'] for m in r.data]
+        self.assertNotIn(copy, ids)
+        self.assertIn(other, ids)
+
+    def test_cluster_mark_spam(self):
+        """Test marking the cluster as spam updates every copy."""
+
+        first = self.post_msg(self.spam)
+        copy = self.post_msg(self.spam.replace('today', 'now'), 'a@example.com')
+        other = self.post_msg('Could you send me the invoice for October?')
+
+        r = self.client.post(cluster_url(first), {'operation': 'spam'})
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data['count'], 2)
+        self.assertTrue(Message.objects.get(id=copy).is_spam)
+        self.assertFalse(Message.objects.get(id=other).is_spam)
+
+    @patch.object(MessageViewSet, 'similar_limit', 2)
+    def test_cluster_larger_than_similar_limit(self):
+        """Test every copy is marked and deleted, beyond the listing limit."""
+
+        first = self.post_msg(self.spam)
+        for i in range(4):
+            self.post_msg(self.spam, f'copy{i}@example.com')
+
+        r = self.client.post(cluster_url(first), {'operation': 'spam'})
+        r_again = self.client.post(cluster_url(first), {'operation': 'spam'})
+
+        self.assertEqual(r.data['count'], 5)
+        self.assertEqual(r_again.data['count'], 0)
+        self.assertFalse(Message.objects.filter(is_spam=False).exists())
+
+        r = self.client.post(cluster_url(first), {'operation': 'delete'})
+
+        self.assertEqual(r.data['count'], 5)
+        self.assertFalse(Message.objects.exists())
+
+    def test_cluster_delete(self):
+        """Test deleting the cluster removes the message and its copies."""
+
+        first = self.post_msg(self.spam)
+        self.post_msg(self.spam.replace('today', 'now'), 'a@example.com')
+        other = self.post_msg('Could you send me the invoice for October?')
+
+        r = self.client.post(cluster_url(first), {'operation': 'delete'})
+
+        self.assertEqual(r.data['count'], 2)
+        self.assertEqual(
+            list(Message.objects.values_list('id', flat=True)),
+            [other]
+        )
+
+
+class SpamScoreTests(TestCase):
+    """Tests for filtering and ordering messages by spam score."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='test_message@example.com')
+        self.client.force_authenticate(self.user)
+
+        self.low = create_msg(self.user, spam_score=0.1)
+        self.high = create_msg(self.user, spam_score=0.9)
+        self.middle = create_msg(self.user, spam_score=0.5)
+
+    def test_filtering_by_score(self):
+        """Test filtering messages by a range of spam scores."""
+
+        r = self.client.get(MESSAGES_URL, {'min_score': 0.3, 'max_score': 1})
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        ids = {m['id'] for m in r.data}
+        self.assertEqual(ids, {self.high.id, self.middle.id})
+
+    def test_ordering_by_score(self):
+        """Test ordering messages by spam score, descending."""
+
+        r = self.client.get(MESSAGES_URL, {'ordering': '-spam_score'})
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [m['id'] for m in r.data],
+            [self.high.id, self.middle.id, self.low.id]
+        )
+
+    def test_unsupported_ordering_fails(self):
+        """Test ordering by a field that is not allowed fails."""
+
+        r = self.client.get(MESSAGES_URL, {'ordering': 'content'})
+
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class QueuedSubmissionTests(TestCase):
+    """Tests for accept-and-queue submission of messages."""
+
+    def setUp(self):
+        queue_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(queue_dir.cleanup)
+        settings = override_settings(INGEST_QUEUE_DIR=queue_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.client = APIClient()
+        self.user = create_user(email='test_message@example.com')
+        self.client.force_authenticate(self.user)
+        self.payload = {
+            'email': 'queued@example.com',
+            'title': 'Sample title',
+            'content': 'Sample content.'
+        }
+
+    def post_queued(self, payload):
+        """Submit a message asking for the accept-and-queue mode."""
+
+        return self.client.post(
+            MESSAGES_URL,
+            payload,
+            HTTP_PREFER='respond-async'
+        )
+
+    def test_queued_submission_stored_on_flush(self):
+        """Test a queued message is accepted and stored by the flusher."""
+
+        r = self.post_queued(self.payload)
+
+        self.assertEqual(r.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIn('queued', r.data)
+        self.assertFalse(Message.objects.exists())
+
+        call_command('flush_ingest_queue')
+
+        msg = Message.objects.get(user=self.user)
+        self.assertEqual(msg.email, self.payload['email'])
+        self.assertTrue(msg.bands.exists())
+
+    def test_queued_submission_validated(self):
+        """Test invalid submissions are rejected before queueing."""
+
+        r = self.post_queued({'title': 'No email nor content'})
+
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(INGEST_QUEUE_MAX_SIZE=1)
+    def test_full_queue_sheds_load(self):
+        """Test submissions are refused while the queue is full."""
+
+        self.post_queued(self.payload)
+        r = self.post_queued(dict(self.payload, content='Another one.'))
+
+        self.assertEqual(r.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', r)
+
+    @override_settings(INGEST_QUEUE_MAX_SIZE=1)
+    def test_partial_record_counts_toward_bound(self):
+        """Test a partially written record takes room in the queue."""
+
+        (ingest.queue_dir() / f'1{ingest.PARTIAL_SUFFIX}').touch()
+
+        r = self.post_queued(self.payload)
+
+        self.assertEqual(r.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    @override_settings(INGEST_PARTIAL_MAX_AGE=60)
+    def test_stale_partial_record_swept_by_flusher(self):
+        """Test the flusher deletes partial records left by a crash."""
+
+        stale = ingest.queue_dir() / f'1{ingest.PARTIAL_SUFFIX}'
+        fresh = ingest.queue_dir() / f'2{ingest.PARTIAL_SUFFIX}'
+        stale.touch()
+        fresh.touch()
+        os.utime(stale, (0, 0))
+
+        call_command('flush_ingest_queue')
+
+        self.assertFalse(stale.exists())
+        self.assertTrue(fresh.exists())
+
+    def test_replay_after_crash_not_duplicated(self):
+        """Test replaying records that were already stored is harmless."""
+
+        self.post_queued(self.payload)
+        self.client.post(MESSAGES_URL, self.payload)
+
+        call_command('flush_ingest_queue')
+
+        self.assertEqual(Message.objects.filter(user=self.user).count(), 1)
+
+    def test_refused_record_set_aside(self):
+        """Test a record the database refuses does not block the queue."""
+
+        ingest.enqueue(self.user, dict(self.payload, title='x' * 300))
+        self.post_queued(self.payload)
+
+        call_command('flush_ingest_queue')
+
+        self.assertEqual(Message.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(ingest.pending(), [])
+        self.assertEqual(
+            len(list(ingest.queue_dir().glob(f'*{ingest.REJECTED_SUFFIX}'))),
+            1
+        )
+
+
+class ChangesTests(TestCase):
+    """Tests for the delta-sync endpoint."""
+
+    url = reverse('message-changes')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='test_message@example.com')
+        self.client.force_authenticate(self.user)
+
+    def test_changes_since_cursor(self):
+        """Test inserts, updates and deletes after the cursor are listed."""
+
+        kept = create_msg(self.user, title='kept')
+        updated = create_msg(self.user, title='updated')
+        deleted = create_msg(self.user, title='deleted')
+        create_msg(create_user(email='other@example.com'))
+
+        cursor = self.client.get(self.url).data['cursor']
+        self.client.patch(detail_url(updated.id), {'is_read': True})
+        self.client.delete(detail_url(deleted.id))
+        created = create_msg(self.user, title='created')
+
+        r = self.client.get(self.url, {'since': cursor})
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(c['type'], c['id']) for c in r.data['changes']],
+            [
+                ('upsert', updated.id),
+                ('delete', deleted.id),
+                ('upsert', created.id)
+            ]
+        )
+        self.assertTrue(r.data['changes'][0]['message']['is_read'])
+        self.assertNotIn(kept.id, [c['id'] for c in r.data['changes']])
+        self.assertFalse(r.data['has_more'])
+
+    def test_changes_paginated_by_sequence(self):
+        """Test following the cursor returns every change once."""
+
+        ids = [create_msg(self.user, title=str(i)).id for i in range(5)]
+
+        seen = []
+        cursor = 0
+        while True:
+            r = self.client.get(self.url, {'since': cursor, 'limit': 2})
+            seen += [c['id'] for c in r.data['changes']]
+            cursor = r.data['cursor']
+            if not r.data['has_more']:
+                break
+
+        self.assertEqual(seen, ids)
+
+    def test_bulk_update_tracked(self):
+        """Test queryset updates bump the change sequence too."""
+
+        msg = create_msg(self.user)
+        cursor = self.client.get(self.url).data['cursor']
+
+        Message.objects.filter(id=msg.id).update(is_spam=True)
+
+        r = self.client.get(self.url, {'since': cursor})
+        self.assertEqual([c['id'] for c in r.data['changes']], [msg.id])
+
+
+class ConcurrentChangesTests(TransactionTestCase):
+    """Tests for the delta-sync endpoint with concurrent transactions."""
+
+    url = reverse('message-changes')
+
+    def test_changes_visible_in_sequence_order(self):
+        """
+        Test a change committed while an earlier one is pending doesn't
+        move the cursor past the pending change.
+        """
+
+        user = create_user(email='test_message@example.com')
+        messages = [create_msg(user, title=str(i)) for i in range(2)]
+        client = APIClient()
+        client.force_authenticate(user)
+        cursor = client.get(self.url).data['cursor']
+        written = threading.Event()
+        release = threading.Event()
+        done = threading.Event()
+
+        def write(msg, title, before_commit=None):
+            try:
+                with transaction.atomic():
+                    Message.objects.filter(id=msg.id).update(title=title)
+                    if before_commit:
+                        before_commit()
+            finally:
+                connection.close()
+
+        def hold():
+            written.set()
+            release.wait(5)
+
+        def write_second():
+            write(messages[1], 'second')
+            done.set()
+
+        first = threading.Thread(
+            target=write,
+            args=(messages[0], 'first', hold)
+        )
+        first.start()
+        written.wait(5)
+        second = threading.Thread(target=write_second)
+        second.start()
+
+        # Give the second change time to commit if it isn't held back.
+        done.wait(0.5)
+        r = client.get(self.url, {'since': cursor})
+        seen = [c['message']['title'] for c in r.data['changes']]
+
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        r = client.get(self.url, {'since': r.data['cursor']})
+        seen += [c['message']['title'] for c in r.data['changes']]
+        self.assertEqual(seen, ['first', 'second'])
+
+    def test_writes_of_a_user_not_serialized(self):
+        """Test a change commits while another of the user is pending."""
+
+        user = create_user(email='test_message@example.com')
+        messages = [create_msg(user, title=str(i)) for i in range(2)]
+        written = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            try:
+                with transaction.atomic():
+                    Message.objects.filter(id=messages[0].id).update(
+                        title='first'
+                    )
+                    written.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        first = threading.Thread(target=hold)
+        first.start()
+        self.addCleanup(first.join, 5)
+        self.addCleanup(release.set)
+        written.wait(5)
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL lock_timeout = '1s'")
+            Message.objects.filter(id=messages[1].id).update(title='second')
+
+        self.assertEqual(
+            Message.objects.get(id=messages[1].id).title,
+            'second'
+        )
+
+
+class BatchRetrieveTests(TestCase):
+    """Tests for retrieving several messages in one request."""
+
+    url = reverse('message-batch')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='test_message@example.com')
+        self.client.force_authenticate(self.user)
+
+    def test_batch_in_requested_order(self):
+        """Test messages are returned in order with not found markers."""
+
+        m1 = create_msg(self.user, title='first')
+        m2 = create_msg(self.user, title='second')
+        foreign = create_msg(create_user(email='other@example.com'))
+        ids = [m2.id, foreign.id, m1.id, 0]
+
+        r = self.client.get(self.url, {'ids': ','.join(map(str, ids))})
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data[0]['title'], 'second')
+        self.assertEqual(r.data[0]['content'], m2.content)
+        self.assertEqual(r.data[1], {'id': foreign.id, 'error': 'not_found'})
+        self.assertEqual(r.data[2]['title'], 'first')
+        self.assertEqual(r.data[3], {'id': 0, 'error': 'not_found'})
+
+    def test_batch_single_query(self):
+        """Test the messages are fetched with one query."""
+
+        ids = [create_msg(self.user, title=str(i)).id for i in range(20)]
+
+        with self.assertNumQueries(1):
+            r = self.client.get(self.url, {'ids': ','.join(map(str, ids))})
+
+        self.assertEqual([m['id'] for m in r.data], ids)
+
+    def test_batch_invalid_ids(self):
+        """Test malformed or too many ids are rejected."""
+
+        r_bad = self.client.get(self.url, {'ids': '1,a'})
+        r_many = self.client.get(
+            self.url,
+            {'ids': ','.join(map(str, range(1, 102)))}
+        )
+
+        self.assertEqual(r_bad.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(r_many.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class FilterByDateTests(TestCase):
     """Tests for filtering messages by date."""
 
@@ -320,3 +955,526 @@ class FilterByDateTests(TestCase):
 
         s2 = MessageSerializer(self.msg_2)
         self.assertIn(s2.data, r.data)
+
+    def test_facet_counts(self):
+        """Test facets are counted over the filtered messages."""
+
+        create_msg(self.user, is_read=True, content='the problem')
+
+        params = {'fd': '2023-10-01', 'facets': 'true', 'facet_interval': 'day'}
+
+        with self.assertNumQueries(3):
+            r = self.client.get(MESSAGES_URL, params)
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(r.data['results']), 3)
+        facets = r.data['facets']
+        self.assertEqual(facets['total'], 3)
+        self.assertEqual(facets['read'], 1)
+        self.assertEqual(facets['recent'], 3)
+        self.assertEqual(
+            [bucket['count'] for bucket in facets['histogram']],
+            [1, 1, 1]
+        )
+        self.assertEqual(facets['histogram'][0]['date'], '2023-10-04')
+
+
+class VolumeTests(TestCase):
+    """Tests for message volume analytics."""
+
+    url = reverse('message-volume')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='test_message@example.com')
+        self.client.force_authenticate(self.user)
+
+        for day in (1, 1, 2, 15):
+            mocked = datetime(2023, 10, day, 12, 0, 0, tzinfo=pytz.utc)
+            with patch('django.utils.timezone.now', Mock(return_value=mocked)):
+                self.last = create_msg(self.user, content=str(day))
+
+    def test_daily_volume(self):
+        """Test counts per day are maintained on create, update and delete."""
+
+        Message.objects.filter(content='1').update(is_read=True)
+        self.last.delete()
+
+        r = self.client.get(self.url, {'fd': '2023-10-01', 'td': '2023-11-01'})
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data, [
+            {'bucket': '2023-10-01', 'total': 2, 'read': 2, 'answered': 0},
+            {'bucket': '2023-10-02', 'total': 1, 'read': 0, 'answered': 0},
+        ])
+
+    def test_monthly_volume_single_query(self):
+        """Test the volume is read from the rollup in one query."""
+
+        with self.assertNumQueries(1):
+            r = self.client.get(self.url, {
+                'fd': '2023-01-01',
+                'td': '2024-01-01',
+                'interval': 'month'
+            })
+
+        self.assertEqual(r.data, [
+            {'bucket': '2023-10-01', 'total': 4, 'read': 0, 'answered': 0},
+        ])
+
+    def test_invalid_interval(self):
+        """Test an unsupported interval is rejected."""
+
+        r = self.client.get(self.url, {'interval': 'hour'})
+
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SenderTests(TestCase):
+    """Tests for messages grouped by sender."""
+
+    url = reverse('message-senders')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='test_message@example.com')
+        self.client.force_authenticate(self.user)
+
+        for day, email in ((1, 'A@example.com'), (2, 'b@example.com'),
+                           (3, 'a@example.com'), (4, 'c@example.com')):
+            mocked = datetime(2023, 10, day, 12, 0, 0, tzinfo=pytz.utc)
+            with patch('django.utils.timezone.now', Mock(return_value=mocked)):
+                create_msg(self.user, email=email, title=str(day))
+
+        Message.objects.filter(title='1').update(is_read=True)
+
+    def test_senders_grouped_by_normalized_email(self):
+        """Test senders are counted case insensitively, latest first."""
+
+        with self.assertNumQueries(2):
+            r = self.client.get(self.url)
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(s['email'], s['total'], s['unread']) for s in r.data['results']],
+            [('c@example.com', 1, 1), ('a@example.com', 2, 1),
+             ('b@example.com', 1, 1)]
+        )
+        self.assertEqual(r.data['results'][1]['latest']['title'], '3')
+        self.assertIsNone(r.data['next'])
+
+    def test_senders_paginated_by_cursor(self):
+        """Test the next page continues after the last sender."""
+
+        with patch('message.views.MessageViewSet.senders_limit', 2):
+            r1 = self.client.get(self.url)
+            r2 = self.client.get(self.url, {'cursor': r1.data['next']})
+
+        self.assertEqual(
+            [s['email'] for s in r1.data['results'] + r2.data['results']],
+            ['c@example.com', 'a@example.com', 'b@example.com']
+        )
+        self.assertIsNone(r2.data['next'])
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected."""
+
+        r = self.client.get(self.url, {'cursor': 'nonsense'})
+
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_messages_of_sender(self):
+        """Test listing the messages of one sender, the latest first."""
+
+        r = self.client.get(MESSAGES_URL, {'sender': 'a@EXAMPLE.com'})
+
+        self.assertEqual([m['title'] for m in r.data], ['3', '1'])
+
+
+class OrderingTests(TestCase):
+    """Tests for ordering the message list."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='test_message@example.com')
+        self.client.force_authenticate(self.user)
+
+        self.first = create_msg(self.user, email='b@example.com', title='a')
+        self.second = create_msg(self.user, email='a@example.com', title='a')
+
+    def test_latest_first_by_default(self):
+        """Test messages are listed the latest first by default."""
+
+        r = self.client.get(MESSAGES_URL)
+
+        self.assertEqual(
+            [m['id'] for m in r.data],
+            [self.second.id, self.first.id]
+        )
+
+    def test_ordering_with_id_tie_breaker(self):
+        """Test ties in the ordered field are broken by id."""
+
+        for ordering, expected in (
+            ('email', [self.second, self.first]),
+            ('title', [self.first, self.second]),
+            ('-title', [self.second, self.first]),
+        ):
+            r = self.client.get(MESSAGES_URL, {'ordering': ordering})
+
+            self.assertEqual(
+                [m['id'] for m in r.data],
+                [msg.id for msg in expected]
+            )
+
+    def test_orderings_backed_by_index(self):
+        """Test every allowed ordering is read from an index, unsorted."""
+
+        queryset = Message.objects.filter(user=self.user)
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute('SET LOCAL enable_incremental_sort = off')
+
+        for name in ORDERING_FIELDS:
+            for ordering in (name, f'-{name}'):
+                plan = filter_messages(
+                    queryset, {'ordering': ordering}
+                ).explain()
+
+                self.assertNotIn('Sort', plan, ordering)
+
+
+class SubmissionKeyTests(TestCase):
+    """Tests for public form submissions with submission keys."""
+
+    submit_url = reverse('message-submit')
+    payload = {
+        'email': 'visitor@example.com',
+        'name': 'Visitor',
+        'title': 'Question from the website',
+        'content': 'Content of the question'
+    }
+
+    def setUp(self):
+        submission_keys.invalidate()
+        self.addCleanup(submission_keys.invalidate)
+
+        self.user = create_user(email='test_message@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        r = self.client.post(
+            reverse('submission-key-list'),
+            {'name': 'Contact form', 'allowed_origins': ['https://a.example']},
+            format='json'
+        )
+        self.key = r.data['key']
+        self.public = APIClient()
+
+    def submit(self, key=None, origin='https://a.example', **extra):
+        """Post the payload as a public form of the origin."""
+
+        return self.public.post(
+            self.submit_url,
+            {**self.payload, **extra},
+            format='json',
+            HTTP_X_SUBMISSION_KEY=key or self.key,
+            HTTP_ORIGIN=origin
+        )
+
+    def test_submission_stored_for_owner(self):
+        """Test a public submission is stored for the owner of the key."""
+
+        r = self.submit()
+
+        self.assertEqual(r.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            r.headers['Access-Control-Allow-Origin'],
+            'https://a.example'
+        )
+        self.assertTrue(
+            Message.objects.filter(
+                user=self.user,
+                email=self.payload['email']
+            ).exists()
+        )
+
+    def test_cached_key_resolution(self):
+        """Test a known key costs no auth queries and a single INSERT."""
+
+        self.submit()
+        self.payload = {**self.payload, 'content': 'Another question'}
+
+        with CaptureQueriesContext(connection) as queries:
+            r = self.submit()
+
+        self.assertEqual(r.status_code, status.HTTP_201_CREATED)
+        sql = [q['sql'] for q in queries]
+        self.assertFalse([q for q in sql if 'core_user' in q])
+        self.assertFalse([q for q in sql if 'core_submissionkey' in q])
+        self.assertEqual(
+            len([q for q in sql if q.startswith('INSERT INTO "core_message"')]),
+            1
+        )
+
+    @override_settings(
+        SUBMISSION_KEY_CACHE_SIZE=2,
+        SUBMISSION_KEY_UNKNOWN_CACHE_SIZE=2
+    )
+    def test_unknown_keys_keep_known_cached(self):
+        """Test a spray of unknown keys does not evict a known key."""
+
+        submission_keys.resolve(self.key)
+        for i in range(5):
+            self.assertIsNone(submission_keys.resolve(f'unknown-{i}'))
+
+        with CaptureQueriesContext(connection) as queries:
+            submission_key = submission_keys.resolve(self.key)
+
+        self.assertEqual(submission_key.key, self.key)
+        self.assertEqual(len(queries), 0)
+
+    def test_flags_of_public_submission_ignored(self):
+        """Test public forms can't set the flags managed by the owner."""
+
+        r = self.submit(
+            is_read=True,
+            is_answered=True,
+            is_recent=False,
+            is_spam=True
+        )
+
+        self.assertEqual(r.status_code, status.HTTP_201_CREATED)
+        msg = Message.objects.get(user=self.user)
+        self.assertFalse(msg.is_read)
+        self.assertFalse(msg.is_answered)
+        self.assertTrue(msg.is_recent)
+        self.assertFalse(msg.is_spam)
+
+    def test_invalid_key_rejected(self):
+        """Test unknown keys are rejected."""
+
+        r = self.submit(key='unknown')
+
+        self.assertEqual(r.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_origin_not_allowed_rejected(self):
+        """Test forms from origins that are not allowed are rejected."""
+
+        r = self.submit(origin='https://b.example')
+
+        self.assertEqual(r.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Message.objects.exists())
+
+    def test_deactivated_key_invalidated(self):
+        """Test deactivating a key takes effect despite the cache."""
+
+        self.submit()
+        key = SubmissionKey.objects.get(key=self.key)
+
+        self.client.patch(
+            reverse('submission-key-detail', args=[key.id]),
+            {'is_active': False},
+            format='json'
+        )
+        r = self.submit()
+
+        self.assertEqual(r.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TotalCountTests(TestCase):
+    """Tests for the total count of listed messages."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+        for day in (1, 2, 3):
+            created_at = datetime(2023, 10, day, 12, 0, 0, tzinfo=pytz.utc)
+            with patch(
+                'django.utils.timezone.now',
+                Mock(return_value=created_at)
+            ):
+                create_msg(self.user, title=f'title {day}')
+
+        create_msg(create_user(email='other@example.com'))
+
+    def test_no_count_by_default(self):
+        """Test the count is only returned if requested."""
+
+        r = self.client.get(MESSAGES_URL)
+
+        self.assertNotIn('X-Total-Count', r)
+
+    def test_unfiltered_count_from_daily_counts(self):
+        """Test unfiltered lists are counted from the maintained counts."""
+
+        with CaptureQueriesContext(connection) as queries:
+            r = self.client.get(MESSAGES_URL, {'count': 'true'})
+
+        self.assertEqual(r['X-Total-Count'], '3')
+        self.assertEqual(r['X-Total-Count-Exact'], 'true')
+        self.assertEqual(
+            len([q for q in queries if 'core_messagedailycount' in q['sql']]),
+            1
+        )
+        self.assertFalse(
+            [q for q in queries if 'COUNT(' in q['sql'].upper()]
+        )
+
+    def test_date_filtered_count_from_daily_counts(self):
+        """Test lists filtered by dates are counted by whole days."""
+
+        r = self.client.get(
+            MESSAGES_URL,
+            {'count': 'true', 'fd': '2023-10-02', 'td': '2023-10-03'}
+        )
+
+        self.assertEqual(len(r.data), 1)
+        self.assertEqual(r['X-Total-Count'], '1')
+        self.assertEqual(r['X-Total-Count-Exact'], 'true')
+
+    def test_filtered_count_exact_under_cap(self):
+        """Test filtered lists under the cap are counted exactly."""
+
+        r = self.client.get(MESSAGES_URL, {'count': 'true', 'search': '2'})
+
+        self.assertEqual(r['X-Total-Count'], '1')
+        self.assertEqual(r['X-Total-Count-Exact'], 'true')
+
+    def test_filtered_count_capped(self):
+        """Test filtered lists past the cap report the cap as estimate."""
+
+        with patch.object(MessageViewSet, 'count_cap', 2):
+            r = self.client.get(
+                MESSAGES_URL,
+                {'count': 'true', 'search': 'title'}
+            )
+
+        self.assertEqual(len(r.data), 3)
+        self.assertEqual(r['X-Total-Count'], '2+')
+        self.assertEqual(r['X-Total-Count-Exact'], 'false')
+
+
+class ArchiveReadThroughTests(TestCase):
+    """Tests for reading archived messages through the API."""
+
+    def setUp(self):
+        override_archive_storage(self)
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+        for day, title in ((1, 'old question'), (2, 'old answer')):
+            created_at = datetime(2022, 3, day, 12, 0, 0, tzinfo=pytz.utc)
+            with patch(
+                'django.utils.timezone.now',
+                Mock(return_value=created_at)
+            ):
+                create_msg(self.user, title=title, is_read=day == 2)
+
+        created_at = datetime(2023, 10, 1, 12, 0, 0, tzinfo=pytz.utc)
+        with patch('django.utils.timezone.now', Mock(return_value=created_at)):
+            self.recent = create_msg(self.user, title='recent question')
+
+        self.old = list(
+            Message.objects.exclude(id=self.recent.id).order_by('id')
+        )
+        before = datetime(2023, 1, 1, tzinfo=pytz.utc)
+        list(archive.archive_user(self.user.id, before))
+
+    def test_retrieve_archived(self):
+        """Test archived messages are retrieved from the archive."""
+
+        r = self.client.get(detail_url(self.old[0].id))
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data['title'], 'old question')
+
+    def test_archived_not_retrieved_by_others(self):
+        """Test archived messages of other users are not found."""
+
+        self.client.force_authenticate(create_user(email='other@example.com'))
+
+        r = self.client.get(detail_url(self.old[0].id))
+
+        self.assertEqual(r.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_archived_read_only(self):
+        """Test archived messages can't be updated."""
+
+        r = self.client.patch(detail_url(self.old[0].id), {'is_read': True})
+
+        self.assertEqual(r.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_batch_includes_archived(self):
+        """Test the batch of messages reads missing ids from the archive."""
+
+        ids = [self.recent.id, self.old[1].id, 0]
+
+        r = self.client.get(
+            reverse('message-batch'),
+            {'ids': ','.join(map(str, ids))}
+        )
+
+        self.assertEqual(
+            [msg.get('title') for msg in r.data],
+            ['recent question', 'old answer', None]
+        )
+
+    def test_list_without_dates_not_archived(self):
+        """Test lists without a from date only read the database."""
+
+        r = self.client.get(MESSAGES_URL, {'count': 'true'})
+
+        self.assertEqual([msg['id'] for msg in r.data], [self.recent.id])
+        self.assertEqual(r['X-Total-Count'], '1')
+
+    def test_list_reaching_archive(self):
+        """Test lists from dates before the archive include it in order."""
+
+        r = self.client.get(
+            MESSAGES_URL,
+            {'fd': '2022-03-01', 'ordering': 'title', 'count': 'true'}
+        )
+
+        self.assertEqual(
+            [msg['title'] for msg in r.data],
+            ['old answer', 'old question', 'recent question']
+        )
+        self.assertEqual(r['X-Total-Count'], '3')
+        self.assertEqual(r['X-Total-Count-Exact'], 'true')
+
+    @patch.object(MessageViewSet, 'archived_limit', 1)
+    def test_list_archived_capped(self):
+        """Test only the latest archived messages are listed, past the cap."""
+
+        r = self.client.get(
+            MESSAGES_URL,
+            {'fd': '2022-03-01', 'search': 'old', 'count': 'true'}
+        )
+
+        self.assertEqual([msg['title'] for msg in r.data], ['old answer'])
+        self.assertEqual(r['X-Archived-Truncated'], 'true')
+        self.assertEqual(r['X-Total-Count-Exact'], 'false')
+
+    def test_list_filters_archived(self):
+        """Test archived messages pass the filters of the list."""
+
+        r = self.client.get(
+            MESSAGES_URL,
+            {'fd': '2022-01-01', 'td': '2022-03-02', 'filter': 'read'}
+        )
+        self.assertEqual(r.data, [])
+
+        r = self.client.get(
+            MESSAGES_URL,
+            {'fd': '2022-01-01', 'search': 'QUESTION', 'count': 'true'}
+        )
+        self.assertEqual(
+            [msg['id'] for msg in r.data],
+            [self.recent.id, self.old[0].id]
+        )
+        self.assertEqual(r['X-Total-Count'], '2')
@@ -0,0 +1,195 @@
+"""
+Query budget tests for message APIs.
+"""
+
+from urllib.parse import urlencode
+
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+
+from rest_framework.test import APIClient
+
+from core.models import Message, SubmissionKey
+from core.tests.query_budget import QueryBudgetTestCase
+
+MESSAGES_URL = reverse('message-list')
+KEYS_URL = reverse('submission-key-list')
+SUBMIT_URL = reverse('message-submit')
+ORIGIN = 'https://a.example'
+
+
+def detail_url(msg):
+    """Return detail page url of the seeded message."""
+
+    return reverse('message-detail', args=[msg.id])
+
+
+def similar_url(msg):
+    """Return url of messages similar to the seeded message."""
+
+    return reverse('message-similar', args=[msg.id])
+
+
+def cluster_url(msg):
+    """Return url of the cluster operation for the seeded message."""
+
+    return reverse('message-cluster', args=[msg.id])
+
+
+def key_url(msg):
+    """Return detail url of a submission key seeded for the user."""
+
+    key = SubmissionKey.objects.filter(user=msg.user).order_by('id').first()
+
+    return reverse('submission-key-detail', args=[key.id])
+
+
+def batch_url(msg):
+    """
+    Return url of the batch of every message seeded for the user, and of
+    an unknown one looked up in the archive.
+    """
+
+    ids = list(
+        Message.objects.filter(user=msg.user).values_list('id', flat=True)
+    )
+    ids.append(msg.id + 1000)
+
+    return '{}?{}'.format(
+        reverse('message-batch'),
+        urlencode({'ids': ','.join(str(pk) for pk in ids)})
+    )
+
+
+class MessageQueryBudgetTests(QueryBudgetTestCase):
+    """Test message endpoints run a bounded number of queries."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test_message@example.com',
+            password='test_pass123'
+        )
+        self.other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='test_pass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.key = SubmissionKey.objects.create(
+            user=self.user,
+            name='Contact form',
+            allowed_origins=[ORIGIN]
+        )
+
+    def seed(self, size):
+        """
+        Create size near-duplicate messages and submission keys for the user
+        and another.
+        """
+
+        for user in (self.other, self.user):
+            for i in range(size):
+                SubmissionKey.objects.create(user=user, name=f'Form {i}')
+                msg, _ = Message.objects.submit(
+                    user,
+                    email=f'sender{i % 3}@example.com',
+                    name='John Doe',
+                    title=f'Question {i}',
+                    content=f'Some repeated content of the message {i}'
+                )
+
+        Message.objects.filter(user=self.user, id__lt=msg.id).update(
+            is_read=True,
+            spam_score=0.5
+        )
+
+        return msg
+
+    def test_list_budgets(self):
+        """Test listing messages with each parameter combination."""
+
+        for params in (
+            {},
+            {'filter': 'read'},
+            {'filter': 'read,answered', 'search': 'question'},
+            {'fd': '2000-01-01', 'td': '2100-01-01'},
+            {'min_score': '0.1', 'max_score': '0.9'},
+            {'ordering': 'email'},
+            {'ordering': '-spam_score'},
+            {'sender': 'SENDER1@example.com'},
+            {'facets': 'true'},
+        ):
+            with self.subTest(params=params):
+                # Facets are a second aggregate, and a from date looks up
+                # the archive horizon of the user.
+                budget = 2 if 'facets' in params or 'fd' in params else 1
+                self.assertQueryBudget(budget, 'get', MESSAGES_URL, params)
+
+    def test_detail_budgets(self):
+        """Test retrieving, updating and deleting a message."""
+
+        self.assertQueryBudget(1, 'get', detail_url)
+        # The update runs in a savepoint guarding the fingerprint constraint.
+        self.assertQueryBudget(
+            4, 'patch', detail_url, {'is_read': True}, format='json'
+        )
+        # New content also replaces the bands of the message.
+        self.assertQueryBudget(
+            6, 'put', detail_url, {
+                'email': 'updated@example.com',
+                'title': 'Updated question',
+                'content': 'Updated content'
+            }, format='json'
+        )
+        self.assertQueryBudget(3, 'delete', detail_url)
+
+    def test_create_budget(self):
+        """Test creating a message."""
+
+        self.assertQueryBudget(6, 'post', MESSAGES_URL, {
+            'email': 'new@example.com',
+            'title': 'New question',
+            'content': 'Brand new content'
+        })
+
+    def test_submit_budget(self):
+        """Test submitting a message from a public form."""
+
+        # One query resolves the key, the cache being cleared by the seed.
+        self.assertQueryBudget(7, 'post', SUBMIT_URL, {
+            'email': 'visitor@example.com',
+            'content': 'Question from the website'
+        }, format='json', HTTP_X_SUBMISSION_KEY=self.key.key,
+            HTTP_ORIGIN=ORIGIN)
+
+    def test_submission_key_budgets(self):
+        """Test listing, creating, updating and deleting submission keys."""
+
+        self.assertQueryBudget(1, 'get', KEYS_URL)
+        self.assertQueryBudget(
+            1, 'post', KEYS_URL, {'name': 'New form'}, format='json'
+        )
+        self.assertQueryBudget(1, 'get', key_url)
+        self.assertQueryBudget(
+            2, 'put', key_url, {'name': 'Renamed form'}, format='json'
+        )
+        self.assertQueryBudget(
+            2, 'patch', key_url, {'is_active': False}, format='json'
+        )
+        self.assertQueryBudget(2, 'delete', key_url)
+
+    def test_action_budgets(self):
+        """Test the list and detail actions."""
+
+        # Changes also read the commit horizon.
+        for budget, method, url, params in (
+            (4, 'get', similar_url, None),
+            (4, 'post', cluster_url, {'operation': 'spam'}),
+            (3, 'get', reverse('message-changes'), {'since': 0}),
+            (2, 'get', batch_url, None),
+            (1, 'get', reverse('message-volume'), None),
+            (2, 'get', reverse('message-senders'), None),
+            (1, 'get', reverse('message-stats'), None),
+        ):
+            with self.subTest(url=url, params=params):
+                self.assertQueryBudget(budget, method, url, params)
@@ -6,11 +6,43 @@ from django.urls import path, include
 
 from rest_framework.routers import DefaultRouter
 
-from message.views import MessageViewSet
+from message.views import (
+    MessageViewSet,
+    MessageSubmitView,
+    SubmissionKeyViewSet
+)
+from message.async_views import (
+    MessageListView,
+    MessageDetailView,
+    MessageStatsView,
+    MessageEventsView
+)
 
 router = DefaultRouter()
 router.register('messages', MessageViewSet, basename='message')
+router.register(
+    'submission-keys',
+    SubmissionKeyViewSet,
+    basename='submission-key'
+)
 
 urlpatterns = [
-    path('', include(router.urls))
+    path('', include(router.urls)),
+    path('events/', MessageEventsView.as_view(), name='message-events'),
+    path('submit/', MessageSubmitView.as_view(), name='message-submit'),
+    path(
+        'async/messages/',
+        MessageListView.as_view(),
+        name='async-message-list'
+    ),
+    path(
+        'async/messages/stats/',
+        MessageStatsView.as_view(),
+        name='async-message-stats'
+    ),
+    path(
+        'async/messages/<int:pk>/',
+        MessageDetailView.as_view(),
+        name='async-message-detail'
+    ),
 ]
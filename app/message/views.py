@@ -1,7 +1,16 @@
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, Max, Q, Sum
+from django.db.models.functions import Trunc
+from django.http import Http404
+from django.utils import timezone
 
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 
 from drf_spectacular.utils import (
     extend_schema,
@@ -10,13 +19,42 @@ from drf_spectacular.utils import (
     OpenApiTypes
 )
 
-from message.serializers import MessageSerializer, MessageDetailSerializer
+from message import idempotency
+from message.filters import (
+    facet_counts,
+    filter_archived,
+    filter_messages,
+    parse_dates,
+    sort_messages,
+    stats_aggregates
+)
+from message.serializers import (
+    MessageSerializer,
+    MessageDetailSerializer,
+    PublicMessageSerializer,
+    ClusterOperationSerializer,
+    MessageStatsSerializer,
+    MessageChangesSerializer,
+    MessageVolumeSerializer,
+    MessageVolumeQuerySerializer,
+    SenderSerializer,
+    SenderPageSerializer,
+    SubmissionKeySerializer
+)
 
-from core.models import Message
+from core import archive, ingest, submission_keys
+from core.models import (
+    Message,
+    MessageBand,
+    MessageDailyCount,
+    MessageTombstone,
+    SubmissionKey
+)
 from core.permissions import AccessOwnerOnly
+from core.tracing import TracedViewMixin, span
 
-from datetime import datetime
-import pytz
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta
 
 
 @extend_schema_view(
@@ -43,7 +81,11 @@ import pytz
                 OpenApiTypes.STR,
                 required=False,
                 description='Filter messages, starting from the indicated date '
-                            'of creation (e.g. "2023-10-09" without quotes).'
+                            'of creation (e.g. "2023-10-09" without quotes). '
+                            'Archived messages are only listed when it is '
+                            'before the date they were archived up to, the '
+                            'latest 1000 at most. The "X-Archived-Truncated" '
+                            'header tells when more are left out.'
             ),
             OpenApiParameter(
                 'td',
@@ -52,73 +94,764 @@ import pytz
                 description='Filter messages up to the indicated date of '
                             'creation (e.g. "2023-10-09" without quotes).'
             ),
+            OpenApiParameter(
+                'min_score',
+                OpenApiTypes.FLOAT,
+                required=False,
+                description='Filter messages with a spam score of at least '
+                            'the indicated value, between 0 and 1.'
+            ),
+            OpenApiParameter(
+                'max_score',
+                OpenApiTypes.FLOAT,
+                required=False,
+                description='Filter messages with a spam score up to the '
+                            'indicated value, between 0 and 1.'
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                required=False,
+                description='Order messages by "created_at", "email", '
+                            '"title", "read", "answered" or "spam_score", '
+                            'prefixed by "-" for descending order. '
+                            'Defaults to "-created_at".'
+            ),
+            OpenApiParameter(
+                'sender',
+                OpenApiTypes.STR,
+                required=False,
+                description='List the messages of one sender email, case '
+                            'insensitive.'
+            ),
+            OpenApiParameter(
+                'facets',
+                OpenApiTypes.BOOL,
+                required=False,
+                description='Return the messages under "results" together '
+                            'with their counts by flags and a date '
+                            'histogram under "facets".'
+            ),
+            OpenApiParameter(
+                'facet_interval',
+                OpenApiTypes.STR,
+                required=False,
+                description='Interval of the date histogram: "day", "week", '
+                            '"month" (default) or "year".'
+            ),
+            OpenApiParameter(
+                'count',
+                OpenApiTypes.BOOL,
+                required=False,
+                description='Return the number of matching messages in the '
+                            '"X-Total-Count" header, e.g. "10000+" past '
+                            '10000, and whether it is exact in the '
+                            '"X-Total-Count-Exact" header.'
+            ),
+        ]
+    ),
+    create=extend_schema(
+        description='Create a new message in the system. Resubmitting the '
+                    'same email, title and content returns the existing '
+                    'message instead of storing a duplicate. With the '
+                    '"Prefer: respond-async" header the message is queued '
+                    'and stored shortly after a 202 response.',
+        parameters=[
+            OpenApiParameter(
+                idempotency.IDEMPOTENCY_HEADER,
+                OpenApiTypes.STR,
+                location=OpenApiParameter.HEADER,
+                required=False,
+                description='Client generated key. Retries with the same key '
+                            'replay the original response.'
+            ),
         ]
     ),
-    create=extend_schema(description='Create a new message in the system.'),
     update=extend_schema(description='Full update of a message.'),
     partial_update=extend_schema(description='Partial update of a message.'),
     destroy=extend_schema(description='Remove a message from the system.'),
 )
-class MessageViewSet(ModelViewSet):
+class MessageViewSet(TracedViewMixin, ModelViewSet):
     """View for managing message APIs."""
 
     queryset = Message.objects.all()
     serializer_class = MessageDetailSerializer
     permission_classes = [IsAuthenticated, AccessOwnerOnly]
+    similar_limit = 100
+    archived_limit = 1000
+    queue_retry_after = 5
+    changes_limit = 100
+    changes_max_limit = 1000
+    batch_max_size = 100
+    senders_limit = 50
+    count_cap = 10000
+    # Parameters the daily counts can't answer, as fd and td are whole days.
+    counted_params = [
+        'filter',
+        'search',
+        'min_score',
+        'max_score',
+        'sender',
+    ]
+
+    def list(self, request, *args, **kwargs):
+        """
+        List messages, read through to the archive for older dates, with
+        facet and total counts if requested.
+        """
+
+        archived, truncated = self.get_archived_messages()
+
+        if archived:
+            messages = sort_messages(
+                list(self.filter_queryset(self.get_queryset())) + archived,
+                request.query_params
+            )
+            response = Response(self.get_serializer(messages, many=True).data)
+        else:
+            response = super().list(request, *args, **kwargs)
+
+        if truncated:
+            response['X-Archived-Truncated'] = 'true'
+
+        if request.query_params.get('count') in ('1', 'true'):
+            total, exact = self.get_total_count(archived, truncated)
+            response['X-Total-Count'] = str(total) if exact else f'{total}+'
+            response['X-Total-Count-Exact'] = 'true' if exact else 'false'
+
+        if request.query_params.get('facets') in ('1', 'true'):
+            response.data = {
+                'results': response.data,
+                'facets': facet_counts(
+                    self.filter_queryset(self.get_queryset()),
+                    request.query_params.get('facet_interval', 'month')
+                )
+            }
+
+        return response
+
+    def create(self, request, *args, **kwargs):
+        """Create a message, replaying responses for known idempotency keys."""
+
+        key = request.headers.get(idempotency.IDEMPOTENCY_HEADER)
+
+        if key:
+            stored = idempotency.get_response(request.user, key)
+
+            if stored is not None:
+                status_code, data = stored
+                return Response(
+                    data,
+                    status=status_code,
+                    headers={idempotency.REPLAYED_HEADER: 'true'}
+                )
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        if 'respond-async' in request.headers.get('Prefer', ''):
+            try:
+                token = ingest.enqueue(request.user, serializer.validated_data)
+            except ingest.QueueFull:
+                return Response(
+                    {'detail': 'Too many submissions, try again later.'},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': str(self.queue_retry_after)}
+                )
+            status_code = status.HTTP_202_ACCEPTED
+            data = {'queued': token}
+        else:
+            created = self.perform_create(serializer)
+            status_code = (
+                status.HTTP_201_CREATED if created else status.HTTP_200_OK
+            )
+            data = serializer.data
+
+        if key:
+            idempotency.store_response(request.user, key, status_code, data)
+
+        return Response(data, status=status_code)
 
     def perform_create(self, serializer):
-        """Create a new message and assign it to the user."""
+        """
+        Create a new message and assign it to the user. Return False if an
+        identical message already exists and was reused instead.
+        """
 
-        serializer.save(user=self.request.user)
+        serializer.instance, created = Message.objects.submit(
+            self.request.user,
+            **serializer.validated_data
+        )
+
+        return created
+
+    def perform_update(self, serializer):
+        """
+        Save the message with the fingerprint and bands of its new content,
+        refusing an edit that makes it identical to another message of the
+        user.
+        """
+
+        msg = serializer.instance
+        content = msg.content
+        fingerprint = Message.make_fingerprint(*(
+            serializer.validated_data.get(name, getattr(msg, name))
+            for name in ('email', 'title', 'content')
+        ))
+
+        try:
+            with transaction.atomic():
+                msg = serializer.save(fingerprint=fingerprint)
+                if msg.content != content:
+                    MessageBand.rebuild(msg)
+        except IntegrityError:
+            raise ValidationError(
+                {'content': 'An identical message already exists.'}
+            )
+
+    def get_similar_bands(self, msg):
+        """
+        Return the bands of the owner's other messages sharing an LSH bucket
+        with the message, or None if the message has no bands.
+        """
+
+        buckets = Q()
+        for band, bucket in msg.bands.values_list('band', 'bucket'):
+            buckets |= Q(band=band, bucket=bucket)
+
+        if not buckets:
+            return None
+
+        return MessageBand.objects.filter(
+            buckets,
+            user=self.request.user
+        ).exclude(message_id=msg.id)
+
+    def get_similar_ids(self, msg):
+        """
+        Return ids of the owner's messages sharing an LSH bucket with the
+        message, the most similar first, up to similar_limit.
+        """
+
+        bands = self.get_similar_bands(msg)
+        if bands is None:
+            return []
+
+        matches = bands.values('message_id').annotate(
+            matches=Count('id')
+        ).order_by('-matches', 'message_id')[:self.similar_limit]
+
+        return [row['message_id'] for row in matches]
+
+    @extend_schema(
+        description='List messages with nearly the same content as the '
+                    'message, the most similar first.',
+        responses=MessageSerializer(many=True)
+    )
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Return messages that are near duplicates of the message."""
+
+        ids = self.get_similar_ids(self.get_object())
+        messages = Message.objects.in_bulk(ids)
+        serializer = self.get_serializer(
+            [messages[i] for i in ids if i in messages],
+            many=True
+        )
+
+        return Response(serializer.data)
+
+    @extend_schema(
+        description='Mark the message and its near duplicates as spam, or '
+                    'delete them all. The count is of the messages newly '
+                    'marked or deleted.',
+        request=ClusterOperationSerializer,
+        responses=ClusterOperationSerializer
+    )
+    @action(detail=True, methods=['post'])
+    def cluster(self, request, pk=None):
+        """Apply a bulk operation to the message and its near duplicates."""
+
+        msg = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        # The whole cluster is matched in the statement, however large.
+        cluster = Q(id=msg.id)
+        bands = self.get_similar_bands(msg)
+        if bands is not None:
+            cluster |= Q(id__in=bands.values('message_id'))
+        messages = Message.objects.filter(cluster, user=request.user)
+
+        if serializer.validated_data['operation'] == 'spam':
+            count = messages.filter(is_spam=False).update(is_spam=True)
+        else:
+            count = messages.delete()[1].get(Message._meta.label, 0)
+
+        return Response({
+            'operation': serializer.validated_data['operation'],
+            'count': count
+        })
+
+    @extend_schema(
+        description='List messages created, updated or deleted after the '
+                    'cursor, in order of change. Pass the returned cursor '
+                    'to the next request until "has_more" is false.',
+        parameters=[
+            OpenApiParameter(
+                'since',
+                OpenApiTypes.INT,
+                required=False,
+                description='Cursor returned by the previous request, 0 or '
+                            'omitted to start from the beginning.'
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                required=False,
+                description='Maximum number of changes to return.'
+            ),
+        ],
+        responses=MessageChangesSerializer
+    )
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """Return a page of changes of the user's messages."""
+
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', self.changes_limit))
+        except ValueError:
+            raise ValidationError({'since': 'A number is required.'})
+
+        limit = max(1, min(limit, self.changes_max_limit))
+        # Changes past the horizon may still be preceded by changes of
+        # transactions in flight, so they wait for the next request.
+        horizon = Message.objects.change_horizon()
+        updated = Message.objects.filter(
+            user=request.user,
+            change_seq__gt=since,
+            change_seq__lte=horizon
+        ).order_by('change_seq')[:limit + 1]
+        deleted = MessageTombstone.objects.filter(
+            user=request.user,
+            change_seq__gt=since,
+            change_seq__lte=horizon
+        ).order_by('change_seq')[:limit + 1]
+
+        changes = sorted(
+            [(msg.change_seq, 'upsert', msg) for msg in updated]
+            + [(t.change_seq, 'delete', t) for t in deleted],
+            key=lambda change: change[0]
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        return Response({
+            'changes': [
+                {
+                    'type': kind,
+                    'change_seq': seq,
+                    'id': obj.id if kind == 'upsert' else obj.message_id,
+                    'message': (
+                        MessageDetailSerializer(obj).data
+                        if kind == 'upsert' else None
+                    ),
+                }
+                for seq, kind, obj in changes
+            ],
+            'cursor': changes[-1][0] if changes else since,
+            'has_more': has_more,
+        })
+
+    @extend_schema(
+        description='Retrieve several messages in one request, in the '
+                    'requested order, archived ones included. Ids of '
+                    'missing messages get a "not_found" marker.',
+        parameters=[
+            OpenApiParameter(
+                'ids',
+                OpenApiTypes.STR,
+                required=True,
+                description='Ids of messages, separated by comma '
+                            '(e.g. "3,1,2" without quotes).'
+            ),
+        ],
+        responses=MessageDetailSerializer(many=True)
+    )
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        """Return the requested messages of the user."""
+
+        try:
+            ids = [
+                int(i) for i in request.query_params.get('ids', '').split(',')
+                if i
+            ]
+        except ValueError:
+            raise ValidationError({'ids': 'A list of numbers is required.'})
+
+        if not ids or len(ids) > self.batch_max_size:
+            raise ValidationError(
+                {'ids': f'Between 1 and {self.batch_max_size} ids required.'}
+            )
+
+        messages = Message.objects.filter(user=request.user).in_bulk(ids)
+        missing = [i for i in ids if i not in messages]
+        if missing:
+            messages.update(archive.get(request.user.id, missing))
+
+        return Response([
+            self.get_serializer(messages[i]).data if i in messages
+            else {'id': i, 'error': 'not_found'}
+            for i in ids
+        ])
+
+    @extend_schema(
+        description='Number of messages created per interval, in total and '
+                    'read or answered, from the daily rollup.',
+        parameters=[
+            OpenApiParameter(
+                'interval',
+                OpenApiTypes.STR,
+                required=False,
+                description='"day" (default), "week", "month" or "year".'
+            ),
+            OpenApiParameter(
+                'fd',
+                OpenApiTypes.DATE,
+                required=False,
+                description='First day of the range, a year ago by default.'
+            ),
+            OpenApiParameter(
+                'td',
+                OpenApiTypes.DATE,
+                required=False,
+                description='Day after the end of the range, tomorrow by '
+                            'default.'
+            ),
+        ],
+        responses=MessageVolumeSerializer(many=True)
+    )
+    @action(detail=False, methods=['get'])
+    def volume(self, request):
+        """Return message volume per interval of the range."""
+
+        params = MessageVolumeQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        today = timezone.now().date()
+        fd = params.validated_data.get('fd', today - timedelta(days=365))
+        td = params.validated_data.get('td', today + timedelta(days=1))
+
+        rows = MessageDailyCount.objects.filter(
+            user=request.user,
+            day__gte=fd,
+            day__lt=td
+        ).annotate(
+            bucket=Trunc(
+                'day',
+                params.validated_data['interval'],
+                output_field=DateField()
+            )
+        ).values('bucket').annotate(
+            total=Sum('total'),
+            read=Sum('read'),
+            answered=Sum('answered')
+        ).filter(total__gt=0).order_by('bucket')
+
+        return Response(MessageVolumeSerializer(rows, many=True).data)
+
+    @extend_schema(
+        description='Messages grouped by sender with their total and unread '
+                    'counts and the latest message, the most recently '
+                    'active senders first.',
+        parameters=[
+            OpenApiParameter(
+                'cursor',
+                OpenApiTypes.STR,
+                required=False,
+                description='Value of "next" from the previous page.'
+            ),
+        ],
+        responses=SenderPageSerializer
+    )
+    @action(detail=False, methods=['get'])
+    def senders(self, request):
+        """Return a page of senders ordered by their last activity."""
+
+        senders = Message.objects.filter(
+            user=request.user
+        ).values('email_normalized').annotate(
+            total=Count('id'),
+            unread=Count('id', filter=Q(is_read=False)),
+            last_activity=Max('created_at')
+        )
+
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            last_activity, email = self.decode_sender_cursor(cursor)
+            senders = senders.filter(
+                Q(last_activity__lt=last_activity) |
+                Q(last_activity=last_activity, email_normalized__gt=email)
+            )
+
+        senders = list(
+            senders.order_by('-last_activity', 'email_normalized')[
+                :self.senders_limit + 1
+            ]
+        )
+        has_next = len(senders) > self.senders_limit
+        senders = senders[:self.senders_limit]
+
+        latest = Message.objects.filter(
+            user=request.user,
+            email_normalized__in=[s['email_normalized'] for s in senders]
+        ).order_by('email_normalized', '-created_at').distinct(
+            'email_normalized'
+        )
+        latest = {msg.email_normalized: msg for msg in latest}
+
+        for sender in senders:
+            sender['latest'] = latest[sender['email_normalized']]
+
+        return Response({
+            'results': SenderSerializer(senders, many=True).data,
+            'next': self.encode_sender_cursor(senders[-1]) if has_next else None
+        })
+
+    @staticmethod
+    def encode_sender_cursor(sender):
+        """Return the cursor of the page following the sender."""
+
+        value = '|'.join((
+            sender['last_activity'].isoformat(),
+            sender['email_normalized']
+        ))
+
+        return urlsafe_b64encode(value.encode()).decode()
+
+    @staticmethod
+    def decode_sender_cursor(cursor):
+        """Return the last activity and email encoded in the cursor."""
+
+        try:
+            value = urlsafe_b64decode(cursor.encode()).decode()
+            last_activity, email = value.split('|', 1)
+            return datetime.fromisoformat(last_activity), email
+        except ValueError:
+            raise ValidationError({'cursor': 'Invalid cursor.'})
+
+    @extend_schema(
+        description='Count the messages in total and by their flags, '
+                    'accepting the same parameters as the list.',
+        parameters=[
+            OpenApiParameter(name, OpenApiTypes.STR, required=False)
+            for name in ('filter', 'search', 'fd', 'td')
+        ],
+        responses=MessageStatsSerializer
+    )
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Return counts of the messages matching the parameters."""
+
+        stats = self.get_queryset().order_by().aggregate(**stats_aggregates())
+
+        return Response(stats)
+
+    def get_archived_messages(self):
+        """
+        Return the archived messages matching the list parameters when the
+        fd date reaches before the time the user's messages are archived up
+        to, as the list is of the messages in the database otherwise. Only
+        the latest archived_limit are returned, with whether any were left
+        out.
+        """
+
+        from_date, to_date = parse_dates(self.request.query_params)
+        if from_date is None:
+            return [], False
+
+        until = archive.horizon(self.request.user.id)
+        if until is None or from_date >= until:
+            return [], False
+
+        archived = []
+        for messages in archive.iter_between(
+            self.request.user.id,
+            from_date,
+            min(to_date, until) if to_date else until,
+            newest_first=True
+        ):
+            archived += filter_archived(messages, self.request.query_params)
+            if len(archived) > self.archived_limit:
+                break
+
+        archived.sort(key=lambda msg: (msg.created_at, msg.id), reverse=True)
+
+        return (
+            archived[:self.archived_limit],
+            len(archived) > self.archived_limit
+        )
+
+    def get_total_count(self, archived=(), truncated=False):
+        """
+        Return the number of listed messages and whether it is exact. Lists
+        filtered only by dates are counted from the daily counts, which keep
+        counting archived messages, others are counted up to the cap, and
+        are not exact when archived messages were left out.
+        """
+
+        params = self.request.query_params
+
+        if not any(params.get(name) for name in self.counted_params):
+            counts = MessageDailyCount.objects.filter(user=self.request.user)
+
+            if params.get('fd'):
+                counts = counts.filter(day__gte=params['fd'])
+            else:
+                until = archive.horizon(self.request.user.id)
+                if until:
+                    counts = counts.filter(day__gte=until.date())
+            if params.get('td'):
+                counts = counts.filter(day__lt=params['td'])
+
+            return counts.aggregate(total=Sum('total'))['total'] or 0, True
+
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        total = queryset[:self.count_cap + 1].count() + len(archived)
+
+        if total > self.count_cap:
+            return self.count_cap, False
+
+        return total, not truncated
+
+    def get_object(self):
+        """Return the message, read from the archive when retrieving."""
+
+        try:
+            return super().get_object()
+        except Http404:
+            pk = str(self.kwargs[self.lookup_field])
+            if self.action != 'retrieve' or not pk.isdigit():
+                raise
+
+        msg = archive.get(self.request.user.id, [int(pk)]).get(int(pk))
+        if msg is None:
+            raise Http404
+
+        self.check_object_permissions(self.request, msg)
+
+        return msg
 
     def get_serializer_class(self):
         """Return proper serializer to different actions."""
 
-        if self.action == 'list':
+        if self.action in ('list', 'similar'):
             return MessageSerializer
 
+        if self.action == 'cluster':
+            return ClusterOperationSerializer
+
         return self.serializer_class
 
     def get_queryset(self):
         """Filter and return queryset of messages."""
 
-        queryset = super().get_queryset().filter(user=self.request.user)
-        filter_params = self.request.query_params.get('filter', None)
-        search = self.request.query_params.get('search', None)
-        fd = self.request.query_params.get('fd', None)
-        td = self.request.query_params.get('td', None)
-
-        if filter_params:
-            filter_params = filter_params.split(',')
-            qs_filtered = queryset.none()
-
-            for param in filter_params:
-                if param == 'recent':
-                    qs_filtered = qs_filtered.union(queryset.filter(is_recent=True))
-                if param == 'read':
-                    qs_filtered = qs_filtered.union(queryset.filter(is_read=True))
-                if param == 'answered':
-                    qs_filtered = qs_filtered.union(queryset.filter(is_answered=True))
-
-            queryset = qs_filtered
-
-        if search:
-            queryset = queryset.filter(
-                Q(email__icontains=search) |
-                Q(title__icontains=search) |
-                Q(content__icontains=search)
-            )
+        with span('get_queryset'):
+            queryset = super().get_queryset().filter(user=self.request.user)
+
+            return filter_messages(queryset, self.request.query_params)
 
-        if fd:
-            y, m, d = map(int, fd.split('-'))
-            from_date = datetime(y, m, d, 0, 0, 0, tzinfo=pytz.utc)
 
-            queryset = queryset.filter(created_at__gte=from_date)
+class SubmissionKeyViewSet(TracedViewMixin, ModelViewSet):
+    """Manage the public submission keys of the user's website forms."""
+
+    serializer_class = SubmissionKeySerializer
+    queryset = SubmissionKey.objects.all()
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Return the keys of the user."""
+
+        return super().get_queryset().filter(
+            user=self.request.user
+        ).order_by('id')
+
+    def perform_create(self, serializer):
+        """Create a key owned by the user."""
+
+        serializer.save(user=self.request.user)
+
+
+class MessageSubmitView(TracedViewMixin, APIView):
+    """
+    Accept a message posted by a public website form with the submission
+    key of its owner. The key is resolved from an in-process cache, so the
+    request runs no authentication queries nor password hashing.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    key_header = 'X-Submission-Key'
+
+    def cors_headers(self, origin):
+        """Return the headers allowing a form of the origin to post."""
+
+        if not origin:
+            return {}
+
+        return {
+            'Access-Control-Allow-Origin': origin,
+            'Access-Control-Allow-Methods': 'POST, OPTIONS',
+            'Access-Control-Allow-Headers':
+                f'Content-Type, {self.key_header}',
+            'Vary': 'Origin',
+        }
+
+    @extend_schema(exclude=True)
+    def options(self, request, *args, **kwargs):
+        """Answer the CORS preflight, the origin is checked on the post."""
+
+        return Response(
+            status=status.HTTP_204_NO_CONTENT,
+            headers=self.cors_headers(request.headers.get('Origin'))
+        )
+
+    @extend_schema(
+        description='Submit a message from a public website form. The '
+                    'submission key goes in the X-Submission-Key header.',
+        parameters=[
+            OpenApiParameter(
+                'X-Submission-Key',
+                OpenApiTypes.STR,
+                location=OpenApiParameter.HEADER,
+                required=True
+            ),
+        ],
+        request=PublicMessageSerializer,
+        responses={201: None}
+    )
+    def post(self, request):
+        """Store the message for the owner of the submission key."""
+
+        origin = request.headers.get('Origin')
+        submission_key = submission_keys.resolve(
+            request.headers.get(self.key_header, '')
+        )
 
-        if td:
-            y, m, d = map(int, td.split('-'))
-            to_date = datetime(y, m, d, 0, 0, 0, tzinfo=pytz.utc)
+        if submission_key is None:
+            raise PermissionDenied('Invalid submission key.')
+        if not submission_key.allows_origin(origin):
+            raise PermissionDenied('Origin not allowed for this key.')
 
-            queryset = queryset.filter(created_at__lt=to_date)
+        serializer = PublicMessageSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        Message.objects.submit(
+            submission_key.user,
+            **serializer.validated_data
+        )
 
-        return queryset
+        return Response(
+            status=status.HTTP_201_CREATED,
+            headers=self.cors_headers(origin)
+        )
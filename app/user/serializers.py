@@ -65,3 +65,18 @@ class AuthTokenSerializer(serializers.Serializer):
         attrs['user'] = user
 
         return attrs
+
+
+class HashingMetricsSerializer(serializers.Serializer):
+    """Serializer for the metrics of the password hashing pool."""
+
+    submitted = serializers.IntegerField()
+    rejected = serializers.IntegerField()
+    completed = serializers.IntegerField()
+    wait_seconds = serializers.FloatField()
+    hash_seconds = serializers.FloatField()
+    max_wait_seconds = serializers.FloatField()
+    avg_wait_seconds = serializers.FloatField()
+    avg_hash_seconds = serializers.FloatField()
+    workers = serializers.IntegerField()
+    queue_size = serializers.IntegerField()
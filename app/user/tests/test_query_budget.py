@@ -0,0 +1,77 @@
+"""
+Query budget tests for user APIs.
+"""
+
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Message
+from core.tests.query_budget import QueryBudgetTestCase
+
+CREATE_USER_URL = reverse('user:create')
+TOKEN_URL = reverse('user:token')
+PROFILE_URL = reverse('user:profile')
+HASHING_METRICS_URL = reverse('user:hashing-metrics')
+
+
+class UserQueryBudgetTests(QueryBudgetTestCase):
+    """Test user endpoints run a bounded number of queries."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='test_pass123',
+            name='Test Name'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def seed(self, size):
+        """Create size users with a message each."""
+
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f'seeded{i}@example.com')
+            for i in range(size)
+        )
+        Message.objects.bulk_create(
+            Message(user=user, email='sender@example.com', content='Content')
+            for user in users
+        )
+
+    def test_create_user_budget(self):
+        """Test creating a user."""
+
+        self.assertQueryBudget(3, 'post', CREATE_USER_URL, {
+            'email': 'new@example.com',
+            'password': 'test_pass123',
+            'name': 'New Name'
+        })
+
+    def test_create_token_budget(self):
+        """Test creating a token."""
+
+        self.assertQueryBudget(3, 'post', TOKEN_URL, {
+            'email': 'test@example.com',
+            'password': 'test_pass123'
+        })
+
+    def test_profile_budgets(self):
+        """Test retrieving, updating and deleting the profile."""
+
+        self.assertQueryBudget(1, 'get', PROFILE_URL)
+        self.assertQueryBudget(
+            2, 'patch', PROFILE_URL, {'name': 'Updated Name'}, format='json'
+        )
+        self.assertQueryBudget(3, 'delete', PROFILE_URL)
+
+    def test_hashing_metrics_budget(self):
+        """Test reading the metrics of the hashing pool."""
+
+        self.user.is_staff = True
+        self.user.save()
+
+        self.assertQueryBudget(1, 'get', HASHING_METRICS_URL)
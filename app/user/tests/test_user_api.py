@@ -167,3 +167,13 @@ class PrivateUserApiTests(TestCase):
         self.user.refresh_from_db()
         self.assertEquals(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
+
+    def test_delete_profile_deactivates_user(self):
+        """Test deleting the profile deactivates the user for the purge."""
+
+        r = self.client.delete(PROFILE_URL)
+
+        self.assertEquals(r.status_code, status.HTTP_202_ACCEPTED)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertIsNotNone(self.user.deletion_requested_at)
@@ -4,7 +4,12 @@ URL mappings for user APIs.
 
 from django.urls import path
 
-from user.views import CreateUserView, AuthTokenView, UserProfileView
+from user.views import (
+    CreateUserView,
+    AuthTokenView,
+    UserProfileView,
+    HashingMetricsView
+)
 
 app_name = 'user'
 
@@ -12,4 +17,9 @@ urlpatterns = [
     path('create/', CreateUserView.as_view(), name='create'),
     path('token/', AuthTokenView.as_view(), name='token'),
     path('profile/', UserProfileView.as_view(), name='profile'),
+    path(
+        'hashing-metrics/',
+        HashingMetricsView.as_view(),
+        name='hashing-metrics'
+    ),
 ]
@@ -2,31 +2,48 @@
 Views for user APIs.
 """
 
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.generics import CreateAPIView, RetrieveUpdateDestroyAPIView
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.settings import api_settings
 
-from rest_framework.permissions import IsAuthenticated
+from drf_spectacular.utils import extend_schema
+
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from core import hashing
 from core.permissions import AccessOwnerOnly
+from core.tracing import TracedViewMixin
 
-from user.serializers import UserSerializer, AuthTokenSerializer
+from user.serializers import (
+    AuthTokenSerializer,
+    HashingMetricsSerializer,
+    UserSerializer
+)
 
 
-class CreateUserView(CreateAPIView):
+class CreateUserView(TracedViewMixin, CreateAPIView):
     """Create a new user in the system."""
 
     serializer_class = UserSerializer
 
 
-class AuthTokenView(ObtainAuthToken):
+class AuthTokenView(TracedViewMixin, ObtainAuthToken):
     """Create auth token for an existing user."""
 
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
 
-class UserProfileView(RetrieveUpdateDestroyAPIView):
+class UserProfileView(
+    TracedViewMixin,
+    RetrieveUpdateDestroyAPIView
+):
     """Retrieve, update or delete user profile."""
 
     serializer_class = UserSerializer
@@ -37,3 +54,30 @@ class UserProfileView(RetrieveUpdateDestroyAPIView):
         """Retrieve and return the authenticated user."""
 
         return self.request.user
+
+    @extend_schema(responses={202: None})
+    def destroy(self, request, *args, **kwargs):
+        """
+        Deactivate the user and leave the deletion of the account and its
+        messages to the purge_accounts worker.
+        """
+
+        user = self.get_object()
+        user.is_active = False
+        user.deletion_requested_at = timezone.now()
+        user.save(update_fields=['is_active', 'deletion_requested_at'])
+        Token.objects.filter(user=user).delete()
+
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+
+class HashingMetricsView(TracedViewMixin, APIView):
+    """Report queue wait and hash time of the password hashing pool."""
+
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(responses=HashingMetricsSerializer)
+    def get(self, request):
+        """Return the metrics of the pool in this process."""
+
+        return Response(hashing.metrics())